@@ -0,0 +1,316 @@
+# Async versions of the llm_calls functions on config.async_client (AsyncOpenAI).
+# Prompts, RSMeans lookups and the ROI engine are shared with llm_calls; only the provider
+# calls are awaited, so one event loop can serve many generations at once (gh_async_server.py).
+# Local work that takes more than a few milliseconds (RSMeans matching, the ROI engine's
+# Monte Carlo, Chroma + FlashRank retrieval) runs in a worker thread.
+
+import asyncio
+import time
+
+import llm_calls
+from llm_calls import (RELEVANCE_PROMPT, ROUTE_PROMPT, CONCEPT_PROMPT, ATTRIBUTES_PROMPT, QUESTION_PROMPT,
+                       COST_TRADEOFFS_PROMPT, MATERIAL_IMPACT_PROMPT, ROI_INPUTS_PROMPT, ROUTES, RETRIEVAL_ROUTES,
+                       UNROUTED_ANSWER, logger)
+from utils import metrics, rag_utils
+from utils.llm_cache import async_cached_chat_completion, async_replay_chunks
+from utils.local_router import local_classify
+from utils.semantic_cache import SEMANTIC_CACHE_ENABLED, get_semantic_cache, async_embed_question, collection_scope
+
+
+async def _chat(system_prompt: str, user_input: str, stream: bool = False, use_cache: bool = True, **params):
+    return await async_cached_chat_completion(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_input}
+        ],
+        stream=stream,
+        use_cache=use_cache,
+        **params,
+    )
+
+
+async def _with_header(header: str, answer):
+    """Async version of llm_calls._with_header."""
+    if isinstance(answer, str):
+        return header + answer
+
+    async def generator():
+        if header:
+            yield header
+        async for chunk in answer:
+            yield chunk
+    return generator()
+
+
+# Routing & Filtering Functions
+async def _classify(classifier: str, message: str, system_prompt: str, use_local: bool = True, use_cache: bool = True) -> str:
+    start = time.perf_counter()
+    # The first call trains the local model; keep that (and the prediction) off the event loop
+    local = await asyncio.to_thread(local_classify, classifier, message) if use_local else None
+    if local is not None:
+        output, confidence, source = local[0], local[1], "local"
+    else:
+        output = await _chat(system_prompt, message, use_cache=use_cache, temperature=0.0)
+        confidence, source = None, "llm"
+    latency = time.perf_counter() - start
+    metrics.observe("classify", latency)
+    logger.info({
+        "event": "classifier_output",
+        "classifier": classifier,
+        "message": message,
+        "output": output,
+        "source": source,
+        "confidence": confidence,
+        "latency_ms": round(latency * 1000, 3),
+    })
+    return output
+
+
+async def classify_input(message: str, use_local: bool = True, use_cache: bool = True) -> str:
+    return await _classify("relevance", message, RELEVANCE_PROMPT, use_local=use_local, use_cache=use_cache)
+
+
+async def classify_question_type(message: str, use_local: bool = True, use_cache: bool = True) -> str:
+    return await _classify("route", message, ROUTE_PROMPT, use_local=use_local, use_cache=use_cache)
+
+
+# Design Ideation & Concept Functions
+# Same temperatures as the sync versions, which call the provider without the response cache
+async def generate_concept(initial_info: str) -> str:
+    user_prompt = f"What is the concept for this building?\nInitial information: {initial_info}"
+    return await _chat(CONCEPT_PROMPT, user_prompt, use_cache=False, temperature=0.8)
+
+
+async def extract_attributes(description: str) -> str:
+    return await _chat(ATTRIBUTES_PROMPT, f"GIVEN DESCRIPTION:\n{description}", use_cache=False, temperature=0.0)
+
+
+async def create_question(theme: str) -> str:
+    return await _chat(QUESTION_PROMPT, theme, use_cache=False, temperature=0.3)
+
+
+# Cost Estimation & ROI Analysis Functions
+async def analyze_cost_tradeoffs(query: str) -> str:
+    return await _chat(COST_TRADEOFFS_PROMPT, query, use_cache=False, temperature=0.5)
+
+
+async def analyze_roi_sensitivity(query: str) -> str:
+    return await get_roi_analysis_answer(query)
+
+
+async def assess_material_impact(query: str) -> str:
+    return await _chat(MATERIAL_IMPACT_PROMPT, query, use_cache=False, temperature=0.3)
+
+
+async def run_llm_query(system_prompt: str, user_input: str, stream: bool = False):
+    return await _chat(system_prompt, user_input, stream=stream, temperature=0.0, max_tokens=1500)
+
+
+async def get_cost_benchmark_answer(query: str, stream: bool = False):
+    header, system_prompt, user_input = await asyncio.to_thread(llm_calls._cost_benchmark_request, query)
+    return await _with_header(header, await run_llm_query(system_prompt, user_input, stream=stream))
+
+
+async def extract_roi_inputs(query: str) -> dict:
+    return llm_calls._parse_roi_inputs(await run_llm_query(ROI_INPUTS_PROMPT, query))
+
+
+async def get_roi_analysis_answer(query: str, stream: bool = False):
+    inputs = await extract_roi_inputs(query)
+    header, system_prompt, user_input = await asyncio.to_thread(llm_calls._roi_request, query, inputs)
+    return await _with_header(header, await run_llm_query(system_prompt, user_input, stream=stream))
+
+
+async def explain_value_engineering(question: str, result: dict) -> str:
+    return await run_llm_query(*llm_calls._value_engineering_request(question, result))
+
+
+async def route_query_to_function(message: str, collection=None, ranker=None, use_rag: bool = False, stream: bool = False,
+                                  speculative: bool = None):
+    """
+    Async version of llm_calls.route_query_to_function. With stream=True the answer is an
+    async generator of text chunks.
+    """
+    request = metrics.start_request()
+    cache = get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None
+    scope = collection_scope(collection, use_rag)
+    if speculative is None:
+        speculative = llm_calls.SPECULATIVE_PIPELINE
+    # Embedding for the semantic cache concurrently with classification, as in llm_calls
+    start = time.perf_counter()
+    embed_task = asyncio.create_task(async_embed_question(message)) if cache is not None else None
+    jobs = _route_jobs(message, collection, ranker, use_rag, speculative)
+    vector = None
+    if embed_task is not None:
+        try:
+            vector = await embed_task
+        except asyncio.CancelledError:
+            for job in jobs.values():
+                job.cancel()
+            raise
+        except Exception as e:
+            logger.warning({"event": "semantic_cache_skipped", "error": str(e)})
+        if vector is not None:
+            hit = cache.lookup(vector, message, scope)
+            if hit is not None:
+                for job in jobs.values():
+                    job.cancel()
+                answer = async_replay_chunks(hit["answer"]) if stream else hit["answer"]
+                return _time_answer((answer, hit["sources"]) if use_rag else answer, request, hit["route"], use_rag,
+                                    cached=True)
+
+    if speculative:
+        classification, prefetched = await _speculative_route(message, collection, ranker, use_rag, jobs=jobs,
+                                                              start=start)
+    else:
+        try:
+            classification, prefetched = (await jobs["classify"])[0].lower(), None
+        except BaseException:
+            for job in jobs.values():
+                job.cancel()
+            raise
+    print(classification)
+    answer_start = time.perf_counter()
+    result = await _answer_route(classification, message, collection, ranker, use_rag, stream, prefetched=prefetched)
+    route = next((r for r in ROUTES if r in classification), None)
+    if vector is None or route is None:
+        return _time_answer(result, request, route, use_rag, answer_start=answer_start)
+
+    def store(answer, sources=None):
+        cache.store(vector, message, route, answer, sources=sources, scope=scope)
+
+    if use_rag:
+        answer, sources = result
+        result = _remember_answer(answer, lambda text: store(text, sources)), sources
+    else:
+        result = _remember_answer(result, store)
+    return _time_answer(result, request, route, use_rag, answer_start=answer_start)
+
+
+def _time_answer(result, request, route, use_rag: bool, cached: bool = False, answer_start: float = None):
+    """Async version of llm_calls._time_answer."""
+    answer, sources = result if use_rag else (result, None)
+    if isinstance(answer, str):
+        elapsed = time.perf_counter() - request.start
+        llm_calls._log_answer_timing(request, route, use_rag, False, cached, elapsed, elapsed, 1, answer_start)
+        return result
+
+    async def generator():
+        first, chunks = None, 0
+        async for chunk in answer:
+            if first is None:
+                first = time.perf_counter() - request.start
+            chunks += 1
+            yield chunk
+        total = time.perf_counter() - request.start
+        llm_calls._log_answer_timing(request, route, use_rag, True, cached, total if first is None else first, total,
+                                     chunks, answer_start)
+    return (generator(), sources) if use_rag else generator()
+
+
+def _remember_answer(answer, store):
+    """Async version of llm_calls._remember_answer."""
+    if isinstance(answer, str):
+        store(answer)
+        return answer
+
+    async def generator():
+        parts = []
+        async for chunk in answer:
+            parts.append(chunk)
+            yield chunk
+        store("".join(parts))
+    return generator()
+
+
+async def _timed(awaitable):
+    start = time.perf_counter()
+    result = await awaitable
+    return result, time.perf_counter() - start
+
+
+def _route_jobs(message: str, collection=None, ranker=None, use_rag: bool = False, speculative: bool = True):
+    """Async version of llm_calls._route_jobs: the stages as tasks."""
+    jobs = {"classify": asyncio.create_task(_timed(classify_question_type(message)))}
+    if speculative:
+        # Local lookup only, as in llm_calls._route_jobs
+        jobs["rsmeans"] = asyncio.create_task(
+            _timed(asyncio.to_thread(llm_calls._cost_benchmark_request, message, False)))
+        if use_rag and collection is not None:
+            jobs["retrieve"] = asyncio.create_task(
+                _timed(asyncio.to_thread(rag_utils.rag_context, message, collection, ranker)))
+    return jobs
+
+
+async def _speculative_route(message: str, collection=None, ranker=None, use_rag: bool = False, jobs: dict = None,
+                             start: float = None):
+    """Async version of llm_calls._speculative_route; unneeded tasks are cancelled."""
+    if jobs is None:
+        start, jobs = time.perf_counter(), _route_jobs(message, collection, ranker, use_rag)
+
+    try:
+        classification, classify_seconds = await jobs["classify"]
+    except BaseException:
+        for job in jobs.values():
+            job.cancel()
+        raise
+    classification = classification.lower()
+    needed = set()
+    if "cost benchmark" in classification:
+        needed.add("rsmeans")
+    if "retrieve" in jobs and any(r in classification for r in RETRIEVAL_ROUTES):
+        needed.add("retrieve")
+
+    prefetched, stages = {}, {"classify": classify_seconds}
+    for name, job in jobs.items():
+        if name == "classify":
+            continue
+        if name not in needed:
+            job.cancel()
+            continue
+        try:
+            result, stages[name] = await job
+        except Exception as e:
+            logger.warning({"event": "speculative_stage_failed", "stage": name, "error": str(e)})
+            continue
+        if result is not None:
+            prefetched[name] = result
+    wall = time.perf_counter() - start
+    saved = max(sum(stages.values()) - wall, 0.0)
+    discarded = sorted(set(jobs) - needed - {"classify"})
+    logger.info({
+        "event": "pipeline_timing",
+        "classification": classification,
+        "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in stages.items()},
+        "wall_ms": round(wall * 1000, 3),
+        "saved_ms": round(saved * 1000, 3),
+        "discarded": discarded,
+    })
+    return classification, prefetched
+
+
+async def _answer_route(classification: str, message: str, collection=None, ranker=None, use_rag: bool = False, stream: bool = False,
+                        prefetched: dict = None):
+    prefetched = prefetched or {}
+    match classification:
+        case x if "cost benchmark" in x:
+            if "rsmeans" in prefetched:
+                header, system_prompt, user_input = prefetched["rsmeans"]
+                answer = await _with_header(header, await run_llm_query(system_prompt, user_input, stream=stream))
+            else:
+                answer = await get_cost_benchmark_answer(message, stream=stream)
+            return (answer, []) if use_rag else answer
+        case x if "roi analysis" in x:
+            answer = await get_roi_analysis_answer(message, stream=stream)
+            return (answer, []) if use_rag else answer
+
+    prompt = await asyncio.to_thread(llm_calls._route_prompt, classification, message)
+    if prompt is None:
+        return (UNROUTED_ANSWER, []) if use_rag else UNROUTED_ANSWER
+    if use_rag:
+        if "retrieve" in prefetched:
+            rag_result = prefetched["retrieve"]
+            prompt = rag_utils.rag_prompt(message, rag_result, prompt)
+            return await rag_utils.async_rag_answer(question=message, prompt=prompt, stream=stream), rag_result
+        return await rag_utils.async_rag_call_alt(message, collection, ranker, agent_prompt=prompt, stream=stream)
+    return await run_llm_query(system_prompt=prompt, user_input=message, stream=stream)
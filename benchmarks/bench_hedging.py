@@ -0,0 +1,70 @@
+# Benchmark: hedged requests and failover (server/provider_router.py) against two mock
+# OpenAI-compatible providers (utils/mock_openai_server.py). The primary is fast but
+# stalls or fails on a share of requests; the fallback is slower but steady.
+# Compares latency percentiles and failures with and without hedging.
+# Run from the repository root:  python benchmarks/bench_hedging.py
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+
+import server.config as config
+from server.client_registry import ClientRegistry
+from server.provider_router import ProviderRouter
+from utils.mock_openai_server import MockOpenAIServer
+
+REQUESTS = 200
+CONCURRENCY = 8
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def run(router):
+    latencies, failures = [], 0
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            router.create(messages=MESSAGES, temperature=0.0)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        for latency in pool.map(one, range(REQUESTS)):
+            if latency is None:
+                failures += 1
+            else:
+                latencies.append(latency)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return p50, p95, p99, failures
+
+
+def main():
+    primary = MockOpenAIServer(delay=0.10, jitter=0.03, stall_rate=0.03, stall=2.0, error_rate=0.03, seed=1).start()
+    fallback = MockOpenAIServer(delay=0.20, jitter=0.03, seed=2).start()
+    config.registry = ClientRegistry({"local": (primary.base_url, "mock"), "cloudflare": (fallback.base_url, "mock")})
+    config.set_mode("local")
+
+    print(f"{'router':>24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for label, router in [
+        ("primary only", ProviderRouter(fallbacks=[], hedging=False)),
+        ("failover, no hedging", ProviderRouter(fallbacks=["cloudflare"], hedging=False)),
+        ("failover + hedging", ProviderRouter(fallbacks=["cloudflare"], hedging=True)),
+    ]:
+        # Warm-up so the hedge delay is based on measured p95, not the default
+        run(router)
+        p50, p95, p99, failed = run(router)
+        print(f"{label:>24} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f} {failed:>7}")
+        counters = {k: v for k, v in router.stats().items() if k != "providers"}
+        print(f"{'':>24} {counters}")
+    primary.stop()
+    fallback.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Benchmark: micro-batching of query embeddings and FlashRank reranking across concurrent
+# requests (utils/micro_batcher.py). Each request embeds one question against the mock
+# OpenAI-compatible server (utils/mock_openai_server.py) and reranks 8 chunks with the
+# ms-marco-MiniLM-L-12-v2 ranker from models/ (downloaded by rag_utils.init_rag).
+# Compares throughput, p50 and the number of embedding calls / ONNX runs at concurrency
+# 1, 8 and 32, with and without batching.
+# Run from the repository root:  python benchmarks/bench_microbatch.py
+
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+from flashrank import Ranker, RerankRequest
+from openai import OpenAI
+
+from utils import micro_batcher
+from utils.mock_openai_server import MockOpenAIServer
+
+CONCURRENCY = [1, 8, 32]
+REQUESTS = 192
+PASSAGES = 8
+WORDS = ("concrete steel timber beam column slab footing formwork rebar glazing curtain wall roof membrane "
+         "insulation drywall labor equipment crew daily output cost per square foot cubic yard ton installed "
+         "material total overhead profit").split()
+
+
+def make_requests(n, rng):
+    def text(words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+    return [(text(10), [{"id": j, "text": text(rng.randint(150, 200))} for j in range(PASSAGES)]) for _ in range(n)]
+
+
+class CountingEmbedding:
+    """Embedding function (list of texts -> list of vectors) over the mock server's /v1/embeddings."""
+
+    def __init__(self, base_url):
+        self.client = OpenAI(base_url=base_url, api_key="mock")
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        response = self.client.embeddings.create(model="mock-embedding", input=list(texts))
+        return [np.array(d.embedding, dtype=np.float32) for d in response.data]
+
+
+class CountingSession:
+    """Wraps an ONNX session to count session.run calls."""
+
+    def __init__(self, session):
+        self.session = session
+        self.runs = 0
+
+    def run(self, *args, **kwargs):
+        self.runs += 1
+        return self.session.run(*args, **kwargs)
+
+
+def run(requests, concurrency, embedding_fn, ranker):
+    def one(request):
+        question, passages = request
+        start = time.perf_counter()
+        micro_batcher.embed_query(embedding_fn, question)
+        micro_batcher.rerank(ranker, question, passages)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, requests))
+    elapsed = time.perf_counter() - start
+    return len(requests) / elapsed, np.percentile(latencies, 50) * 1000
+
+
+def main():
+    rng = random.Random(0)
+    requests = make_requests(REQUESTS, rng)
+    server = MockOpenAIServer(delay=0.03, jitter=0.005, embedding_dim=768, seed=1).start()
+    ranker = Ranker(model_name="ms-marco-MiniLM-L-12-v2", cache_dir=os.path.join(parent_dir, "models"))
+
+    # Batched scores must match the ranker's own
+    question, passages = requests[0]
+    expected = ranker.rerank(RerankRequest(query=question, passages=[dict(p) for p in passages]))
+    actual = micro_batcher.rerank(ranker, question, passages)
+    assert [p["id"] for p in expected] == [p["id"] for p in actual]
+    assert np.allclose([p["score"] for p in expected], [p["score"] for p in actual], atol=1e-5)
+
+    ranker.session = CountingSession(ranker.session)
+    print(f"{'concurrency':>11} {'batching':>8} {'req/s':>7} {'p50 ms':>7} {'embed calls':>11} {'onnx runs':>9}")
+    for concurrency in CONCURRENCY:
+        for batching in (False, True):
+            micro_batcher.MICRO_BATCHING = batching
+            embedding_fn = CountingEmbedding(server.base_url)
+            run(requests[:concurrency], concurrency, embedding_fn, ranker)  # warm-up
+            embedding_fn.calls = ranker.session.runs = 0
+            throughput, p50 = run(requests, concurrency, embedding_fn, ranker)
+            print(f"{concurrency:>11} {'on' if batching else 'off':>8} {throughput:>7.1f} {p50:>7.1f} "
+                  f"{embedding_fn.calls:>11} {ranker.session.runs:>9}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
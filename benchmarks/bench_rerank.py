@@ -0,0 +1,85 @@
+# Benchmark: vectorized HybridReranker (utils/hybrid_reranker.py) vs the original
+# per-document loop of rag_utils.enhanced_rerank_results, at 20, 200 and 2,000 candidates
+# with 768-dimensional embeddings. "cold" tokenizes every chunk (empty cache), "warm" is a
+# repeated question over chunks seen before.
+# Run from the repository root:  python benchmarks/bench_rerank.py
+
+import random
+import sys
+import timeit
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from utils.hybrid_reranker import HybridReranker, KEYWORD_WEIGHTS
+
+CANDIDATES = [20, 200, 2000]
+DIM = 768
+QUESTION = "What building structure and facade material gives the best construction cost for this design space"
+WORDS = ("the a of and to in building design structure space form function style material construction architect "
+         "concrete steel timber facade glazing cost budget estimate labor equipment foundation roof wall floor "
+         "insulation thermal acoustic daylight program circulation core column beam slab").split()
+
+
+def loop_rerank(question, question_embedding, documents, embeddings, max_length=4000):
+    """The original implementation (with the query / document embeddings passed correctly)."""
+    scored_results = []
+    total_docs = len(documents)
+    for idx, (doc, doc_embedding) in enumerate(zip(documents, embeddings)):
+        semantic_score = cosine_similarity(np.array(question_embedding).reshape(1, -1),
+                                           np.array(doc_embedding).reshape(1, -1))[0][0]
+        question_words = question.lower().split()
+        doc_words = doc.lower().split()
+        keyword_score = 0
+        for word in question_words:
+            if word in doc_words:
+                keyword_score += KEYWORD_WEIGHTS.get(word, 1.0)
+        position_score = 1 - (idx / total_docs)
+        density_score = len(set(doc.lower().split())) / (len(doc) + 1)
+        final_score = semantic_score * 0.4 + keyword_score * 0.3 + position_score * 0.2 + density_score * 0.1
+        scored_results.append((idx, final_score))
+    scored_results.sort(key=lambda x: x[1], reverse=True)
+    selected, total_length = [], 0
+    for idx, _ in scored_results:
+        if total_length + len(documents[idx]) <= max_length:
+            selected.append(idx)
+            total_length += len(documents[idx])
+    return selected
+
+
+def make_candidates(n, rng):
+    documents = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 250))) for _ in range(n)]
+    # Chroma returns query embeddings as a float32 array per question
+    embeddings = np.random.default_rng(n).standard_normal((n, DIM)).astype(np.float32)
+    return documents, embeddings
+
+
+def best_of(fn, repeat=5):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    rng = random.Random(0)
+    question_embedding = np.random.default_rng(1).standard_normal(DIM).astype(np.float32)
+    print(f"{'candidates':>10} {'loop (ms)':>10} {'cold (ms)':>10} {'warm (ms)':>10} {'speedup':>8}")
+    for n in CANDIDATES:
+        documents, embeddings = make_candidates(n, rng)
+        expected = loop_rerank(QUESTION, question_embedding, documents, embeddings)
+        actual = HybridReranker().rerank(QUESTION, question_embedding, documents, embeddings)
+        assert expected == actual, f"selection mismatch at {n} candidates"
+
+        t_loop = best_of(lambda: loop_rerank(QUESTION, question_embedding, documents, embeddings))
+        t_cold = best_of(lambda: HybridReranker().rerank(QUESTION, question_embedding, documents, embeddings))
+        warm = HybridReranker()
+        warm.rerank(QUESTION, question_embedding, documents, embeddings)
+        t_warm = best_of(lambda: warm.rerank(QUESTION, question_embedding, documents, embeddings))
+        print(f"{n:>10} {t_loop * 1e3:>10.2f} {t_cold * 1e3:>10.2f} {t_warm * 1e3:>10.2f} {t_loop / t_warm:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
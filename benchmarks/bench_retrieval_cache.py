@@ -0,0 +1,103 @@
+# Benchmark: query embedding + search result cache (utils/retrieval_cache.py) in front of
+# Chroma. An in-memory Chroma collection of 5,000 chunks (768-dim) is searched with an
+# OpenAIEmbeddingFunction pointed at the mock provider (utils/mock_openai_server.py, 30 ms
+# per embedding call). 400 requests draw from 80 distinct questions, with whitespace
+# variants of the same question. Compares latency and embedding calls with the cache off,
+# with a cold cache, and after a restart (memory tier empty, SQLite tier warm).
+# Run from the repository root:  python benchmarks/bench_retrieval_cache.py
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import chromadb
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from utils import retrieval_cache
+from utils.mock_openai_server import MockOpenAIServer
+
+CHUNKS = 5000
+DIM = 768
+REQUESTS = 400
+QUESTIONS = 80
+N_RESULTS = 20
+INCLUDE = ["documents", "metadatas"]
+WORDS = ("concrete steel timber beam column slab footing formwork rebar glazing curtain wall roof membrane "
+         "insulation drywall labor equipment crew cost per square foot cubic yard").split()
+
+
+class CountingEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction):
+    calls = 0
+
+    def __call__(self, input):
+        CountingEmbeddingFunction.calls += 1
+        return super().__call__(input)
+
+
+def make_collection(base_url, rng):
+    embedding_fn = CountingEmbeddingFunction(api_key="mock", api_base=base_url, model_name="mock-embedding")
+    collection = chromadb.EphemeralClient().get_or_create_collection("bench_retrieval", embedding_function=embedding_fn)
+    vectors = np.random.default_rng(0).standard_normal((CHUNKS, DIM)).astype(np.float32)
+    for start in range(0, CHUNKS, 1000):
+        ids = [f"chunk_{i}" for i in range(start, start + 1000)]
+        collection.add(ids=ids, embeddings=vectors[start:start + 1000],
+                       documents=[" ".join(rng.choice(WORDS) for _ in range(150)) for _ in ids],
+                       metadatas=[{"source": f"doc{i % 40}.pdf"} for i in range(start, start + 1000)])
+    collection.modify(metadata={"version": "bench"})
+    return collection
+
+
+def make_requests(rng):
+    questions = [" ".join(rng.choice(WORDS) for _ in range(10)) for _ in range(QUESTIONS)]
+    # Same questions with different spacing / line breaks map to the same cache entries
+    return [rng.choice(questions).replace(" ", rng.choice([" ", "  ", "\n"]), 1) for _ in range(REQUESTS)]
+
+
+def new_caches(path):
+    retrieval_cache.RETRIEVAL_CACHE_PATH = path
+    retrieval_cache._embedding_cache = retrieval_cache._search_cache = None
+
+
+def run(collection, requests):
+    CountingEmbeddingFunction.calls = 0
+    latencies = []
+    for question in requests:
+        start = time.perf_counter()
+        retrieval_cache.query_collection(collection, question, N_RESULTS, INCLUDE)
+        latencies.append(time.perf_counter() - start)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+    return p50, p95, sum(latencies), CountingEmbeddingFunction.calls
+
+
+def main():
+    rng = random.Random(0)
+    server = MockOpenAIServer(delay=0.03, embedding_dim=DIM, seed=1).start()
+    collection = make_collection(server.base_url, rng)
+    requests = make_requests(rng)
+    path = str(Path(tempfile.mkdtemp()) / "retrieval_cache.sqlite")
+
+    print(f"{'cache':>16} {'p50 ms':>7} {'p95 ms':>7} {'total s':>8} {'embed calls':>11}")
+    retrieval_cache.RETRIEVAL_CACHE_ENABLED = False
+    p50, p95, total, calls = run(collection, requests)
+    print(f"{'off':>16} {p50:>7.1f} {p95:>7.1f} {total:>8.2f} {calls:>11}")
+
+    retrieval_cache.RETRIEVAL_CACHE_ENABLED = True
+    new_caches(path)
+    p50, p95, total, calls = run(collection, requests)
+    print(f"{'cold':>16} {p50:>7.1f} {p95:>7.1f} {total:>8.2f} {calls:>11}")
+
+    # Restart: empty memory tier over the SQLite file written above
+    new_caches(path)
+    p50, p95, total, calls = run(collection, requests)
+    print(f"{'after restart':>16} {p50:>7.1f} {p95:>7.1f} {total:>8.2f} {calls:>11}")
+    print(retrieval_cache.retrieval_cache_stats()["search"]["disk"])
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
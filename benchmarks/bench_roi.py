@@ -0,0 +1,41 @@
+# Benchmark: ROI engine (utils/roi_engine.py) Monte Carlo runs at growing scenario counts,
+# plus the tornado table and a 2-D sensitivity grid.
+# Run from the repository root:  python benchmarks/bench_roi.py
+
+import sys
+import time
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+
+from utils.roi_engine import base_case, monte_carlo, tornado, sensitivity_grid
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+REPEATS = 5
+
+
+def best_of(fn, repeats=REPEATS):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    case = base_case(construction_cost=20_000_000)
+    print(f"tornado table: {best_of(lambda: tornado(case)):.1f} ms")
+    costs = np.linspace(16e6, 24e6, 21)
+    rents = np.linspace(1.9e6, 2.9e6, 21)
+    grid_ms = best_of(lambda: sensitivity_grid(case, 'construction_cost', costs, 'annual_rent', rents))
+    print(f"21 x 21 sensitivity grid: {grid_ms:.1f} ms\n")
+    print(f"{'scenarios':>10} {'monte carlo (ms)':>17}")
+    for n in SIZES:
+        print(f"{n:>10,} {best_of(lambda: monte_carlo(case, n=n)):>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
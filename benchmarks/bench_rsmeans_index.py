@@ -0,0 +1,59 @@
+# Benchmark: indexed find_by_section_code vs the original pandas string scans.
+# Run from the repository root:  python benchmarks/bench_rsmeans_index.py
+
+import sys
+import timeit
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+from cost_data.rsmeans_utils import load_rsmeans_data, find_by_section_code
+from cost_data.rsmeans_index import get_rsmeans_index
+
+QUERIES = [
+    "03 05 13.25",   # exact
+    "03 35",         # prefix, one section
+    "03",            # prefix, whole division
+    "3543",          # contains
+    "23.14",         # contains
+    "99 99 99",      # miss (scans all three stages)
+    "What is the typical cost per sqft for concrete?",  # natural-language miss
+]
+
+
+def pandas_find_by_section_code(df, section_code):
+    """The original implementation: normalizes the whole column on every call."""
+    match = df[df['Masterformat Section Code'] == section_code]
+    if not match.empty:
+        return match
+    code_norm = section_code.replace(' ', '').lower()
+    fuzzy = df[df['Masterformat Section Code'].str.replace(' ', '').str.lower().str.startswith(code_norm)]
+    if not fuzzy.empty:
+        return fuzzy
+    return df[df['Masterformat Section Code'].str.replace(' ', '').str.lower().str.contains(code_norm, regex=False)]
+
+
+def best_of(fn, repeat=5):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    df = load_rsmeans_data()
+    index = get_rsmeans_index(df)
+    print(f"RSMeans rows: {len(df)}")
+    print("lookup = index search only; find = lookup + df.iloc row materialization\n")
+    print(f"{'query':<50} {'rows':>6} {'pandas (us)':>12} {'lookup (us)':>12} {'find (us)':>10} {'speedup':>8}")
+    for query in QUERIES:
+        expected = pandas_find_by_section_code(df, query)
+        actual = find_by_section_code(df, query)
+        assert expected.index.equals(actual.index), f"row mismatch for {query!r}"
+        t_pandas = best_of(lambda: pandas_find_by_section_code(df, query))
+        t_lookup = best_of(lambda: index.find_code_positions(query))
+        t_index = best_of(lambda: find_by_section_code(df, query))
+        print(f"{query[:50]:<50} {len(actual):>6} {t_pandas * 1e6:>12.1f} {t_lookup * 1e6:>12.1f} {t_index * 1e6:>10.1f} {t_pandas / t_index:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
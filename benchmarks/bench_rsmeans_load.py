@@ -0,0 +1,69 @@
+# Benchmark: RSMeans cold start - plain pd.read_csv vs typed CSV parse vs binary cache.
+# Each loader runs in a fresh interpreter so import caches and memory don't leak between runs.
+# Run from the repository root:  python benchmarks/bench_rsmeans_load.py
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+RUNS = 5
+
+# Executed in the child process. Prints one JSON line: load seconds and RSS growth.
+CHILD_SCRIPT = r"""
+import json, sys, time
+sys.path.insert(0, '.')
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            import os
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+import pandas as pd, numpy as np
+from cost_data import rsmeans_store
+csv_path = "cost_data/rsmeans/combined.csv"
+mode = sys.argv[1]
+rss_before = rss_bytes()
+start = time.perf_counter()
+if mode == "csv":
+    df = pd.read_csv(csv_path)
+elif mode == "typed-csv":
+    df = rsmeans_store.read_typed_csv(csv_path)
+else:
+    df = rsmeans_store.load_typed_rsmeans(csv_path, cache_dir=sys.argv[2])
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "rss_delta": rss_bytes() - rss_before,
+                  "numeric_cols": int((df.dtypes == 'float64').sum())}))
+"""
+
+
+def run_child(*args):
+    out = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, *args], cwd=parent_dir,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    import tempfile
+    with tempfile.TemporaryDirectory() as cache_dir:
+        run_child("cache", cache_dir)  # populate the cache once
+        print(f"{'loader':<28} {'median load (ms)':>16} {'RSS growth (MB)':>16} {'float64 cols':>13}")
+        for label, args in [("pd.read_csv (current)", ("csv",)),
+                            ("typed CSV parse, no cache", ("typed-csv",)),
+                            ("binary cache (mmap)", ("cache", cache_dir))]:
+            results = [run_child(*args) for _ in range(RUNS)]
+            seconds = sorted(r["seconds"] for r in results)[RUNS // 2]
+            rss = sorted(r["rss_delta"] for r in results)[RUNS // 2]
+            print(f"{label:<28} {seconds * 1000:>16.1f} {rss / 2**20:>16.1f} {results[0]['numeric_cols']:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Benchmark: vectorized takeoff costing (rsmeans_utils.cost_takeoff) at growing takeoff sizes.
+# Run from the repository root:  python benchmarks/bench_takeoff.py
+
+import sys
+import time
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+import pandas as pd
+
+from cost_data.rsmeans_utils import load_rsmeans_data, cost_takeoff
+from cost_data.rsmeans_index import get_rsmeans_index
+
+SIZES = [100, 1_000, 10_000, 100_000]
+
+
+def random_takeoff(df, n, rng):
+    """Mix of full line numbers and bare section codes (with and without units)."""
+    rows = rng.integers(0, len(df), n)
+    codes = df['Masterformat Section Code'].to_numpy()[rows]
+    ids = df['ID'].fillna('').to_numpy()[rows]
+    full_line = rng.random(n) < 0.7
+    code = np.where(full_line, np.char.add(np.char.add(codes.astype(str), ' '), ids.astype(str)), codes)
+    unit = np.where(rng.random(n) < 0.5, 'S.F.', None)
+    return pd.DataFrame({'code': code, 'quantity': rng.random(n) * 100, 'unit': unit})
+
+
+def main():
+    df = load_rsmeans_data()
+    start = time.perf_counter()
+    get_rsmeans_index(df).costing_tables
+    print(f"costing tables built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+    rng = np.random.default_rng(0)
+    print(f"{'lines':>8} {'cost (ms)':>10} {'matched':>8}")
+    for n in SIZES:
+        takeoff = random_takeoff(df, n, rng)
+        start = time.perf_counter()
+        result = cost_takeoff(df, takeoff)
+        elapsed = time.perf_counter() - start
+        print(f"{n:>8} {elapsed * 1000:>10.1f} {result['totals']['matched_lines']:>8}")
+
+
+if __name__ == "__main__":
+    main()
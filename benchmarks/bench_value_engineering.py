@@ -0,0 +1,42 @@
+# Benchmark: value-engineering substitution search (rsmeans_utils.value_engineer) on random
+# takeoffs of growing size, with the target set to a share of the largest possible saving.
+# Run from the repository root:  python benchmarks/bench_value_engineering.py
+
+import sys
+import time
+from pathlib import Path
+parent_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(parent_dir))
+
+import numpy as np
+
+from cost_data.rsmeans_utils import load_rsmeans_data, cost_takeoff
+from cost_data.rsmeans_index import get_rsmeans_index
+from cost_data.value_engineering import optimize_substitutions
+from bench_takeoff import random_takeoff
+
+SIZES = [100, 1_000, 5_000, 10_000]
+TARGET_SHARE = 0.3  # of the largest saving available for the takeoff
+
+
+def main():
+    df = load_rsmeans_data()
+    index = get_rsmeans_index(df)
+    start = time.perf_counter()
+    index.alternative_tables
+    print(f"alternative tables built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+    rng = np.random.default_rng(0)
+    print(f"{'lines':>8} {'search (ms)':>12} {'solutions':>10} {'substitutions':>14}")
+    for n in SIZES:
+        lines = cost_takeoff(df, random_takeoff(df, n, rng))['lines']
+        probe = optimize_substitutions(index.costing_tables, index.alternative_tables, lines, float('inf'))
+        target = TARGET_SHARE * probe['max_saving']
+        start = time.perf_counter()
+        result = optimize_substitutions(index.costing_tables, index.alternative_tables, lines, target)
+        elapsed = time.perf_counter() - start
+        counts = "/".join(str(s['count']) for s in result['solutions'])
+        print(f"{n:>8} {elapsed * 1000:>12.1f} {len(result['solutions']):>10} {counts:>14}")
+
+
+if __name__ == "__main__":
+    main()
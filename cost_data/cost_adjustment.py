@@ -0,0 +1,267 @@
+# Location and escalation adjustment of RSMeans costs.
+# combined.csv holds national-average prices for one base year. This module loads a
+# versioned city cost index (per Masterformat division, national average = 100) and a
+# yearly escalation index from cost_data/location_index/<version>/ and turns them into
+# per-division multipliers that are broadcast over matched rows in one vectorized step.
+# No index data ships with the repository (City Cost Index tables are licensed). Until a
+# version is installed, every adjustment is the identity (national average, base-year
+# costs) and an explicit location or year is rejected. A version directory holds:
+#   manifest.json        - {"version", "rsmeans_base_year", "city_cost_index", "escalation"}
+#   city cost index CSV  - zip_prefix, city, state, division ("ALL" = weighted average),
+#                          material, installation, total (national average = 100)
+#   escalation CSV       - year, index
+
+import bisect
+import functools
+import json
+import logging
+import os
+import re
+
+import pandas as pd
+
+from cost_data.rsmeans_index import CODE_COLUMN
+
+COST_INDEX_DIR = "cost_data/location_index"
+COST_INDEX_VERSION = "v1"
+
+logger = logging.getLogger("app_logger")
+
+# Which index component scales which RSMeans column
+FACTOR_COLUMNS = {
+    'Material': 'material',
+    'Labor': 'installation',
+    'Equipment': 'installation',
+    'Total': 'total',
+    'Total Incl O&P': 'total',
+}
+# Short names people use in questions that aren't a prefix of the city name
+CITY_ALIASES = {"nyc": "new york", "dc": "washington"}
+# Years past the end of the escalation table are extrapolated at the mean rate of this many years
+EXTRAPOLATION_YEARS = 5
+
+# A 20xx number in a question is only a year with year context around it ("in 2025", "by 2027",
+# "2025 dollars"), and never when a unit follows it ("2000 sf", "2050 LF")
+_YEAR_BEFORE_RE = re.compile(r"\b(?:in|by|for|during|from|since|until|through|to|year|fy)\s+(20\d{2})\b", re.I)
+_YEAR_AFTER_RE = re.compile(r"\b(20\d{2})[\s-]*(?:dollars|usd|\$|prices?|pricing|costs?|rates?|levels?)\b", re.I)
+_UNIT_AFTER_RE = re.compile(
+    r"\s*(?:sf|s\.f\.|sq\.?\s*f(?:ee)?t|square|lf|l\.f\.|linear|lin\.?\s*ft|cy|c\.y\.|cubic|sy|s\.y\.|msf|clf|"
+    r"mbf|bf|ea|each|units?|tons?|lbs?|pounds?|gal(?:lons?)?|ft|feet|foot|yards?|yd|m2|m3|m|meters?|sq\b|"
+    r"rooms?|beds?|stalls?|spaces?|apartments?|homes?|houses?|pcs|pieces?|doors?|windows?)\b", re.I)
+
+
+class CostIndexTables:
+    """
+    One version of the location/escalation tables:
+      - city: rows of (zip_prefix, city, state, division, material, installation, total)
+      - escalation: Series of index values by year
+      - base_year: the year RSMeans prices in combined.csv are expressed in
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "manifest.json"), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest["version"]
+        self.base_year = int(self.manifest["rsmeans_base_year"])
+        self.city = pd.read_csv(os.path.join(directory, self.manifest["city_cost_index"]),
+                                dtype={'zip_prefix': str, 'division': str})
+        escalation = pd.read_csv(os.path.join(directory, self.manifest["escalation"]))
+        self.escalation = escalation.set_index('year')['index'].sort_index()
+
+        locations = self.city[['zip_prefix', 'city', 'state']].drop_duplicates('zip_prefix')
+        self.locations = {row.zip_prefix: f"{row.city}, {row.state}" for row in locations.itertuples()}
+        # Sorted lowercase city names for prefix lookup with bisect
+        by_city = sorted((row.city.lower(), row.zip_prefix) for row in locations.itertuples())
+        self._city_names = [name for name, _ in by_city]
+        self._city_zips = [zip_prefix for _, zip_prefix in by_city]
+
+    def find_location(self, location):
+        """
+        Resolve a ZIP code / ZIP prefix ("02134", "021") or a city name prefix ("bost", "New York, NY")
+        to the 3-digit ZIP prefix used as the location key. Returns None if nothing matches.
+        """
+        if location is None:
+            return None
+        text = str(location).strip().lower()
+        if not text:
+            return None
+        digits = re.match(r"^(\d{3})\d{0,2}$", text)
+        if digits:
+            return digits.group(1) if digits.group(1) in self.locations else None
+        text = CITY_ALIASES.get(text, text).split(',')[0].strip()
+        i = bisect.bisect_left(self._city_names, text)
+        if i < len(self._city_names) and self._city_names[i].startswith(text):
+            return self._city_zips[i]
+        return None
+
+    def detect_location(self, text):
+        """
+        Find a known ZIP code or city name mentioned in free text (e.g. a user question).
+        Returns the ZIP prefix or None.
+        """
+        lowered = str(text).lower()
+        for zip_code in re.findall(r"\b\d{5}\b", lowered):
+            if zip_code[:3] in self.locations:
+                return zip_code[:3]
+        for alias, city in CITY_ALIASES.items():
+            if re.search(rf"\b{re.escape(alias)}\b", lowered):
+                return self.find_location(city)
+        for name, zip_prefix in zip(self._city_names, self._city_zips):
+            if re.search(rf"\b{re.escape(name)}\b", lowered):
+                return zip_prefix
+        return None
+
+    def escalation_factor(self, year):
+        """
+        Ratio of the escalation index in `year` to the RSMeans base year.
+        Years after the table are extrapolated at the recent mean annual rate; years before
+        it (or missing from it) return None, and callers skip the escalation.
+        """
+        if year is None:
+            return 1.0
+        year = int(year)
+        index = self.escalation
+        if year in index.index:
+            value = index.loc[year]
+        elif year > index.index[-1]:
+            recent = index.iloc[-(EXTRAPOLATION_YEARS + 1):]
+            rate = (recent.iloc[-1] / recent.iloc[0]) ** (1.0 / max(len(recent) - 1, 1))
+            value = index.iloc[-1] * rate ** (year - index.index[-1])
+        else:
+            return None
+        return float(value / index.loc[self.base_year])
+
+
+class CostAdjustment:
+    """
+    Per-division multipliers for one (location, year). factors(divisions) broadcasts them to
+    rows; divisions without their own index row use the location's weighted average ("ALL").
+    With tables=None (no cost index installed) it is the identity.
+    """
+
+    def __init__(self, tables, zip_prefix=None, year=None):
+        self.zip_prefix = zip_prefix
+        self.year = year
+        self.escalation = tables.escalation_factor(year) if tables is not None else 1.0
+        if self.escalation is None:
+            raise ValueError(f"Year {year} is outside the escalation table of cost index {tables.version}")
+        self.location_name = tables.locations.get(zip_prefix) if zip_prefix else None
+        if zip_prefix is None:
+            self.by_division = pd.DataFrame(columns=['material', 'installation', 'total'], dtype='float64')
+            self.default = pd.Series(1.0, index=['material', 'installation', 'total'])
+        else:
+            rows = tables.city[tables.city['zip_prefix'] == zip_prefix].set_index('division')
+            factors = rows[['material', 'installation', 'total']].astype('float64') / 100.0
+            self.default = factors.loc['ALL'] if 'ALL' in factors.index else pd.Series(1.0, index=factors.columns)
+            self.by_division = factors.drop(index='ALL', errors='ignore')
+        self.by_division = self.by_division * self.escalation
+        self.default = self.default * self.escalation
+
+    @property
+    def is_identity(self):
+        return self.zip_prefix is None and self.escalation == 1.0
+
+    def describe(self):
+        """Short human-readable description for prompts and tables."""
+        parts = []
+        if self.location_name:
+            parts.append(f"location {self.location_name} (ZIP {self.zip_prefix}xx)")
+        if self.year is not None:
+            parts.append(f"{self.year} dollars (escalation x{self.escalation:.3f})")
+        if not parts:
+            return "National average, base-year costs"
+        return "Costs adjusted to " + " and ".join(parts)
+
+    def factors(self, divisions):
+        """DataFrame of material/installation/total multipliers, one row per division value."""
+        divisions = pd.Series(divisions).astype('string')
+        factors = self.by_division.reindex(divisions.to_numpy())
+        factors = factors.fillna(self.default)
+        factors.index = divisions.index
+        return factors
+
+    def apply(self, df):
+        """
+        Return a copy of an RSMeans DataFrame with cost columns scaled by the division factors.
+        """
+        if self.is_identity:
+            return df
+        adjusted = df.copy()
+        factors = self.factors(df[CODE_COLUMN].str.slice(0, 2))
+        for col, component in FACTOR_COLUMNS.items():
+            if col in adjusted.columns:
+                adjusted[col] = adjusted[col].to_numpy(dtype='float64') * factors[component].to_numpy()
+        return adjusted
+
+
+@functools.lru_cache(maxsize=8)
+def load_cost_index(version=COST_INDEX_VERSION):
+    """
+    Load (and cache) one version of the location/escalation tables, or None if that version
+    is not installed in COST_INDEX_DIR.
+    """
+    directory = os.path.join(COST_INDEX_DIR, version)
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        return None
+    return CostIndexTables(directory)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_adjustment(zip_prefix, year, version):
+    return CostAdjustment(load_cost_index(version), zip_prefix, year)
+
+
+def get_cost_adjustment(location=None, year=None, version=COST_INDEX_VERSION):
+    """
+    Return the (cached) CostAdjustment for a location (ZIP / ZIP prefix / city prefix) and year.
+    Raises ValueError for a location that is not in the index, a year before the escalation
+    table, or either of them when no cost index is installed.
+    """
+    tables = load_cost_index(version)
+    if tables is None:
+        if location is not None or year is not None:
+            raise ValueError(f"No cost index {version} installed in {COST_INDEX_DIR}; "
+                             "costs are national average, base-year only")
+        return _cached_adjustment(None, None, version)
+    zip_prefix = tables.find_location(location)
+    if location is not None and zip_prefix is None:
+        raise ValueError(f"Unknown location '{location}' in cost index {version}")
+    return _cached_adjustment(zip_prefix, None if year is None else int(year), version)
+
+
+def detect_year(text):
+    """
+    The last year (2000-2099) mentioned with year context in free text ("in 2025",
+    "2025 dollars", "by 2027"), or None. Quantities such as "2000 sf" are not years.
+    """
+    text = str(text)
+    years = []
+    for pattern in (_YEAR_BEFORE_RE, _YEAR_AFTER_RE):
+        for match in pattern.finditer(text):
+            if not _UNIT_AFTER_RE.match(text, match.end(1)):
+                years.append((match.start(1), int(match.group(1))))
+    return max(years)[1] if years else None
+
+
+def detect_adjustment(text, year=None, version=COST_INDEX_VERSION):
+    """
+    CostAdjustment for the location mentioned in free text and the given year, or else the
+    year detect_year finds in the text, if any. The identity when no cost index is installed.
+    """
+    tables = load_cost_index(version)
+    if tables is None:
+        return _cached_adjustment(None, None, version)
+    zip_prefix = tables.detect_location(text)
+    year = detect_year(text) if year is None else int(year)
+    if year is not None and tables.escalation_factor(year) is None:
+        logger.warning({"event": "cost_index_year_missing", "year": year, "version": version,
+                        "fallback": "base-year costs"})
+        year = None
+    return _cached_adjustment(zip_prefix, year, version)
+
+
+def adjust_costs(df, location=None, year=None, version=COST_INDEX_VERSION):
+    """
+    Scale RSMeans cost columns for location and year (see CostAdjustment.apply).
+    """
+    return get_cost_adjustment(location, year, version).apply(df)
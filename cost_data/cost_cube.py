@@ -0,0 +1,258 @@
+# Materialized aggregate "cube" over the RSMeans table for design-cost comparisons.
+# Line items are tagged with a material family (concrete, steel, timber, ...) and the
+# distributions of unit cost, labor-hours and daily output are precomputed per
+# (division, unit), (section, unit) and (family, unit). The cube is written to
+# cache/rsmeans/ keyed by the dataset hash, so a comparison is a few dict lookups.
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from cost_data.rsmeans_index import CODE_COLUMN
+from cost_data.rsmeans_costing import normalize_unit
+from cost_data.rsmeans_store import RSMEANS_CACHE_DIR
+
+CUBE_FORMAT_VERSION = 1
+
+logger = logging.getLogger("app_logger")
+
+# Metric name -> RSMeans column
+CUBE_METRICS = {
+    'unit_cost': 'Total Incl O&P',
+    'labor_hours': 'Labor-Hours',
+    'daily_output': 'Daily Output',
+}
+# Quantiles instead of min/max: combined.csv has OCR outliers that would dominate the extremes
+CUBE_QUANTILES = {'p10': 0.10, 'p25': 0.25, 'median': 0.50, 'p75': 0.75, 'p90': 0.90}
+CUBE_LEVELS = ('division', 'section', 'family')
+
+# Material family tagging: (family, regex on "section name + item name", divisions or None).
+# The first matching rule wins; untagged rows fall back to FAMILY_DEFAULTS by division.
+FAMILY_RULES = [
+    ('formwork', r"\bforms?\b|formwork|forming", ('03',)),
+    ('reinforcing steel', r"reinforcing|rebar|welded wire", ('03',)),
+    ('precast concrete', r"precast|pre-cast|tilt-up", None),
+    ('stainless steel', r"stainless", None),
+    ('aluminum', r"alumin", None),
+    ('timber', r"\b(?:wood|timber|lumber|glulam|clt)\b|cross[- ]laminated", None),
+    ('masonry', r"masonry|\bbricks?\b|\bcmu\b|concrete block|\bstone\b", None),
+    ('glass', r"\bglass|glazing", None),
+    ('asphalt', r"asphalt|bitumin", None),
+    ('cold-formed steel', r"cold-formed|stud walls?|lightweight framing|metal stud", ('05',)),
+]
+FAMILY_DEFAULTS = {'03': 'concrete', '05': 'steel', '31': 'earthwork'}
+
+# Words people use for a system in a question -> family. Longer phrases are matched first,
+# so "precast concrete" is not also read as "concrete".
+FAMILY_ALIASES = {
+    'concrete': 'concrete', 'cast-in-place': 'concrete', 'cast in place': 'concrete',
+    'reinforced concrete': 'concrete',
+    'precast': 'precast concrete', 'precast concrete': 'precast concrete', 'tilt-up': 'precast concrete',
+    'steel': 'steel', 'structural steel': 'steel', 'steel frame': 'steel',
+    'cold-formed steel': 'cold-formed steel', 'metal stud': 'cold-formed steel', 'light gauge': 'cold-formed steel',
+    'stainless': 'stainless steel', 'stainless steel': 'stainless steel',
+    'aluminum': 'aluminum', 'aluminium': 'aluminum',
+    'timber': 'timber', 'wood': 'timber', 'mass timber': 'timber', 'clt': 'timber',
+    'cross-laminated timber': 'timber', 'cross laminated timber': 'timber', 'glulam': 'timber',
+    'masonry': 'masonry', 'brick': 'masonry', 'cmu': 'masonry', 'block': 'masonry', 'stone': 'masonry',
+    'glass': 'glass', 'glazing': 'glass', 'curtain wall': 'glass',
+    'rebar': 'reinforcing steel', 'reinforcing': 'reinforcing steel',
+    'formwork': 'formwork',
+    'asphalt': 'asphalt',
+    'earthwork': 'earthwork', 'excavation': 'earthwork', 'backfill': 'earthwork',
+}
+_ALIAS_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(a) for a in sorted(FAMILY_ALIASES, key=len, reverse=True)) + r")\b"
+)
+
+
+def tag_material_families(df):
+    """
+    Return a Series with the material family of each RSMeans row (None if untagged).
+    """
+    text = (df['Section Name'].fillna('') + ' ' + df['Name'].fillna('')).str.lower()
+    division = df[CODE_COLUMN].fillna('').str.slice(0, 2)
+    conditions, choices = [], []
+    for family, pattern, divisions in FAMILY_RULES:
+        hit = text.str.contains(pattern, regex=True)
+        if divisions is not None:
+            hit &= division.isin(divisions)
+        conditions.append(hit.to_numpy())
+        choices.append(family)
+    default = division.map(FAMILY_DEFAULTS).to_numpy(dtype=object)
+    return pd.Series(np.select(conditions, choices, default=default), index=df.index, dtype=object)
+
+
+def detect_families(text):
+    """
+    Material families mentioned in free text, in order of first mention (no duplicates).
+    """
+    families = []
+    for match in _ALIAS_RE.finditer(str(text).lower()):
+        family = FAMILY_ALIASES[match.group(0)]
+        if family not in families:
+            families.append(family)
+    return families
+
+
+def cube_cache_key(df):
+    """
+    Hash identifying the cube for this DataFrame: the CSV hash recorded by the typed loader
+    (or a hash of the relevant columns), the cube format and the tagging rules.
+    """
+    digest = hashlib.sha256()
+    csv_hash = df.attrs.get('rsmeans_sha256')
+    if csv_hash:
+        digest.update(csv_hash.encode('utf-8'))
+    else:
+        cols = [CODE_COLUMN, 'Section Name', 'Name', 'Unit'] + list(CUBE_METRICS.values())
+        digest.update(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().tobytes())
+    digest.update(json.dumps([CUBE_FORMAT_VERSION, FAMILY_RULES, FAMILY_DEFAULTS]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _describe_groups(frame, key_column):
+    """
+    One record per (key, unit) with item count, dominant division and quantiles of each metric.
+    """
+    grouped = frame.groupby([key_column, 'unit'], sort=True)
+    quantiles = grouped[list(CUBE_METRICS)].quantile(list(CUBE_QUANTILES.values()))
+    counts = grouped.size()
+    divisions = grouped['division'].agg(lambda s: s.value_counts().index[0])
+    records = []
+    for (key, unit), n in counts.items():
+        q = quantiles.loc[(key, unit)]
+        metrics = {}
+        for metric in CUBE_METRICS:
+            values = q[metric].to_numpy(dtype='float64')
+            metrics[metric] = {name: (None if np.isnan(v) else float(v))
+                               for name, v in zip(CUBE_QUANTILES, values)}
+        records.append({'key': key, 'unit': unit, 'n': int(n),
+                        'division': divisions.loc[(key, unit)], 'metrics': metrics})
+    return records
+
+
+def build_cube_records(df):
+    """
+    Compute the cube for an RSMeans DataFrame as plain JSON-serializable records.
+    Units are forward-filled within a section (RSMeans prints them once per run of items).
+    """
+    units = df['Unit'].map(normalize_unit).groupby(df[CODE_COLUMN], sort=False).ffill()
+    frame = pd.DataFrame({
+        'division': df[CODE_COLUMN].str.slice(0, 2),
+        'section': df[CODE_COLUMN],
+        'family': tag_material_families(df),
+        'unit': units,
+    })
+    for metric, col in CUBE_METRICS.items():
+        frame[metric] = df[col].to_numpy(dtype='float64')
+    frame = frame.dropna(subset=['unit'])
+    frame = frame[frame[list(CUBE_METRICS)].notna().any(axis=1)]
+    return {level: _describe_groups(frame.dropna(subset=[level]), level) for level in CUBE_LEVELS}
+
+
+class CostCube:
+    """
+    Precomputed RSMeans distributions, looked up by (level, key, unit):
+
+    - level 'division': key is the 2-digit Masterformat division ("03")
+    - level 'section': key is the Masterformat section code ("03 30 53.40")
+    - level 'family': key is a material family ("concrete", "steel", ...)
+
+    Each entry holds the item count 'n', the dominant 'division' and p10/p25/median/p75/p90
+    of unit_cost (Total Incl O&P), labor_hours and daily_output.
+    """
+
+    def __init__(self, records, key=None):
+        self.key = key
+        self._entries = {}
+        self._units = {}
+        for level, level_records in records.items():
+            entries = {(r['key'], r['unit']): r for r in level_records}
+            self._entries[level] = entries
+            by_key = {}
+            for r in sorted(level_records, key=lambda r: -r['n']):
+                by_key.setdefault(r['key'], []).append(r['unit'])
+            self._units[level] = by_key
+
+    def keys(self, level):
+        return list(self._units.get(level, {}))
+
+    def units(self, level, key):
+        """Units priced for a key, most common first."""
+        return self._units.get(level, {}).get(key, [])
+
+    def get(self, level, key, unit):
+        """The cube entry for (level, key, unit), or None."""
+        return self._entries.get(level, {}).get((key, normalize_unit(unit) or unit))
+
+    def compare(self, keys, level='family', max_units=4, adjustment=None):
+        """
+        Side-by-side distribution table for several keys (e.g. ["steel", "concrete"]).
+        Each key contributes its max_units most common units. Cost quantiles are scaled by
+        the CostAdjustment's 'total' factor of the entry's division if one is given.
+        Returns (DataFrame, list of keys with no data).
+        """
+        entries, missing = [], []
+        for key in keys:
+            units = self.units(level, key)[:max_units]
+            if not units:
+                missing.append(key)
+            entries.extend((key, self._entries[level][(key, unit)]) for unit in units)
+        factors = np.ones(len(entries))
+        if entries and adjustment is not None and not adjustment.is_identity:
+            factors = adjustment.factors([entry['division'] for _, entry in entries])['total'].to_numpy()
+        rows = []
+        for (key, entry), factor in zip(entries, factors):
+            cost = entry['metrics']['unit_cost']
+            rows.append({
+                level: key,
+                'unit': entry['unit'],
+                'items': entry['n'],
+                'cost p25': _scaled(cost['p25'], factor),
+                'cost median': _scaled(cost['median'], factor),
+                'cost p75': _scaled(cost['p75'], factor),
+                'labor-hours median': entry['metrics']['labor_hours']['median'],
+                'daily output median': entry['metrics']['daily_output']['median'],
+            })
+        return pd.DataFrame(rows), missing
+
+
+def _scaled(value, factor):
+    return None if value is None else round(float(value * factor), 2)
+
+
+def _cube_path(cache_dir, key):
+    return os.path.join(cache_dir, f"cube_{key[:16]}.json")
+
+
+def load_cost_cube(df, cache_dir=None):
+    """
+    Return the CostCube for an RSMeans DataFrame, reading it from cache_dir if a cube with
+    the same key exists there and building (and writing) it otherwise.
+    """
+    cache_dir = cache_dir or RSMEANS_CACHE_DIR
+    key = cube_cache_key(df)
+    path = _cube_path(cache_dir, key)
+    try:
+        with open(path, encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('key') == key:
+            return CostCube(stored['levels'], key=key)
+    except (OSError, ValueError, KeyError):
+        pass
+    records = build_cube_records(df)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format_version': CUBE_FORMAT_VERSION, 'key': key, 'levels': records}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning({"event": "cost_cube_cache_write_failed", "cache_dir": cache_dir, "error": str(e)})
+    return CostCube(records, key=key)
@@ -0,0 +1,218 @@
+# Vectorized bill-of-quantities costing against the RSMeans table.
+# A takeoff (e.g. exported from Grasshopper) is joined to per-line and per-section unit
+# prices with pandas merges, so thousands of lines are costed without any LLM call.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from cost_data.rsmeans_index import CODE_COLUMN, normalize_code
+from cost_data.cost_adjustment import FACTOR_COLUMNS
+
+# RSMeans unit-price columns and the snake_case names used in takeoff results
+COST_COLUMNS = {
+    'Material': 'material',
+    'Labor': 'labor',
+    'Equipment': 'equipment',
+    'Total': 'total',
+    'Total Incl O&P': 'total_incl_op',
+}
+
+# Unit spellings seen in combined.csv (including common OCR slips) and in takeoffs
+UNIT_ALIASES = {
+    'eo': 'ea', 'eq': 'ea', 'each': 'ea',
+    'le': 'lf', 'lnft': 'lf', 'linft': 'lf',
+    'sqft': 'sf', 'sqyd': 'sy',
+    'cuyd': 'cy', 'cuft': 'cf',
+    'lb': 'lb', 'lbs': 'lb',
+    'tons': 'ton',
+}
+_UNIT_RE = re.compile(r"[a-z][a-z&]*")
+
+# "<section code> <line number>", e.g. "03 35 43.10 0110" or "03 35 43.10 110"
+LINE_CODE_RE = r"^\s*(?P<section>\d{2}\s*\d{2}\s*\d{2}(?:\.\d{2})?)\s+(?P<line>\d{1,4}(?:\.0)?)\s*$"
+
+
+def normalize_unit(unit):
+    """
+    Normalize a unit string ("S.F.", "Ea .", "LF.") to a compact key ("sf", "ea", "lf").
+    Returns None for missing units and for OCR noise (numbers, ditto marks, symbols).
+    """
+    if unit is None or (isinstance(unit, float) and np.isnan(unit)):
+        return None
+    key = re.sub(r"[\s.]", "", str(unit).lower())
+    key = UNIT_ALIASES.get(key, key)
+    return key if _UNIT_RE.fullmatch(key) else None
+
+
+def normalize_line_id(line_id):
+    """
+    RSMeans line numbers are 4 digits ("110" -> "0110", "380.0" -> "0380").
+    Non-numeric IDs are returned normalized as-is.
+    """
+    if line_id is None or (isinstance(line_id, float) and np.isnan(line_id)):
+        return None
+    text = str(line_id).strip()
+    try:
+        return f"{int(float(text)):04d}"
+    except ValueError:
+        return text.replace(' ', '').lower()
+
+
+class CostingTables:
+    """
+    Join tables for cost_takeoff, built once per RSMeans DataFrame:
+
+    - lines: one row per line item, keyed by normalized "<section code> <line id>"
+    - section_units: median unit prices per (section code, unit)
+    - sections: median unit prices per section code (any unit)
+
+    Units are forward-filled within a section, because RSMeans only prints the unit on
+    the first row of a run of items.
+    """
+
+    def __init__(self, df):
+        cost_cols = [c for c in COST_COLUMNS if c in df.columns]
+        code_norm = df[CODE_COLUMN].map(normalize_code)
+        line_ids = df['ID'].map(normalize_line_id)
+        units = df['Unit'].map(normalize_unit).groupby(code_norm, sort=False).ffill()
+
+        base = pd.DataFrame({
+            'code_norm': code_norm.to_numpy(),
+            'matched_code': df[CODE_COLUMN].to_numpy(),
+            'matched_section': df['Section Name'].to_numpy(),
+            'matched_name': df['Name'].to_numpy(),
+            'rsmeans_unit': units.to_numpy(),
+        })
+        for col in cost_cols:
+            base['unit_' + COST_COLUMNS[col]] = df[col].to_numpy(dtype='float64')
+        self.price_columns = ['unit_' + COST_COLUMNS[c] for c in cost_cols]
+
+        priced = base[base['unit_total_incl_op'].notna()] if 'unit_total_incl_op' in base else base
+        line_key = code_norm + line_ids.fillna('')
+        self.lines = (
+            base.assign(key=line_key.to_numpy())[line_ids.notna().to_numpy()]
+            .drop_duplicates('key')
+            .set_index('key')
+        )
+        self.section_units = (
+            priced.dropna(subset=['rsmeans_unit'])
+            .groupby(['code_norm', 'rsmeans_unit'], sort=False)
+            .agg(**{c: (c, 'median') for c in self.price_columns},
+                 matched_code=('matched_code', 'first'),
+                 matched_section=('matched_section', 'first'))
+        )
+        self.section_units['rsmeans_unit'] = self.section_units.index.get_level_values('rsmeans_unit')
+        self.sections = (
+            priced.groupby('code_norm', sort=False)
+            .agg(**{c: (c, 'median') for c in self.price_columns},
+                 matched_code=('matched_code', 'first'),
+                 matched_section=('matched_section', 'first'),
+                 rsmeans_unit=('rsmeans_unit', _most_common))
+        )
+
+
+def _most_common(units):
+    """Most frequent non-null unit of a section (None if the section has no units)."""
+    counts = units.value_counts()
+    return counts.index[0] if len(counts) else None
+
+
+def _as_takeoff_frame(takeoff):
+    """Accept a DataFrame, a list of dicts or a dict of lists with code/quantity[/unit/id]."""
+    frame = takeoff.copy() if isinstance(takeoff, pd.DataFrame) else pd.DataFrame(takeoff)
+    if 'code' not in frame.columns or 'quantity' not in frame.columns:
+        raise ValueError("Takeoff needs 'code' and 'quantity' columns")
+    frame = frame.reset_index(drop=True)
+    frame['quantity'] = pd.to_numeric(frame['quantity'], errors='coerce')
+    if 'unit' not in frame.columns:
+        frame['unit'] = None
+    return frame
+
+
+def price_takeoff(tables, takeoff, adjustment=None):
+    """
+    Cost a takeoff against the RSMeans CostingTables.
+
+    Each takeoff row needs 'code' (a Masterformat section code such as "03 35 43.10", or a
+    full line number such as "03 35 43.10 0110") and 'quantity'. Optional 'unit' selects the
+    section's items priced in that unit; optional 'id' is appended to 'code' as the line number.
+    Rows are matched in order: exact line item, section + unit median, section median.
+    If a CostAdjustment is given, unit prices are scaled by its per-division location /
+    escalation factors before extension.
+
+    Returns a dict with
+      - 'lines': the takeoff with matched RSMeans info, unit prices, extended costs and
+        'match' ('line', 'section_unit', 'section' or None) and 'unit_mismatch'
+      - 'divisions': extended costs summed per Masterformat division (first two digits)
+      - 'totals': grand totals plus matched/unmatched line counts
+    """
+    frame = _as_takeoff_frame(takeoff)
+    codes = frame['code'].astype(str)
+    parts = codes.str.extract(LINE_CODE_RE)
+    has_line = parts['line'].notna()
+    code_norm = codes.map(normalize_code)
+    code_norm[has_line] = parts.loc[has_line, 'section'].map(normalize_code) + parts.loc[has_line, 'line'].map(normalize_line_id)
+    if 'id' in frame.columns:
+        ids = frame['id'].map(normalize_line_id)
+        code_norm = code_norm.where(ids.isna() | has_line, code_norm + ids.fillna(''))
+    unit_norm = frame['unit'].map(normalize_unit)
+
+    # 1. exact line items
+    by_line = tables.lines.reindex(code_norm.to_numpy())
+    by_line.index = frame.index
+    # 2. section + unit median (only where the takeoff gives a unit)
+    su_index = pd.MultiIndex.from_arrays([code_norm.to_numpy(), unit_norm.to_numpy()])
+    by_section_unit = tables.section_units.reindex(su_index)
+    by_section_unit.index = frame.index
+    # 3. section median
+    by_section = tables.sections.reindex(code_norm.to_numpy())
+    by_section.index = frame.index
+
+    line_hit = by_line['matched_code'].notna()
+    su_hit = ~line_hit & by_section_unit['matched_code'].notna()
+    section_hit = ~line_hit & ~su_hit & by_section['matched_code'].notna()
+
+    result_cols = tables.price_columns + ['matched_code', 'matched_section', 'rsmeans_unit']
+    matched = by_section[result_cols].copy()
+    matched.loc[su_hit, result_cols] = by_section_unit.loc[su_hit, result_cols]
+    matched.loc[line_hit, result_cols] = by_line.loc[line_hit, result_cols]
+
+    lines = frame.copy()
+    lines['match'] = np.select([line_hit, su_hit, section_hit], ['line', 'section_unit', 'section'], default=None)
+    lines['matched_code'] = matched['matched_code']
+    lines['matched_section'] = matched['matched_section']
+    lines['matched_name'] = by_line['matched_name'].where(line_hit)
+    lines['rsmeans_unit'] = matched['rsmeans_unit']
+    lines['unit_mismatch'] = (unit_norm.notna() & matched['rsmeans_unit'].notna()
+                              & (unit_norm != matched['rsmeans_unit'])).to_numpy()
+
+    factors = None
+    if adjustment is not None and not adjustment.is_identity:
+        factors = adjustment.factors(lines['matched_code'].str.slice(0, 2))
+    quantity = lines['quantity'].to_numpy(dtype='float64')
+    for source_col, name in COST_COLUMNS.items():
+        col = 'unit_' + name
+        if col not in tables.price_columns:
+            continue
+        unit_price = matched[col].to_numpy(dtype='float64')
+        if factors is not None:
+            unit_price = unit_price * factors[FACTOR_COLUMNS[source_col]].to_numpy()
+        lines[col] = unit_price
+        lines[col[len('unit_'):]] = quantity * unit_price
+
+    extended_cols = [c[len('unit_'):] for c in tables.price_columns]
+    lines['division'] = lines['matched_code'].str.slice(0, 2)
+    divisions = (
+        lines[lines['match'].notna()]
+        .groupby('division', sort=True)[extended_cols]
+        .sum(min_count=1)
+        .assign(lines=lines[lines['match'].notna()].groupby('division', sort=True).size())
+        .reset_index()
+    )
+    totals = {col: float(np.nansum(lines[col].to_numpy(dtype='float64'))) for col in extended_cols}
+    totals['lines'] = int(len(lines))
+    totals['matched_lines'] = int(lines['match'].notna().sum())
+    totals['unmatched_lines'] = totals['lines'] - totals['matched_lines']
+    return {'lines': lines, 'divisions': divisions, 'totals': totals}
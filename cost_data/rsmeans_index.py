@@ -0,0 +1,240 @@
+# Precomputed lookup structures for the RSMeans DataFrame.
+# load_rsmeans_data builds the index once for the loaded table so that code searches don't
+# have to re-normalize and rescan every row of combined.csv on each call. Other frames
+# (filtered or derived copies) have no prebuilt index: code searches on them run as
+# vectorized pandas scans (scan_code_positions) instead of building a throwaway index.
+
+import bisect
+import hashlib
+import weakref
+
+import numpy as np
+
+CODE_COLUMN = 'Masterformat Section Code'
+
+# Sorts after every character that can appear in a normalized code, so that
+# bisecting on (prefix + _PREFIX_END) gives the end of the prefix range.
+_PREFIX_END = chr(0x10FFFF)
+
+
+def normalize_code(code):
+    """
+    Normalize a Masterformat code for fuzzy comparison (drop spaces, lowercase).
+    """
+    return str(code).replace(' ', '').lower()
+
+
+class RSMeansIndex:
+    """
+    Lookup index over the Masterformat Section Code column of an RSMeans DataFrame.
+
+    - exact: raw code -> row positions
+    - prefix: sorted list of normalized codes, searched with bisect
+    - substring: sorted suffix list of normalized codes, searched with bisect (built on
+      the first substring query)
+
+    All lookups return sorted row positions, so df.iloc[positions] gives the same rows
+    (in the same order) as the equivalent boolean-mask filter on the DataFrame.
+    The index assumes the DataFrame is not modified after it is built.
+
+    The lexical section search used by find_by_description, the takeoff costing
+    tables, the value-engineering alternatives and the aggregate cost cube are built on
+    first access to section_search / costing_tables / alternative_tables / cost_cube.
+    """
+
+    def __init__(self, df):
+        codes = df[CODE_COLUMN]
+        self.n_rows = len(df)
+        self._df_ref = weakref.ref(df)
+        self._section_search = None
+        self._costing_tables = None
+        self._alternative_tables = None
+        self._cost_cube = None
+        self._dataset_hash = None
+        self._empty = np.array([], dtype=np.intp)
+
+        # Exact lookup on the raw code values (missing codes never match)
+        self._exact = {
+            code: np.asarray(positions, dtype=np.intp)
+            for code, positions in codes.groupby(codes, sort=False).indices.items()
+        }
+
+        # Several raw codes can share one normalized form ("03 05 13" vs "030513")
+        by_norm = {}
+        for code, positions in self._exact.items():
+            by_norm.setdefault(normalize_code(code), []).append(positions)
+        self._norm_codes = sorted(by_norm)
+        self._norm_positions = [np.sort(np.concatenate(by_norm[code])) for code in self._norm_codes]
+        self._suffixes = None
+        self._suffix_owner = None
+
+    def _build_suffixes(self):
+        # Suffix list: every suffix of every normalized code, tagged with its code index.
+        # A substring query is a prefix query over these suffixes.
+        suffixes = []
+        for code_idx, code in enumerate(self._norm_codes):
+            for start in range(len(code)):
+                suffixes.append((code[start:], code_idx))
+        suffixes.sort()
+        self._suffix_owner = np.array([code_idx for _, code_idx in suffixes], dtype=np.intp)
+        self._suffixes = [suffix for suffix, _ in suffixes]
+
+    @property
+    def section_search(self):
+        """SectionSearch (BM25 over sections and line-item names) for this DataFrame."""
+        if self._section_search is None:
+            from cost_data.rsmeans_search import SectionSearch
+            self._section_search = SectionSearch(self._df_ref())
+        return self._section_search
+
+    @property
+    def costing_tables(self):
+        """CostingTables (line / section unit-price join tables) for this DataFrame."""
+        if self._costing_tables is None:
+            from cost_data.rsmeans_costing import CostingTables
+            self._costing_tables = CostingTables(self._df_ref())
+        return self._costing_tables
+
+    @property
+    def alternative_tables(self):
+        """AlternativeTables (per section/unit price-sorted line items) for value engineering."""
+        if self._alternative_tables is None:
+            from cost_data.value_engineering import AlternativeTables
+            self._alternative_tables = AlternativeTables(self.costing_tables)
+        return self._alternative_tables
+
+    @property
+    def cost_cube(self):
+        """CostCube (precomputed distributions for design-cost comparisons), cached on disk."""
+        if self._cost_cube is None:
+            from cost_data.cost_cube import load_cost_cube
+            self._cost_cube = load_cost_cube(self._df_ref())
+        return self._cost_cube
+
+    @property
+    def dataset_hash(self):
+        """
+        sha256 over the (code, section name) pairs of this DataFrame. Description -> code
+        mappings stay valid as long as this is unchanged.
+        """
+        if self._dataset_hash is None:
+            df = self._df_ref()
+            pairs = df[[CODE_COLUMN, 'Section Name']].drop_duplicates().astype(str)
+            text = "\n".join(sorted((pairs[CODE_COLUMN] + "\t" + pairs['Section Name']).tolist()))
+            self._dataset_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return self._dataset_hash
+
+    def _gather(self, code_indices):
+        """Merge the row positions of the given normalized-code indices, in row order."""
+        if len(code_indices) == 0:
+            return self._empty
+        if len(code_indices) == 1:
+            return self._norm_positions[code_indices[0]]
+        return np.sort(np.concatenate([self._norm_positions[i] for i in code_indices]))
+
+    def exact(self, section_code):
+        """Row positions whose code equals section_code exactly."""
+        return self._exact.get(section_code, self._empty)
+
+    def prefix(self, section_code):
+        """Row positions whose normalized code starts with the normalized section_code."""
+        code_norm = normalize_code(section_code)
+        lo = bisect.bisect_left(self._norm_codes, code_norm)
+        hi = bisect.bisect_left(self._norm_codes, code_norm + _PREFIX_END)
+        return self._gather(range(lo, hi))
+
+    def contains(self, section_code):
+        """Row positions whose normalized code contains the normalized section_code (literal match)."""
+        code_norm = normalize_code(section_code)
+        if not code_norm:
+            return self._gather(range(len(self._norm_codes)))
+        if self._suffixes is None:
+            self._build_suffixes()
+        lo = bisect.bisect_left(self._suffixes, code_norm)
+        hi = bisect.bisect_left(self._suffixes, code_norm + _PREFIX_END)
+        return self._gather(np.unique(self._suffix_owner[lo:hi]))
+
+    def find_code_positions(self, section_code):
+        """
+        Same search order as find_by_section_code: exact, then startswith, then contains.
+        """
+        positions = self.exact(section_code)
+        if len(positions):
+            return positions
+        positions = self.prefix(section_code)
+        if len(positions):
+            return positions
+        return self.contains(section_code)
+
+
+def scan_code_positions(df, section_code, stages=("exact", "prefix", "contains")):
+    """
+    Row positions of find_code_positions computed with pandas string operations, for frames
+    without a prebuilt index. stages limits the search to some of exact / prefix / contains.
+    """
+    codes = df[CODE_COLUMN]
+    if "exact" in stages:
+        positions = np.flatnonzero((codes == section_code).to_numpy())
+        if len(positions) or stages == ("exact",):
+            return positions.astype(np.intp)
+    present = codes.notna().to_numpy()
+    normalized = codes.astype(str).str.replace(' ', '', regex=False).str.lower()
+    code_norm = normalize_code(section_code)
+    if "prefix" in stages:
+        positions = np.flatnonzero(normalized.str.startswith(code_norm).to_numpy() & present)
+        if len(positions) or "contains" not in stages:
+            return positions.astype(np.intp)
+    return np.flatnonzero(normalized.str.contains(code_norm, regex=False).to_numpy() & present).astype(np.intp)
+
+
+# id(df) -> (weakref to df, index). Entries are dropped when the DataFrame is collected.
+_INDEX_CACHE = {}
+
+
+def build_rsmeans_index(df):
+    """
+    Build the RSMeansIndex for this DataFrame and register it, so that code searches on this
+    frame use it (load_rsmeans_data does this for the loaded table).
+    """
+    key = id(df)
+    index = RSMeansIndex(df)
+    _INDEX_CACHE[key] = (weakref.ref(df, lambda _, key=key: _INDEX_CACHE.pop(key, None)), index)
+    return index
+
+
+def prebuilt_rsmeans_index(df):
+    """
+    Return the registered RSMeansIndex for this DataFrame, or None if none was built.
+    """
+    entry = _INDEX_CACHE.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return None
+
+
+def get_rsmeans_index(df):
+    """
+    Return the RSMeansIndex for this DataFrame, building it on first use. Needed for the
+    costing tables, section search and cost cube; plain code searches should go through
+    find_code_positions, which does not build an index.
+    """
+    index = prebuilt_rsmeans_index(df)
+    if index is None:
+        index = build_rsmeans_index(df)
+    return index
+
+
+def find_code_positions(df, section_code, stages=("exact", "prefix", "contains")):
+    """
+    Row positions for section_code: exact, then startswith, then contains (see
+    RSMeansIndex.find_code_positions), from the prebuilt index if the frame has one and
+    from a pandas scan otherwise.
+    """
+    index = prebuilt_rsmeans_index(df)
+    if index is None:
+        return scan_code_positions(df, section_code, stages)
+    if stages == ("exact",):
+        return index.exact(section_code)
+    if stages == ("contains",):
+        return index.contains(section_code)
+    return index.find_code_positions(section_code)
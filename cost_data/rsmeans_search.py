@@ -0,0 +1,65 @@
+# Lexical search over RSMeans sections, used to shortlist candidate Masterformat
+# sections for find_by_description instead of sending the whole section list to the LLM.
+
+import numpy as np
+
+from utils.bm25 import BM25Index, tokenize
+
+CODE_COLUMN = 'Masterformat Section Code'
+SECTION_COLUMN = 'Section Name'
+ITEM_COLUMN = 'Name'
+
+
+class SectionSearch:
+    """
+    BM25 index with one document per (section code, section name) pair.
+    A document is the section name (counted twice, as a field boost), the code and
+    the names of all line items in that section.
+    """
+
+    def __init__(self, df):
+        pairs = df[[CODE_COLUMN, SECTION_COLUMN]].drop_duplicates().reset_index(drop=True)
+        self.codes = pairs[CODE_COLUMN].tolist()
+        self.names = pairs[SECTION_COLUMN].tolist()
+        self.labels = (pairs[CODE_COLUMN] + ': ' + pairs[SECTION_COLUMN]).tolist()
+
+        item_names = (
+            df[ITEM_COLUMN].fillna('')
+            .groupby([df[CODE_COLUMN], df[SECTION_COLUMN]], sort=False)
+            .agg(' '.join)
+        )
+        documents = []
+        for code, name in zip(self.codes, self.names):
+            name_tokens = tokenize(name)
+            documents.append(name_tokens + name_tokens + tokenize(code) + tokenize(item_names.get((code, name), '')))
+        self.bm25 = BM25Index(documents)
+
+    def shortlist(self, description, k):
+        """
+        Return (section indices, scores) of the top-k sections for the description, best first.
+        Only sections sharing at least one term with the description are returned.
+        """
+        return self.bm25.top_k(description, k)
+
+    def confident_code(self, indices, scores, margin):
+        """
+        Return the top section's code if it beats the best section with a *different* code
+        by at least `margin` (relative: (s1 - s2) / s1), otherwise None.
+        """
+        if len(indices) == 0:
+            return None
+        top_code = self.codes[indices[0]]
+        runner_up = 0.0
+        for idx, score in zip(indices[1:], scores[1:]):
+            if self.codes[idx] != top_code:
+                runner_up = score
+                break
+        if (scores[0] - runner_up) / scores[0] >= margin:
+            return top_code
+        return None
+
+    def section_labels(self, indices=None):
+        """'code: name' strings for the given sections (all sections if indices is None)."""
+        if indices is None:
+            return list(self.labels)
+        return [self.labels[i] for i in np.asarray(indices)]
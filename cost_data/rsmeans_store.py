@@ -0,0 +1,191 @@
+# Typed, binary-cached loading of the RSMeans CSV.
+# The CSV stores costs as text ("1,300", "10 %"), which can't be used in arithmetic.
+# Here the numeric columns are parsed to float64 once and written to a columnar cache:
+#   numeric.npy  - float64 array, one row per numeric column (memory-mapped on load)
+#   strings.json - string table for the text columns (null for missing values)
+#   meta.json    - column layout plus the CSV mtime/size/sha256 used for invalidation
+# Percent adders ("For premium ceiling finish, add ... 10 %") are not unit costs: their numeric
+# cells stay NaN so sums and statistics skip them, and the raw text is kept in the
+# 'Percent Adder' column (e.g. "Labor: 10 %") for display.
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+RSMEANS_CACHE_DIR = os.path.join("cache", "rsmeans")
+CACHE_FORMAT_VERSION = 2
+
+logger = logging.getLogger("app_logger")
+
+# Columns parsed to float64. Entries that are not plain numbers (percent adders such
+# as "10 %", OCR noise) become NaN.
+NUMERIC_COLUMNS = ['Daily Output', 'Labor-Hours', 'Material', 'Labor', 'Equipment', 'Total', 'Total Incl O&P']
+# String column with the raw text of a row's percent adders ("Total Incl O&P: 50 %"), else missing
+PERCENT_ADDER_COLUMN = 'Percent Adder'
+PERCENT_RE = r'^\s*\d[\d,]*(?:\.\d+)?\s*%\s*$'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Return the hex sha256 of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_numeric_column(series):
+    """
+    Parse a text cost column ("1,300", "$5.33", " 926 ") to float64.
+    Anything that is not a plain number becomes NaN.
+    """
+    cleaned = series.str.replace(',', '', regex=False).str.replace('$', '', regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+
+
+def percent_adders(df):
+    """
+    Raw text of the percent adders in each row's numeric columns, as "column: value"
+    joined with "; " (None for rows without any).
+    """
+    adders = pd.Series(None, index=df.index, dtype=object)
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            continue
+        text = df[col].where(df[col].str.match(PERCENT_RE, na=False))
+        entry = col + ": " + text.str.strip()
+        adders = adders.where(entry.isna(), adders.str.cat(entry, sep="; ").fillna(entry))
+    return adders
+
+
+def read_typed_csv(csv_path):
+    """
+    Read the RSMeans CSV and parse the numeric columns (no caching).
+    Percent adders become NaN in the numeric columns; their text goes to PERCENT_ADDER_COLUMN.
+    """
+    df = pd.read_csv(csv_path, dtype=str)
+    df[PERCENT_ADDER_COLUMN] = percent_adders(df)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_numeric_column(df[col])
+    return df
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def write_cache(df, csv_path, cache_dir, csv_hash=None):
+    """
+    Write the typed DataFrame to the columnar cache in cache_dir.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    numeric_cols = [c for c in df.columns if c in NUMERIC_COLUMNS]
+    string_cols = [c for c in df.columns if c not in NUMERIC_COLUMNS]
+
+    numeric = np.ascontiguousarray(np.vstack([df[c].to_numpy(dtype='float64') for c in numeric_cols]))
+    tmp_npy = os.path.join(cache_dir, "numeric.tmp.npy")
+    np.save(tmp_npy, numeric)
+    os.replace(tmp_npy, os.path.join(cache_dir, "numeric.npy"))
+
+    strings = {c: [None if pd.isna(v) else v for v in df[c].tolist()] for c in string_cols}
+    _write_json(os.path.join(cache_dir, "strings.json"), strings)
+
+    stat = os.stat(csv_path)
+    meta = {
+        "format_version": CACHE_FORMAT_VERSION,
+        "csv_path": os.path.abspath(csv_path),
+        "csv_mtime_ns": stat.st_mtime_ns,
+        "csv_size": stat.st_size,
+        "csv_sha256": csv_hash or file_sha256(csv_path),
+        "n_rows": len(df),
+        "columns": list(df.columns),
+        "numeric_columns": numeric_cols,
+        "string_columns": string_cols,
+    }
+    # meta.json goes last: a cache without it is never considered valid
+    _write_json(os.path.join(cache_dir, "meta.json"), meta)
+    return meta
+
+
+def read_cache_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def validate_cache(csv_path, cache_dir):
+    """
+    Return the cache metadata if the cache matches the CSV, otherwise None.
+    mtime/size are checked first; if they changed the CSV hash decides, and a matching
+    hash just refreshes the stored mtime (e.g. after a fresh git checkout).
+    """
+    meta = read_cache_meta(cache_dir)
+    if meta is None or meta.get("format_version") != CACHE_FORMAT_VERSION:
+        return None
+    stat = os.stat(csv_path)
+    if meta["csv_mtime_ns"] == stat.st_mtime_ns and meta["csv_size"] == stat.st_size:
+        return meta
+    if meta["csv_sha256"] != file_sha256(csv_path):
+        return None
+    meta["csv_mtime_ns"] = stat.st_mtime_ns
+    meta["csv_size"] = stat.st_size
+    try:
+        _write_json(os.path.join(cache_dir, "meta.json"), meta)
+    except OSError:
+        pass  # the hash check will simply run again next time
+    return meta
+
+
+def read_cache(cache_dir, meta, mmap=True):
+    """
+    Build the DataFrame from the cache. Numeric columns are read-only views over
+    the memory-mapped numeric.npy when mmap is True.
+    """
+    numeric = np.load(os.path.join(cache_dir, "numeric.npy"), mmap_mode='r' if mmap else None)
+    with open(os.path.join(cache_dir, "strings.json"), encoding='utf-8') as f:
+        strings = json.load(f)
+    data = {}
+    for col in meta["columns"]:
+        if col in strings:
+            data[col] = strings[col]
+        else:
+            data[col] = numeric[meta["numeric_columns"].index(col)]
+    return pd.DataFrame(data, copy=False)
+
+
+def load_typed_rsmeans(csv_path, cache_dir=None, mmap=True):
+    """
+    Load the RSMeans CSV with numeric cost columns, going through the binary cache.
+    The cache is rebuilt when the CSV changes. The CSV sha256 is stored in
+    df.attrs['rsmeans_sha256'].
+    """
+    if cache_dir is None:
+        cache_dir = RSMEANS_CACHE_DIR
+    meta = validate_cache(csv_path, cache_dir)
+    if meta is not None:
+        try:
+            df = read_cache(cache_dir, meta, mmap=mmap)
+        except (OSError, ValueError, KeyError):
+            meta = None
+    if meta is None:
+        df = read_typed_csv(csv_path)
+        try:
+            meta = write_cache(df, csv_path, cache_dir)
+        except OSError as e:
+            # Read-only checkout etc. - still usable, just no warm start next time
+            logger.warning({"event": "rsmeans_cache_write_failed", "cache_dir": cache_dir, "error": str(e)})
+            meta = {"csv_sha256": file_sha256(csv_path)}
+    df.attrs['rsmeans_sha256'] = meta["csv_sha256"]
+    return df
@@ -1,26 +1,88 @@
 # This is a utility module for handling RSMeans csv data.
 # It includes functions to read, filter, and process the data for use in cost estimation tasks.
 
+import re
+
+import numpy as np
 import pandas as pd
 import server.config as config
+from cost_data.rsmeans_index import build_rsmeans_index, find_code_positions, get_rsmeans_index
+from cost_data.rsmeans_costing import price_takeoff, normalize_unit
+from cost_data.cost_adjustment import get_cost_adjustment
+from cost_data.cost_cube import detect_families
+from cost_data.value_engineering import optimize_substitutions
+from cost_data.rsmeans_store import PERCENT_ADDER_COLUMN, load_typed_rsmeans, read_typed_csv
+from utils.cache_utils import TieredCache, make_key
 
 # For reference, the following are the columns in the RSMeans DataFrame:
 # ['Masterformat Section Code', 'Section Name', 'ID', 'Name', 'Crew', 'Daily Output', 'Labor-Hours','Unit', 'Material', 'Labor', 'Equipment', 'Total', 'Total Incl O&P']
 # Generally we use Total Incl O&P for cost estimation
+# Daily Output, Labor-Hours and the cost columns are loaded as float64 (see rsmeans_store.py)
 
 # We want the user to be able to find the cost data by searching for a masterformat section code or description of the work
 # We can use LLM calls to find the best match for a given description
 
 RSMEANS_CSV_PATH = "cost_data/rsmeans/combined.csv"
 
-def load_rsmeans_data(csv_path=None):
+# find_by_description: number of BM25 candidate sections sent to the LLM, and the relative
+# score margin ((best - runner_up) / best) above which the top candidate is used without the LLM
+DESCRIPTION_SHORTLIST_K = 20
+DESCRIPTION_CONFIDENCE_MARGIN = 0.5
+
+# Prompt budget for RSMeans matches: above these sizes the rows are summarized
+# (see summarize_cost_matches) instead of being sent as a full table
+SUMMARY_MAX_ITEMS = 15
+SUMMARY_MAX_GROUPS = 12
+SUMMARY_MAX_CHARS = 6000
+
+# Units shown per material family in design-cost comparisons (most common first)
+COMPARISON_MAX_UNITS = 4
+
+# Persistent memo of description -> selected section code (memory LRU + SQLite in cache/)
+DESCRIPTION_CACHE_TTL = 30 * 24 * 3600  # seconds
+DESCRIPTION_CACHE_MEMORY_SIZE = 1024
+DESCRIPTION_CACHE_MAX_ENTRIES = 50_000
+_description_cache = None
+
+
+def get_description_cache():
+    """
+    Return the shared description -> section code cache, creating it on first use.
+    """
+    global _description_cache
+    if _description_cache is None:
+        _description_cache = TieredCache(
+            "rsmeans_description",
+            memory_size=DESCRIPTION_CACHE_MEMORY_SIZE,
+            ttl=DESCRIPTION_CACHE_TTL,
+            max_entries=DESCRIPTION_CACHE_MAX_ENTRIES,
+        )
+    return _description_cache
+
+
+def normalize_description(description):
+    """
+    Normalize a description for cache lookups: lowercase, collapse whitespace, trim punctuation.
+    """
+    return re.sub(r"\s+", " ", str(description).lower()).strip(" \t.,;:!?\"'")
+
+
+def load_rsmeans_data(csv_path=None, use_cache=True):
     """
     Load RSMeans CSV data into a pandas DataFrame.
     If csv_path is None, use the default from config.
+    Numeric columns are parsed to float64. With use_cache, the typed table is read from
+    the binary cache (rebuilt automatically when the CSV changes) instead of the CSV.
     """
     if csv_path is None:
         csv_path = RSMEANS_CSV_PATH
-    return pd.read_csv(csv_path)
+    if use_cache:
+        df = load_typed_rsmeans(csv_path)
+    else:
+        df = read_typed_csv(csv_path)
+    # Build the lookup index and the comparison cube up front so the first query doesn't pay for them
+    build_rsmeans_index(df).cost_cube
+    return df
 
 
 def find_by_section_code(df, section_code):
@@ -28,43 +90,61 @@ def find_by_section_code(df, section_code):
     Filter the DataFrame by Masterformat Section Code (exact match or fuzzy match).
     Fuzzy match: if no exact match, return rows where the code starts with or contains the input (ignoring whitespace/case).
     """
-    # Exact match first
-    match = df[df['Masterformat Section Code'] == section_code]
-    if not match.empty:
-        return match
-    # Fuzzy match: ignore case/whitespace, allow startswith or contains
-    code_norm = section_code.replace(' ', '').lower()
-    fuzzy = df[df['Masterformat Section Code'].str.replace(' ', '').str.lower().str.startswith(code_norm)]
-    if not fuzzy.empty:
-        return fuzzy
-    fuzzy_contains = df[df['Masterformat Section Code'].str.replace(' ', '').str.lower().str.contains(code_norm)]
-    return fuzzy_contains
+    # Exact match first, then startswith, then contains (see RSMeansIndex.find_code_positions)
+    return df.iloc[find_code_positions(df, section_code)]
 
 
-def find_by_description(df, description):
+def find_by_description(df, description, top_k=None, confidence_margin=None, use_llm=True):
     """
     Use LLM to select the most appropriate Masterformat code from the available list for a given description.
     Returns the matching row(s) from the DataFrame.
     Also supports fuzzy matching: if LLM returns no match, try fuzzy search on section names.
+
+    Only the top_k sections from a local BM25 search (section names + line-item names) are sent
+    to the LLM. If the best section beats the runner-up by at least confidence_margin, it is used
+    directly and the LLM is skipped. Defaults come from DESCRIPTION_SHORTLIST_K and
+    DESCRIPTION_CONFIDENCE_MARGIN; a margin above 1 always asks the LLM.
+    With use_llm=False, returns None where the LLM would be asked (local lookup only).
     """
     from llm_calls import run_llm_query  # Local import to avoid circular import
-    # Get unique list of codes and section names
-    unique_sections = df[['Masterformat Section Code', 'Section Name']].drop_duplicates().reset_index(drop=True)
-    section_list = unique_sections.apply(lambda row: f"{row['Masterformat Section Code']}: {row['Section Name']}", axis=1).tolist()
-    # Build prompt for LLM
-    system_prompt = (
-        "You are an expert at mapping construction task descriptions to Masterformat section codes. "
-        "Given a list of Masterformat sections, you will select the most appropriate code for a user's description. "
-        "Return only the section code, nothing else."
-    )
-    user_input = (
-        f"Masterformat sections list:\n{chr(10).join(section_list)}\n"
-        f"Description: {description}"
-    )
-    selected_code = run_llm_query(system_prompt, user_input)
+    if top_k is None:
+        top_k = DESCRIPTION_SHORTLIST_K
+    if confidence_margin is None:
+        confidence_margin = DESCRIPTION_CONFIDENCE_MARGIN
+    index = get_rsmeans_index(df)
+    # Same description, model, dataset and shortlist settings -> same (temperature 0) answer
+    cache = get_description_cache()
+    cache_key = make_key(normalize_description(description), config.completion_model,
+                         index.dataset_hash, top_k, confidence_margin)
+    selected_code = cache.get(cache_key)
+    if selected_code is not None:
+        match = df.iloc[find_code_positions(df, selected_code, ("exact",))]
+        if not match.empty:
+            return match
+        selected_code = None
+    search = index.section_search
+    candidates, scores = search.shortlist(description, top_k)
+    selected_code = search.confident_code(candidates, scores, confidence_margin)
+    if selected_code is None and not use_llm:
+        return None
+    if selected_code is None:
+        # No lexical overlap at all: let the LLM see every section rather than an arbitrary shortlist
+        section_list = search.section_labels(candidates) if len(candidates) else search.section_labels()
+        # Build prompt for LLM
+        system_prompt = (
+            "You are an expert at mapping construction task descriptions to Masterformat section codes. "
+            "Given a list of Masterformat sections, you will select the most appropriate code for a user's description. "
+            "Return only the section code, nothing else."
+        )
+        user_input = (
+            f"Masterformat sections list:\n{chr(10).join(section_list)}\n"
+            f"Description: {description}"
+        )
+        selected_code = run_llm_query(system_prompt, user_input)
     # Filter DataFrame for the selected code
-    match = df[df['Masterformat Section Code'] == selected_code.strip()]
+    match = df.iloc[find_code_positions(df, selected_code.strip(), ("exact",))]
     if not match.empty:
+        cache.set(cache_key, selected_code.strip())
         return match
     # Fuzzy match: try to find section names that contain the description (case-insensitive)
     desc_norm = description.strip().lower()
@@ -72,20 +152,214 @@ def find_by_description(df, description):
     if not fuzzy.empty:
         return fuzzy
     # Also try fuzzy match on Masterformat Section Code (in case user enters a partial code as description)
-    code_fuzzy = df[df['Masterformat Section Code'].str.replace(' ', '').str.lower().str.contains(desc_norm.replace(' ', ''))]
-    return code_fuzzy
+    return df.iloc[find_code_positions(df, desc_norm, ("contains",))]
 
 
-def get_cost_data(df, section_code_or_desc):
+def get_cost_data(df, section_code_or_desc, location=None, year=None, use_llm=True):
     """
     Retrieve cost data for a given section code or description.
+    If location (ZIP / city prefix) or year is given, cost columns are adjusted with the
+    city cost index and escalation tables (see cost_adjustment.py).
+    With use_llm=False, returns None if the description needs the LLM to pick a section.
     """
     # Try exact code match first
     match = find_by_section_code(df, section_code_or_desc)
-    if not match.empty:
+    if match.empty:
+        # Otherwise, try description match
+        match = find_by_description(df, section_code_or_desc, use_llm=use_llm)
+        if match is None:
+            return None
+    if location is None and year is None:
         return match
-    # Otherwise, try description match
-    return find_by_description(df, section_code_or_desc)
+    return get_cost_adjustment(location, year).apply(match)
+
+
+def cost_takeoff(df, takeoff, location=None, year=None):
+    """
+    Cost a bill of quantities in one vectorized pass, without any LLM call.
+    takeoff: DataFrame / list of dicts with 'code' (section code or "<section code> <line id>"),
+    'quantity' and optionally 'unit' and 'id'.
+    location / year adjust unit prices as in get_cost_data.
+    Returns {'lines': DataFrame, 'divisions': DataFrame, 'totals': dict} with material, labor,
+    equipment, total and total_incl_op extended costs (see rsmeans_costing.price_takeoff).
+    """
+    adjustment = None
+    if location is not None or year is not None:
+        adjustment = get_cost_adjustment(location, year)
+    return price_takeoff(get_rsmeans_index(df).costing_tables, takeoff, adjustment=adjustment)
+
+
+def value_engineer(df, takeoff, target_saving=None, target_percent=None, location=None, year=None,
+                   n_solutions=3):
+    """
+    Cost a takeoff and search for substitution sets that reach a target saving, given in
+    dollars (target_saving) or as a share of the takeoff's total_incl_op (target_percent, 0.1 = 10%).
+    Alternatives are cheaper line items in the same section and unit (see value_engineering.py).
+    Returns (costed takeoff dict as from cost_takeoff, optimizer result dict).
+    """
+    index = get_rsmeans_index(df)
+    adjustment = None
+    if location is not None or year is not None:
+        adjustment = get_cost_adjustment(location, year)
+    costed = price_takeoff(index.costing_tables, takeoff, adjustment=adjustment)
+    if target_saving is None:
+        if target_percent is None:
+            raise ValueError("Give target_saving or target_percent")
+        target_saving = float(target_percent) * costed['totals'].get('total_incl_op', 0.0)
+    result = optimize_substitutions(index.costing_tables, index.alternative_tables, costed['lines'],
+                                    float(target_saving), adjustment=adjustment, n_solutions=n_solutions)
+    return costed, result
+
+
+def summarize_value_engineering(result, max_rows=None):
+    """
+    Markdown summary of an optimize_substitutions result for prompts: target, baseline and
+    the substitutions of each solution (largest savings first, max_rows per solution).
+    """
+    max_rows = SUMMARY_MAX_ITEMS if max_rows is None else max_rows
+    lines = [
+        f"Target saving: ${result['target']:,.0f} on a baseline of ${result['baseline']:,.0f} "
+        f"(largest saving available from same-section substitutions: ${result['max_saving']:,.0f})."
+    ]
+    if not result['feasible']:
+        lines.append("No substitution set reaches the target.")
+    columns = ['current_code', 'current_name', 'unit', 'quantity', 'current_unit_price',
+               'alternative_code', 'alternative_id', 'alternative_name', 'alternative_unit_price', 'saving']
+    for i, solution in enumerate(result['solutions'], start=1):
+        lines.append(f"**Option {i}: {solution['count']} substitutions, saving ${solution['saving']:,.0f}**")
+        table = solution['substitutions'][columns].head(max_rows).round(2)
+        lines.append(table.to_markdown(index=False, floatfmt=",.2f"))
+        if solution['count'] > max_rows:
+            lines.append(f"_({solution['count'] - max_rows} smaller substitutions not shown)_")
+    return "\n\n".join(lines)
+
+
+def compare_design_costs(df, query_or_families, adjustment=None, max_units=None):
+    """
+    Markdown comparison of the material families in a design question ("steel vs concrete
+    frame") or an explicit list of families, read from the precomputed cost cube.
+    Returns None if the question names no known family.
+    """
+    if isinstance(query_or_families, str):
+        families = detect_families(query_or_families)
+    else:
+        families = list(query_or_families)
+    if not families:
+        return None
+    max_units = COMPARISON_MAX_UNITS if max_units is None else max_units
+    table, missing = get_rsmeans_index(df).cost_cube.compare(families, max_units=max_units, adjustment=adjustment)
+    basis = adjustment.describe() if adjustment is not None else "National average, base-year costs"
+    parts = [
+        f"_{basis}. Unit costs are Total Incl O&P per unit across all RSMeans line items of each "
+        f"material family; labor-hours and daily output are per unit of the item._"
+    ]
+    if not table.empty:
+        parts.append(table.to_markdown(index=False))
+    if missing:
+        parts.append("No RSMeans line items for: " + ", ".join(missing) + ".")
+    return "\n\n".join(parts)
+
+
+def summarize_cost_matches(result, max_items=None, max_groups=None, max_chars=None,
+                           value_column='Total Incl O&P'):
+    """
+    Compact markdown for a (possibly large) set of matched RSMeans rows, for use in prompts.
+
+    Results with at most max_items rows (or a few more, if the table still fits in max_chars)
+    are returned as the plain table. Larger ones become
+    - a statistics table grouped by section and unit: count, min / median / p90 / max of value_column
+    - the max_items most representative line items (closest to their group's median,
+      spread over groups in proportion to their size)
+    Percent adders (no unit cost) are listed with their raw text in the plain table and
+    counted, but left out of the statistics.
+    The output never exceeds max_chars; rows are dropped from the end to fit.
+    """
+    max_items = SUMMARY_MAX_ITEMS if max_items is None else max_items
+    max_groups = SUMMARY_MAX_GROUPS if max_groups is None else max_groups
+    max_chars = SUMMARY_MAX_CHARS if max_chars is None else max_chars
+    columns = ['Masterformat Section Code', 'Section Name', 'Name', 'Unit', value_column]
+    adders = result[PERCENT_ADDER_COLUMN] if PERCENT_ADDER_COLUMN in result else pd.Series(dtype=object)
+    if adders.notna().any():
+        columns.append(PERCENT_ADDER_COLUMN)
+
+    if len(result) <= max_items:
+        return _fit_markdown([], result[columns], max_chars)
+    if len(result) <= 4 * max_items:
+        full_md = result[columns].to_markdown(index=False)
+        if len(full_md) <= max_chars:
+            return full_md
+
+    # RSMeans prints the unit only on the first row of a run, so carry it forward per section
+    code = result['Masterformat Section Code']
+    units = result['Unit'].map(normalize_unit).groupby(code, sort=False).ffill().fillna('n/a')
+    values = pd.to_numeric(result[value_column], errors='coerce')
+    frame = pd.DataFrame({
+        'Masterformat Section Code': code,
+        'Section Name': result['Section Name'],
+        'Name': result['Name'],
+        'Unit': units,
+        value_column: values,
+    }).dropna(subset=[value_column])
+    if frame.empty:
+        return _fit_markdown([], result[columns].head(max_items), max_chars)
+
+    keys = ['Masterformat Section Code', 'Section Name', 'Unit']
+    grouped = frame.groupby(keys, sort=False)[value_column]
+    stats = grouped.agg(count='count', min='min', median='median', max='max')
+    stats.insert(3, 'p90', grouped.quantile(0.9))
+    stats = stats.sort_values('count', ascending=False, kind='stable').reset_index()
+
+    # Representative items: rank rows by distance to their group median, then give each
+    # group a quota proportional to its size (at least one for the largest groups)
+    group_median = grouped.transform('median')
+    distance = (frame[value_column] - group_median).abs()
+    rank = distance.groupby([frame[k] for k in keys], sort=False).rank(method='first') - 1
+    counts = stats.set_index(keys)['count']
+    quotas = np.maximum(1, np.floor(max_items * counts / counts.sum())).astype(int)
+    quotas = quotas[np.cumsum(quotas.to_numpy()) <= max_items]
+    quota_per_row = pd.MultiIndex.from_frame(frame[keys]).map(quotas.to_dict().get)
+    picked = frame[(rank.to_numpy() < np.nan_to_num(np.asarray(quota_per_row, dtype='float64'), nan=0))]
+    picked = picked.assign(_dist=distance.loc[picked.index]).sort_values(keys + ['_dist']).drop(columns='_dist')
+
+    header = (
+        f"{len(result)} matching line items in {len(stats)} section/unit groups "
+        f"(showing statistics for the {min(len(stats), max_groups)} largest groups and "
+        f"{len(picked)} representative items)."
+    )
+    n_adders = int(adders.notna().sum())
+    if n_adders:
+        header += f" {n_adders} percent adder rows are not included in the statistics."
+    stats_md = stats.head(max_groups).round(2)
+    return _fit_markdown([header, "**Cost statistics by section and unit:**", stats_md],
+                         picked.head(max_items), max_chars,
+                         items_title="**Representative line items:**")
+
+
+def _fit_markdown(blocks, items, max_chars, items_title=None):
+    """
+    Join text / DataFrame blocks and an items table into markdown no longer than max_chars,
+    dropping item rows first and then statistics rows.
+    """
+    def render(blocks, items):
+        parts = [b.to_markdown(index=False) if isinstance(b, pd.DataFrame) else b for b in blocks]
+        if len(items):
+            if items_title:
+                parts.append(items_title)
+            parts.append(items.to_markdown(index=False))
+        return "\n\n".join(parts)
+
+    text = render(blocks, items)
+    while len(text) > max_chars and len(items) > 1:
+        items = items.iloc[:-1]
+        text = render(blocks, items)
+    stats_idx = next((i for i, b in enumerate(blocks) if isinstance(b, pd.DataFrame)), None)
+    while len(text) > max_chars and stats_idx is not None and len(blocks[stats_idx]) > 1:
+        blocks = list(blocks)
+        blocks[stats_idx] = blocks[stats_idx].iloc[:-1]
+        text = render(blocks, items)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit("\n", 1)[0] + "\n_(truncated)_"
+    return text
 
 
 def list_sections(df):
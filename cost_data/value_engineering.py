@@ -0,0 +1,206 @@
+# Value-engineering substitution search over RSMeans alternatives.
+# For each costed takeoff line, the cheaper line items in the same Masterformat section and
+# unit are candidate substitutions. Picking at most one substitution per line so that the
+# saving reaches a target is a multiple-choice knapsack, solved here with a vectorized
+# dynamic program over discretized savings.
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMN = 'unit_total_incl_op'
+
+# Alternatives cheaper than this share of the current unit price are treated as a different
+# scope of work (accessories, partial items, OCR noise), not as an equivalent substitute
+MIN_PRICE_RATIO = 0.25
+# Candidate substitutions kept per line (evenly spread from mildest to deepest price cut)
+MAX_OPTIONS_PER_LINE = 6
+# Number of saving buckets in the dynamic program; savings are rounded down to a bucket,
+# so a returned set always meets the target
+SAVING_BUCKETS = 1000
+
+
+class AlternativeTables:
+    """
+    Per (section code, unit) arrays of priced line items sorted by unit price, built once
+    from CostingTables.lines. alternatives(section, unit, price) is two binary searches.
+    """
+
+    def __init__(self, costing_tables):
+        lines = costing_tables.lines
+        priced = lines[lines[PRICE_COLUMN].notna() & (lines[PRICE_COLUMN] > 0) & lines['rsmeans_unit'].notna()]
+        priced = priced.assign(line_id=[key[len(code):] for key, code in zip(priced.index, priced['code_norm'])])
+        priced = priced.sort_values(['code_norm', 'rsmeans_unit', PRICE_COLUMN], kind='stable')
+        self.keys = priced.index.to_numpy()
+        self.prices = priced[PRICE_COLUMN].to_numpy(dtype='float64')
+        self.codes = priced['matched_code'].to_numpy()
+        self.line_ids = priced['line_id'].to_numpy()
+        self.names = priced['matched_name'].to_numpy()
+        # (section, unit) -> (start, stop) slice into the sorted arrays
+        groups = priced.groupby(['code_norm', 'rsmeans_unit'], sort=False).indices
+        self.groups = {key: (int(positions.min()), int(positions.max()) + 1) for key, positions in groups.items()}
+
+    def alternatives(self, section, unit, price, min_ratio=MIN_PRICE_RATIO):
+        """
+        Positions of items in the (section, unit) group priced in [min_ratio * price, price),
+        cheapest first.
+        """
+        bounds = self.groups.get((section, unit))
+        if bounds is None or not np.isfinite(price):
+            return np.arange(0)
+        start, stop = bounds
+        group_prices = self.prices[start:stop]
+        lo = np.searchsorted(group_prices, min_ratio * price, side='left')
+        hi = np.searchsorted(group_prices, price, side='left')
+        return np.arange(start + lo, start + hi)
+
+
+def _candidate_options(alt_tables, lines, factors, min_ratio, max_options):
+    """
+    Candidate substitutions for every costed line as flat arrays:
+    (line position, alternative position, unit price after substitution, saving, penalty).
+    The penalty is 1 + relative price cut, so the optimizer prefers few, mild substitutions.
+    """
+    line_pos, alt_pos = [], []
+    codes = lines['code_norm'].to_numpy()
+    units = lines['rsmeans_unit'].to_numpy()
+    base_prices = lines['base_price'].to_numpy(dtype='float64')
+    for i in range(len(lines)):
+        options = alt_tables.alternatives(codes[i], units[i], base_prices[i], min_ratio)
+        if options.size == 0:
+            continue
+        if options.size > max_options:
+            options = options[np.unique(np.linspace(0, options.size - 1, max_options).round().astype(int))]
+        line_pos.append(np.full(options.size, i))
+        alt_pos.append(options)
+    if not line_pos:
+        empty = np.arange(0)
+        return empty, empty, np.zeros(0), np.zeros(0), np.zeros(0)
+    line_pos = np.concatenate(line_pos)
+    alt_pos = np.concatenate(alt_pos)
+    new_price = alt_tables.prices[alt_pos] * factors[line_pos]
+    current = lines[PRICE_COLUMN].to_numpy(dtype='float64')[line_pos]
+    saving = lines['quantity'].to_numpy(dtype='float64')[line_pos] * (current - new_price)
+    penalty = 1.0 + (current - new_price) / current
+    return line_pos, alt_pos, new_price, saving, penalty
+
+
+def _solve(line_pos, saving, penalty, target, buckets, banned=None):
+    """
+    Multiple-choice knapsack: choose at most one option per line so that the rounded-down
+    saving reaches `target` with the smallest total penalty. Returns the chosen option
+    indices (into the flat option arrays), or None if the target can't be reached.
+    """
+    step = target / buckets
+    weight = np.minimum(np.floor(saving / step), buckets).astype(np.int64)
+    usable = weight > 0
+    if banned is not None:
+        usable &= ~banned
+    if not usable.any():
+        return None
+    options = np.flatnonzero(usable)
+    # Lines with the biggest possible saving first, so the reachable bound prunes early
+    lines, first = np.unique(line_pos[options], return_index=True)
+    best_weight = np.maximum.reduceat(weight[options], first)
+    order = np.argsort(-best_weight, kind='stable')
+    if best_weight.sum() < buckets:
+        return None
+
+    size = buckets + 1
+    dp = np.full(size, np.inf)
+    dp[0] = 0.0
+    choices = []
+    bounds = np.append(first, len(options))
+    offsets = np.arange(size)
+    for g in order:
+        group = options[bounds[g]:bounds[g + 1]]
+        new = dp.copy()
+        choice = np.full(size, -1, dtype=np.int64)
+        for opt in group:
+            w = weight[opt]
+            candidate = dp[np.maximum(offsets - w, 0)] + penalty[opt]
+            better = candidate < new
+            new[better] = candidate[better]
+            choice[better] = opt
+        dp = new
+        choices.append(choice)
+    if not np.isfinite(dp[buckets]):
+        return None
+
+    chosen, b = [], buckets
+    for choice in reversed(choices):
+        opt = choice[b]
+        if opt >= 0:
+            chosen.append(opt)
+            b = max(b - int(weight[opt]), 0)
+    return np.array(chosen[::-1], dtype=np.int64)
+
+
+def optimize_substitutions(costing_tables, alt_tables, priced_lines, target_saving, adjustment=None,
+                           n_solutions=3, min_ratio=MIN_PRICE_RATIO, max_options=MAX_OPTIONS_PER_LINE,
+                           buckets=SAVING_BUCKETS):
+    """
+    Find substitution sets that save at least target_saving on a costed takeoff.
+
+    priced_lines is the 'lines' DataFrame from price_takeoff (costed with the same
+    adjustment). Alternatives for a line are cheaper items in its matched section with the
+    same RSMeans unit, priced at no less than min_ratio of the current unit price.
+    Up to n_solutions sets are returned, best first; each next set bans the largest
+    substitution of the previous one, so the sets differ.
+
+    Returns a dict with 'target', 'baseline' (current total_incl_op), 'max_saving' (all lines
+    at their deepest allowed cut), 'feasible' and 'solutions' (list of dicts with 'saving',
+    'substitutions' DataFrame and 'count').
+    """
+    lines = priced_lines.reset_index(drop=True)
+    valid = (lines['match'].notna() & lines['rsmeans_unit'].notna()
+             & lines[PRICE_COLUMN].notna() & lines['quantity'].notna() & (lines['quantity'] > 0))
+    lines = lines[valid.to_numpy()].copy()
+    lines['code_norm'] = lines['matched_code'].str.replace(' ', '', regex=False).str.lower()
+
+    factors = np.ones(len(lines))
+    if adjustment is not None and not adjustment.is_identity:
+        factors = adjustment.factors(lines['matched_code'].str.slice(0, 2))['total'].to_numpy()
+    lines['base_price'] = lines[PRICE_COLUMN].to_numpy(dtype='float64') / factors
+
+    line_pos, alt_pos, new_price, saving, penalty = _candidate_options(alt_tables, lines, factors, min_ratio, max_options)
+    result = {
+        'target': float(target_saving),
+        'baseline': float(np.nansum(priced_lines['total_incl_op'].to_numpy(dtype='float64'))),
+        'max_saving': 0.0,
+        'feasible': False,
+        'solutions': [],
+    }
+    if len(saving):
+        result['max_saving'] = float(pd.Series(saving).groupby(line_pos).max().sum())
+    if target_saving <= 0 or result['max_saving'] < target_saving:
+        return result
+
+    banned = np.zeros(len(saving), dtype=bool)
+    for _ in range(n_solutions):
+        chosen = _solve(line_pos, saving, penalty, target_saving, buckets, banned)
+        if chosen is None:
+            break
+        rows = lines.iloc[line_pos[chosen]]
+        alts = alt_pos[chosen]
+        substitutions = pd.DataFrame({
+            'line': rows.index.to_numpy(),
+            'code': rows['code'].to_numpy(),
+            'current_code': rows['matched_code'].to_numpy(),
+            'current_name': rows['matched_name'].to_numpy(),
+            'unit': rows['rsmeans_unit'].to_numpy(),
+            'quantity': rows['quantity'].to_numpy(dtype='float64'),
+            'current_unit_price': rows[PRICE_COLUMN].to_numpy(dtype='float64'),
+            'alternative_code': alt_tables.codes[alts],
+            'alternative_id': alt_tables.line_ids[alts],
+            'alternative_name': alt_tables.names[alts],
+            'alternative_unit_price': new_price[chosen],
+            'saving': saving[chosen],
+        }).sort_values('saving', ascending=False, kind='stable').reset_index(drop=True)
+        result['solutions'].append({
+            'saving': float(substitutions['saving'].sum()),
+            'count': int(len(substitutions)),
+            'substitutions': substitutions,
+        })
+        banned[chosen[np.argmax(saving[chosen])]] = True
+    result['feasible'] = bool(result['solutions'])
+    return result
@@ -0,0 +1,112 @@
+# Asyncio version of the LLM endpoints of gh_server.py (same request and response bodies).
+# Generations are awaited on AsyncOpenAI clients, so one worker holds many requests in flight:
+#   uvicorn gh_async_server:app --port 5000
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+import async_llm_calls
+from utils import rag_utils
+from server import config, provider_router
+from utils import llm_cache, metrics, micro_batcher, retrieval_cache, semantic_cache
+
+collection, ranker = rag_utils.init_rag(mode=config.get_mode())
+
+@asynccontextmanager
+async def lifespan(app):
+    # Open the provider connection on the server's event loop before the first request
+    asyncio.create_task(config.registry.async_prewarm([config.get_mode()]))
+    # Create the router now so a missing fallback provider is reported at startup
+    provider_router.get_provider_router()
+    yield
+    await config.registry.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.post('/llm_call')
+async def llm_call(request: Request):
+    data = await request.json()
+    input_string = data.get('input', '')
+    stream = data.get('stream', False)
+
+    if stream:
+        answer = await async_llm_calls.route_query_to_function(input_string, stream=True)
+        return StreamingResponse(_chunks(answer), media_type='text/plain')
+    else:
+        answer = await async_llm_calls.route_query_to_function(input_string)
+        return {'response': answer}
+
+@app.post('/llm_rag_call')
+async def llm_rag_call(request: Request):
+    data = await request.json()
+    input_string = data.get('input', '')
+    stream = data.get('stream', False)
+
+    if stream:
+        answer, sources = await async_llm_calls.route_query_to_function(input_string, collection, ranker, True, stream=True)
+
+        async def generate():
+            async for chunk in _chunks(answer):
+                yield chunk
+            if sources:
+                yield f"\n\n[SOURCES]: {sources}"
+        return StreamingResponse(generate(), media_type='text/plain')
+    else:
+        answer, sources = await async_llm_calls.route_query_to_function(input_string, collection, ranker, True)
+        return {'response': answer, 'sources': sources}
+
+async def _chunks(answer):
+    # Unrouted questions are answered with a complete string even when streaming
+    if isinstance(answer, str):
+        yield answer
+    else:
+        async for chunk in answer:
+            yield chunk
+
+@app.get('/cache_stats')
+def cache_stats():
+    return {'responses': llm_cache.response_cache_stats(),
+            'semantic': semantic_cache.get_semantic_cache().stats(),
+            'retrieval': retrieval_cache.retrieval_cache_stats()}
+
+@app.get('/pool_stats')
+def pool_stats():
+    return config.registry.stats()
+
+@app.get('/metrics')
+def metrics_endpoint():
+    # Prometheus text format: stage latency histograms and token counts by route, mode and model
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+@app.get('/provider_stats')
+def provider_stats():
+    return provider_router.get_provider_router().stats()
+
+@app.get('/batch_stats')
+def batch_stats():
+    return micro_batcher.batch_stats()
+
+@app.post('/set_mode')
+async def set_mode(request: Request):
+    data = await request.json()
+    mode = data.get('mode', None)
+    cf_gen_model = data.get('cf_gen_model', None)
+    cf_emb_model = data.get('cf_emb_model', None)
+    if mode not in ["local", "openai", "cloudflare"]:
+        return JSONResponse({'status': 'error', 'message': 'Invalid mode'}, status_code=400)
+    config.set_mode(mode, cf_gen_model=cf_gen_model, cf_emb_model=cf_emb_model)
+    asyncio.create_task(config.registry.async_prewarm([mode]))
+    global collection, ranker
+    collection, ranker = await asyncio.to_thread(rag_utils.init_rag, mode=mode)
+    return {'status': 'success', 'mode': mode, 'cf_gen_model': cf_gen_model, 'cf_emb_model': cf_emb_model}
+
+@app.get('/status')
+def status():
+    return {
+        'status': 'ok',
+        'mode': config.get_mode(),
+        'cf_gen_model': getattr(config, 'completion_model', None),
+        'cf_emb_model': getattr(config, 'embedding_model', None)
+    }
@@ -2,11 +2,17 @@ from flask import Flask, request, jsonify, Response
 # import ghhops_server as hs
 import llm_calls
 from utils import rag_utils
-from server import config
+from server import config, provider_router
+from cost_data import rsmeans_utils
+from utils import llm_cache, metrics, micro_batcher, retrieval_cache, semantic_cache
 
 app = Flask(__name__)
 
 collection, ranker = rag_utils.init_rag(mode=config.get_mode())
+# Open the provider connection while the server starts instead of on the first request
+config.registry.prewarm([config.get_mode()])
+# Create the router now so a missing fallback provider is reported at startup
+provider_router.get_provider_router()
 
 @app.route('/llm_call', methods=['POST'])
 def llm_call():
@@ -31,6 +37,7 @@ def llm_rag_call():
 
     if stream:
         def generate():
+            # Retrieval runs before the first chunk; generated tokens are then streamed as they arrive
             answer, sources = llm_calls.route_query_to_function(input_string, collection, ranker, True, stream=True)
             # If answer is a generator, yield from it
             if hasattr(answer, '__iter__') and not isinstance(answer, str):
@@ -46,6 +53,76 @@ def llm_rag_call():
         answer, sources = llm_calls.route_query_to_function(input_string, collection, ranker, True)
         return jsonify({'response': answer, 'sources': sources})
 
+def _records(df):
+    # NaN is not valid JSON, send null instead
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+@app.route('/cost_takeoff', methods=['POST'])
+def cost_takeoff():
+    # Body: {"items": [{"code": "03 35 43.10 0110", "quantity": 12.5, "unit": "MSF"}, ...],
+    #        "location": "02134" (optional), "year": 2025 (optional), "include_lines": true}
+    data = request.get_json()
+    items = data.get('items', [])
+    include_lines = data.get('include_lines', True)
+    try:
+        result = rsmeans_utils.cost_takeoff(llm_calls.rsmeans_df, items,
+                                            location=data.get('location'), year=data.get('year'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    response = {'status': 'success', 'totals': result['totals'], 'divisions': _records(result['divisions'])}
+    if include_lines:
+        response['lines'] = _records(result['lines'])
+    return jsonify(response)
+
+@app.route('/value_engineering', methods=['POST'])
+def value_engineering():
+    # Body: {"items": [...as for /cost_takeoff...], "target_saving": 250000 or "target_percent": 0.1,
+    #        "location": "02134", "year": 2025, "solutions": 3,
+    #        "question": "..." (optional, adds an LLM explanation of the options)}
+    data = request.get_json()
+    try:
+        costed, result = rsmeans_utils.value_engineer(
+            llm_calls.rsmeans_df, data.get('items', []),
+            target_saving=data.get('target_saving'), target_percent=data.get('target_percent'),
+            location=data.get('location'), year=data.get('year'), n_solutions=int(data.get('solutions', 3)))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    response = {
+        'status': 'success',
+        'target': result['target'],
+        'baseline': result['baseline'],
+        'max_saving': result['max_saving'],
+        'feasible': result['feasible'],
+        'solutions': [{'saving': s['saving'], 'count': s['count'], 'substitutions': _records(s['substitutions'])}
+                      for s in result['solutions']],
+    }
+    if data.get('question'):
+        response['explanation'] = llm_calls.explain_value_engineering(data['question'], result)
+    return jsonify(response)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'responses': llm_cache.response_cache_stats(),
+                    'semantic': semantic_cache.get_semantic_cache().stats(),
+                    'retrieval': retrieval_cache.retrieval_cache_stats()})
+
+@app.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    return jsonify(config.registry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus text format: stage latency histograms and token counts by route, mode and model
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/provider_stats', methods=['GET'])
+def provider_stats():
+    return jsonify(provider_router.get_provider_router().stats())
+
+@app.route('/batch_stats', methods=['GET'])
+def batch_stats():
+    return jsonify(micro_batcher.batch_stats())
+
 @app.route('/set_mode', methods=['POST'])
 def set_mode():
     data = request.get_json()
@@ -56,6 +133,7 @@ def set_mode():
         return jsonify({'status': 'error', 'message': 'Invalid mode'}), 400
     # Pass model overrides to config
     config.set_mode(mode, cf_gen_model=cf_gen_model, cf_emb_model=cf_emb_model)
+    config.registry.prewarm([mode])
     # Optionally, re-initialize RAG collection/ranker if needed
     global collection, ranker
     collection, ranker = rag_utils.init_rag(mode=mode)
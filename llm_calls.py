@@ -1,5 +1,18 @@
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import server.config as config  
-from cost_data.rsmeans_utils import load_rsmeans_data, get_cost_data
+from cost_data.rsmeans_utils import (load_rsmeans_data, get_cost_data, summarize_cost_matches, compare_design_costs,
+                                     summarize_value_engineering)
+from cost_data.cost_adjustment import detect_adjustment
+from utils import metrics, roi_engine
+from utils.llm_cache import cached_chat_completion, replay_chunks
+from utils.semantic_cache import SEMANTIC_CACHE_ENABLED, get_semantic_cache, embed_question, collection_scope
+from utils.local_router import local_classify
 
 # Routing Functions Below
 from utils import rag_utils
@@ -7,91 +20,125 @@ from utils import rag_utils
 # Load RSMeans data once at module level
 rsmeans_df = load_rsmeans_data()
 
+# Same logger as main.py; LLM classifications logged here are training data for utils/local_router.py
+logger = logging.getLogger("app_logger")
+
+def _classify(classifier: str, message: str, system_prompt: str, use_local: bool = True, use_cache: bool = True) -> str:
+    """
+    Answer a classifier from the local router when it is confident, otherwise ask the LLM.
+    Every decision is logged as a 'classifier_output' event.
+    """
+    start = time.perf_counter()
+    local = local_classify(classifier, message) if use_local else None
+    if local is not None:
+        output, confidence, source = local[0], local[1], "local"
+    else:
+        output = cached_chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            use_cache=use_cache,
+            temperature=0.0,  # Lower temperature for deterministic output
+        )
+        confidence, source = None, "llm"
+    latency = time.perf_counter() - start
+    metrics.observe("classify", latency)
+    logger.info({
+        "event": "classifier_output",
+        "classifier": classifier,
+        "message": message,
+        "output": output,
+        "source": source,
+        "confidence": confidence,
+        "latency_ms": round(latency * 1000, 3),
+    })
+    return output
+
 # Routing & Filtering Functions
-def classify_input(message: str) -> str:
+RELEVANCE_PROMPT = (
+    "Your task is to classify if the user message is related to buildings and architecture or not. "
+    "Output only a single word: If related, output 'Related'; if not, output 'Refuse to answer'."
+)
+
+def classify_input(message: str, use_local: bool = True, use_cache: bool = True) -> str:
     """
     Classify if the user message is related to architecture/buildings or not.
     Returns "Related" for architecture-related queries, otherwise "Refuse to answer".
+    The local router answers confident cases; the rest go to the LLM.
     """
-    response = config.client.chat.completions.create(
-        model=config.completion_model,
-        messages=[
-            {"role": "system", "content": 
-                "Your task is to classify if the user message is related to buildings and architecture or not. "
-                "Output only a single word: If related, output 'Related'; if not, output 'Refuse to answer'."},
-            {"role": "user", "content": message}
-        ],
-        temperature=0.0,  # Lower temperature for deterministic output
-    )
-    return response.choices[0].message.content.strip()
+    return _classify("relevance", message, RELEVANCE_PROMPT, use_local=use_local, use_cache=use_cache)
 
 # Design Ideation & Concept Functions
+CONCEPT_PROMPT = (
+    "You are a visionary designer at a leading architecture firm.\n"
+    "Your task is to craft a short, poetic and imaginative concept for a building design, based on the given information.\n"
+    "- Weave the provided details into a bold and evocative idea, like the opening lines of a story.\n"
+    "- Keep it one paragraph, focusing on mood and atmosphere rather than technical details.\n"
+    "- Avoid generic descriptions; use vivid imagery and emotional resonance."
+)
+
 def generate_concept(initial_info: str) -> str:
     """
     Generate a short, imaginative concept statement for a building design based on initial info.
     Useful for early-stage creative brainstorming.
     """
-    system_prompt = (
-        "You are a visionary designer at a leading architecture firm.\n"
-        "Your task is to craft a short, poetic and imaginative concept for a building design, based on the given information.\n"
-        "- Weave the provided details into a bold and evocative idea, like the opening lines of a story.\n"
-        "- Keep it one paragraph, focusing on mood and atmosphere rather than technical details.\n"
-        "- Avoid generic descriptions; use vivid imagery and emotional resonance."
-    )
     user_prompt = f"What is the concept for this building?\nInitial information: {initial_info}"
     response = config.client.chat.completions.create(
         model=config.completion_model,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": CONCEPT_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
         temperature=0.8,  # Higher temperature for more creative output
     )
     return response.choices[0].message.content.strip()
 
+ATTRIBUTES_PROMPT = (
+    "You are a keyword extraction assistant.\n"
+    "# Instructions:\n"
+    "Extract relevant keywords from the given building description, categorized into three fields: shape, theme, materials.\n"
+    "Provide the output as a JSON object with exactly those keys.\n"
+    "# Rules:\n"
+    "- If a category has no relevant info, use \"None\" as the value.\n"
+    "- Separate multiple keywords with commas in a single string.\n"
+    "- Output JSON only, no explanation or extra text."
+)
+
 def extract_attributes(description: str) -> str:
     """
     Extract key design attributes (shape, theme, materials) from a text description.
     Returns a JSON string with fields "shape", "theme", "materials".
     """
-    system_prompt = (
-        "You are a keyword extraction assistant.\n"
-        "# Instructions:\n"
-        "Extract relevant keywords from the given building description, categorized into three fields: shape, theme, materials.\n"
-        "Provide the output as a JSON object with exactly those keys.\n"
-        "# Rules:\n"
-        "- If a category has no relevant info, use \"None\" as the value.\n"
-        "- Separate multiple keywords with commas in a single string.\n"
-        "- Output JSON only, no explanation or extra text."
-    )
     user_prompt = f"GIVEN DESCRIPTION:\n{description}"
     response = config.client.chat.completions.create(
         model=config.completion_model,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": ATTRIBUTES_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
         temperature=0.0,  # Lower temperature for more deterministic output
     )
     return response.choices[0].message.content.strip()
 
+QUESTION_PROMPT = (
+    "You are a thoughtful research assistant specializing in architecture.\n"
+    "Your task is to formulate an open-ended question related to the theme provided, inviting deeper exploration.\n"
+    "- The question should connect to architectural examples or theory (e.g., notable projects, historical context) related to the theme.\n"
+    "- Keep it open-ended and intellectually curious, so it could be answered with detailed insights.\n"
+    "- Do not include any extra text, just the question itself."
+)
+
 def create_question(theme: str) -> str:
     """
     Create an open-ended question for further exploration, based on a given theme (e.g., a design theme).
     This can be used to prompt the knowledge base or user for more input.
     """
-    system_prompt = (
-        "You are a thoughtful research assistant specializing in architecture.\n"
-        "Your task is to formulate an open-ended question related to the theme provided, inviting deeper exploration.\n"
-        "- The question should connect to architectural examples or theory (e.g., notable projects, historical context) related to the theme.\n"
-        "- Keep it open-ended and intellectually curious, so it could be answered with detailed insights.\n"
-        "- Do not include any extra text, just the question itself."
-    )
     user_prompt = theme  # The theme or topic from which to derive a question
     response = config.client.chat.completions.create(
         model=config.completion_model,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": QUESTION_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
         temperature=0.3,  # Adjust temperature for more or less creative responses
@@ -101,32 +148,33 @@ def create_question(theme: str) -> str:
 # Group 4 Prompts:
 
 # Cost Estimation & ROI Analysis Functions
+COST_TRADEOFFS_PROMPT = (
+    "You are an expert architectural cost consultant.\n"
+    "# Task:\n"
+    "Given a scenario or query, analyze and compare the cost trade-offs between the design options or changes described. Consider both initial construction costs and long-term financial impacts (such as ROI, maintenance, or operational costs) if relevant.\n"
+    "# Instructions:\n"
+    "- Break down each option or change, explaining how it affects construction cost (e.g., cost per area, material and/or labor differences) and potential changes to the project's value.\n"
+    "- Highlight the pros and cons of each option: which is more expensive upfront, which may save money over time, and any relevant risks or benefits.\n"
+    "- Use any specific numbers given in the query; if none are given, provide reasoned estimates or qualitative comparisons.\n"
+    "- Clearly state any assumptions for your estimates (e.g., unit costs, rates, location, or market conditions).\n"
+    "- Structure your answer logically (e.g., Option A vs Option B, or Before vs After change), and quantify differences where possible.\n"
+    "- Conclude with a recommendation or summary of which option is cost-favorable and why, if asked for advice.\n"
+    "- Always mention that actual costs can vary by project and location, and the comparison is based on typical scenarios.\n"
+    "# Example:\n"
+    "Query: Should we use steel or timber for the main structure?\n"
+    "Output: Steel framing typically costs 10-20% more than timber for similar spans, but offers greater durability and fire resistance. Timber is less expensive upfront and can be installed faster, reducing labor costs. However, steel may have lower maintenance costs over the building's life. In most urban markets, timber is more cost-effective for low-rise buildings, while steel is preferred for high-rise or long-span structures. Actual costs depend on local material prices and labor rates." # TODO fact-check this example
+)
+
 def analyze_cost_tradeoffs(query: str) -> str:
     """
     Analyze cost trade-offs based on the user's query.
     E.g., comparing two design options or the impact of a design change on cost/ROI.
     """
-    system_prompt = (
-        "You are an expert architectural cost consultant.\n"
-        "# Task:\n"
-        "Given a scenario or query, analyze and compare the cost trade-offs between the design options or changes described. Consider both initial construction costs and long-term financial impacts (such as ROI, maintenance, or operational costs) if relevant.\n"
-        "# Instructions:\n"
-        "- Break down each option or change, explaining how it affects construction cost (e.g., cost per area, material and/or labor differences) and potential changes to the project's value.\n"
-        "- Highlight the pros and cons of each option: which is more expensive upfront, which may save money over time, and any relevant risks or benefits.\n"
-        "- Use any specific numbers given in the query; if none are given, provide reasoned estimates or qualitative comparisons.\n"
-        "- Clearly state any assumptions for your estimates (e.g., unit costs, rates, location, or market conditions).\n"
-        "- Structure your answer logically (e.g., Option A vs Option B, or Before vs After change), and quantify differences where possible.\n"
-        "- Conclude with a recommendation or summary of which option is cost-favorable and why, if asked for advice.\n"
-        "- Always mention that actual costs can vary by project and location, and the comparison is based on typical scenarios.\n"
-        "# Example:\n"
-        "Query: Should we use steel or timber for the main structure?\n"
-        "Output: Steel framing typically costs 10-20% more than timber for similar spans, but offers greater durability and fire resistance. Timber is less expensive upfront and can be installed faster, reducing labor costs. However, steel may have lower maintenance costs over the building's life. In most urban markets, timber is more cost-effective for low-rise buildings, while steel is preferred for high-rise or long-span structures. Actual costs depend on local material prices and labor rates." # TODO fact-check this example
-    )
     # (Optionally, I think we might be able to retrieve relevant data here via rag_utils if needed to inform the comparison.)
     response = config.client.chat.completions.create(
         model=config.completion_model,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": COST_TRADEOFFS_PROMPT},
             {"role": "user", "content": query}
         ],
         temperature=0.5,  # Adjust temperature for more or less creative responses
@@ -137,94 +185,66 @@ def analyze_roi_sensitivity(query: str) -> str:
     """
     Analyze ROI sensitivity given a scenario in the user's query.
     Describes how changes in inputs (cost, revenue, etc.) affect the return on investment.
+    The numbers come from the local ROI engine (utils/roi_engine.py); the LLM only explains them.
     """
-    system_prompt = (
-        "You are a financial analyst for architecture projects, focusing on ROI sensitivity.\n"
-        "# Task:\n"
-        "Given a scenario or query, explain how the project's return on investment (ROI) or other financial metrics would change if key variables (such as construction cost, rent, interest rate, or occupancy) increase or decrease.\n"
-        "# Instructions:\n"
-        "- Identify the main variables mentioned in the query that could impact ROI.\n"
-        "- For each variable, describe how changes (e.g., +10% cost, -10% revenue) would affect ROI or payback period.\n"
-        "- Use approximate calculations if possible (e.g., \"ROI drops from 15% to ~12% if cost rises 10%\"), or provide qualitative analysis if no numbers are given.\n"
-        "- Clearly state any assumptions you make (such as base ROI, cost, or revenue figures).\n"
-        "- Highlight which variables have the greatest impact on ROI, if relevant.\n"
-        "- End with a note that these are scenario estimates for planning, not exact predictions, and that actual results may vary by project and market.\n"
-        "# Example:\n"
-        "Query: What happens to ROI if construction costs rise by 10% and rents fall by 5%?\n"
-        "Output: Assuming a base ROI of 15%, a 10% increase in construction costs would reduce ROI to approximately 13%. If rents also fall by 5%, ROI could drop further to around 11%. ROI is generally more sensitive to changes in revenue than to moderate cost overruns. Actual impacts depend on the project's financial structure and local market conditions." # TODO fact-check this example
-    )
-    response = config.client.chat.completions.create(
-        model=config.completion_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ],
-        temperature=0.5,  # Adjust temperature for more or less creative responses
-    )
-    return response.choices[0].message.content.strip()
+    return get_roi_analysis_answer(query)
+
+MATERIAL_IMPACT_PROMPT = (
+    "You are a building materials cost expert, specializing in evaluating the impact of material and structural choices on project cost, ROI, and schedule.\n"
+    "# Task:\n"
+    "Given a query comparing materials or systems, analyze and compare their effects on initial construction cost, long-term costs (maintenance, durability), schedule, and ROI if relevant.\n"
+    "# Instructions:\n"
+    "- For each material or system mentioned, discuss:\n"
+    "    - Initial cost differences (e.g., per area, percentage difference, or qualitative comparison if no data).\n"
+    "    - Long-term implications: for example, durability, maintenance, insurance, resale value, and sustainability if relevant.\n"
+    "    - Effects on construction schedule (e.g., faster/slower installation).\n"
+    "    - Any impact on ROI or lifecycle cost, if applicable.\n"
+    "- Clearly state any assumptions or typical benchmarks you use.\n"
+    "- Note context factors: local availability, labor skill, incentives, or code requirements that might influence the choice.\n"
+    "- Structure your answer by material/system, then provide a concluding comparison or recommendation.\n"
+    "- Always add a caveat that market prices and impacts vary by region and project, so the comparison is general.\n"
+    "# Example:\n"
+    "Query: Compare cross-laminated timber (CLT) and reinforced concrete for a mid-rise building.\n"
+    "Output: CLT typically costs 5-15% more per square foot than reinforced concrete in most markets, but can reduce construction time by up to 30% due to prefabrication. CLT offers sustainability benefits and lower embodied carbon, but may require additional fireproofing and has higher insurance costs in some regions. Concrete is more durable and widely available, with lower long-term maintenance. The best choice depends on project priorities, local expertise, and regulatory context. Actual costs and benefits will vary by location." # TODO fact-check this example
+)
 
 def assess_material_impact(query: str) -> str:
     """
     Evaluate how different material or structural choices impact cost (and possibly ROI or schedule).
     """
-    system_prompt = (
-        "You are a building materials cost expert, specializing in evaluating the impact of material and structural choices on project cost, ROI, and schedule.\n"
-        "# Task:\n"
-        "Given a query comparing materials or systems, analyze and compare their effects on initial construction cost, long-term costs (maintenance, durability), schedule, and ROI if relevant.\n"
-        "# Instructions:\n"
-        "- For each material or system mentioned, discuss:\n"
-        "    - Initial cost differences (e.g., per area, percentage difference, or qualitative comparison if no data).\n"
-        "    - Long-term implications: for example, durability, maintenance, insurance, resale value, and sustainability if relevant.\n"
-        "    - Effects on construction schedule (e.g., faster/slower installation).\n"
-        "    - Any impact on ROI or lifecycle cost, if applicable.\n"
-        "- Clearly state any assumptions or typical benchmarks you use.\n"
-        "- Note context factors: local availability, labor skill, incentives, or code requirements that might influence the choice.\n"
-        "- Structure your answer by material/system, then provide a concluding comparison or recommendation.\n"
-        "- Always add a caveat that market prices and impacts vary by region and project, so the comparison is general.\n"
-        "# Example:\n"
-        "Query: Compare cross-laminated timber (CLT) and reinforced concrete for a mid-rise building.\n"
-        "Output: CLT typically costs 5-15% more per square foot than reinforced concrete in most markets, but can reduce construction time by up to 30% due to prefabrication. CLT offers sustainability benefits and lower embodied carbon, but may require additional fireproofing and has higher insurance costs in some regions. Concrete is more durable and widely available, with lower long-term maintenance. The best choice depends on project priorities, local expertise, and regulatory context. Actual costs and benefits will vary by location." # TODO fact-check this example
-    )
     response = config.client.chat.completions.create(
         model=config.completion_model,
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": MATERIAL_IMPACT_PROMPT},
             {"role": "user", "content": query}
         ],
         temperature=0.3,  # Adjust temperature for more or less creative responses
     )
     return response.choices[0].message.content.strip()
 
-def classify_question_type(message: str) -> str:
+ROUTE_PROMPT = (
+    "You are a query classification agent for a building project assistant.\n"
+    "Classify the user's query into one of the following categories:\n"
+    "1. Cost Benchmark\n"
+    "2. ROI Analysis\n"
+    "3. Design-Cost Comparison\n"
+    "4. Value Engineering\n"
+    "5. Project Data Lookup\n"
+    "Return only the category name.\n\n"
+    "Examples:\n"
+    "Query: What is the typical cost per sqft for concrete in NYC?\nOutput: Cost Benchmark\n"
+    "Query: How much would I save by replacing glass with stone on the facade?\nOutput: Design-Cost Comparison\n"
+    "Query: If rents fall by 10%, what happens to ROI?\nOutput: ROI Analysis\n"
+    "Query: How can I lower construction costs without reducing quality?\nOutput: Value Engineering\n"
+    "Query: How many units does my current project support and what’s the total cost of concrete?\nOutput: Project Data Lookup"
+)
+
+def classify_question_type(message: str, use_local: bool = True, use_cache: bool = True) -> str:
     """
     Returns the category of the query: Cost Benchmark, ROI Analysis, Design-Cost Comparison, Value Engineering, or Project Data Lookup.
+    The local router answers confident cases; the rest go to the LLM.
     """
-    system_prompt = (
-        "You are a query classification agent for a building project assistant.\n"
-        "Classify the user's query into one of the following categories:\n"
-        "1. Cost Benchmark\n"
-        "2. ROI Analysis\n"
-        "3. Design-Cost Comparison\n"
-        "4. Value Engineering\n"
-        "5. Project Data Lookup\n"
-        "Return only the category name.\n\n"
-        "Examples:\n"
-        "Query: What is the typical cost per sqft for concrete in NYC?\nOutput: Cost Benchmark\n"
-        "Query: How much would I save by replacing glass with stone on the facade?\nOutput: Design-Cost Comparison\n"
-        "Query: If rents fall by 10%, what happens to ROI?\nOutput: ROI Analysis\n"
-        "Query: How can I lower construction costs without reducing quality?\nOutput: Value Engineering\n"
-        "Query: How many units does my current project support and what’s the total cost of concrete?\nOutput: Project Data Lookup"
-    )
-
-    response = config.client.chat.completions.create(
-        model=config.completion_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message}
-        ],
-        temperature=0.0,
-    )
-    return response.choices[0].message.content.strip()
+    return _classify("route", message, ROUTE_PROMPT, use_local=use_local, use_cache=use_cache)
 
 agent_prompt_dict = {
     "analyze cost tradeoffs": """
@@ -283,35 +303,65 @@ agent_prompt_dict = {
 }
 
 def run_llm_query(system_prompt: str, user_input: str, stream: bool = False):
-    import server.config as config
-    if not stream:
-        response = config.client.chat.completions.create(
-            model=config.completion_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.0,
-            max_tokens=1500,
-        )
-        return response.choices[0].message.content.strip()
-    else:
-        response = config.client.chat.completions.create(
-            model=config.completion_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ],
-            temperature=0.0,
-            max_tokens=1500,
-            stream=True,
+    # Temperature 0, so repeated questions are answered from the response cache (utils/llm_cache.py)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_input}
+    ]
+    return cached_chat_completion(messages, stream=stream, temperature=0.0, max_tokens=1500)
+
+def _with_header(header: str, answer):
+    """
+    Prefix an LLM answer (string or stream of chunks) with locally computed output.
+    """
+    if isinstance(answer, str):
+        return header + answer
+    def generator():
+        if header:
+            yield header
+        for chunk in answer:
+            yield chunk
+    return generator()
+
+def _question_adjustment(query: str):
+    """
+    CostAdjustment for the location / year in the question, or national base-year costs
+    (always, while no cost index is installed; see cost_data/cost_adjustment.py).
+    """
+    return detect_adjustment(query)
+
+COST_BENCHMARK_PROMPT = (
+    "You are a cost benchmark assistant. "
+    "Given the following RSMeans cost data (in markdown table format) and the user's question, provide a concise, clear answer. "
+    "Summarize the typical cost per unit, mention any relevant range, and note that actual costs may vary by project. "
+    "The cost basis line of the data states whether it is adjusted for location and year; do not apply another adjustment on top. "
+    "If multiple items are shown, explain the range and what affects it. "
+    "If the data is summarized as statistics by section and unit, base the typical cost on the median and the range on min/p90/max. "
+    "Always explicitly list out any assumptions you are making (such as location, year, unit, or scope). "
+    "Do not invent numbers; use only the data provided."
+)
+
+def _cost_benchmark_request(query: str, use_llm: bool = True):
+    """
+    RSMeans lookup for a cost benchmark question. Returns (header, system_prompt, user_input);
+    the header with the data table is empty if nothing matched and the LLM answers alone.
+    With use_llm=False returns None if picking the section would need an LLM call.
+    """
+    # Location / year mentioned in the question are applied to the numbers here, not by the LLM
+    adjustment = _question_adjustment(query)
+    result = get_cost_data(rsmeans_df, query, location=adjustment.zip_prefix, year=adjustment.year, use_llm=use_llm)
+    if result is None:
+        return None
+    if result.empty:
+        prompt = (
+            agent_prompt_dict["get cost benchmarks"] + "\nAlways explicitly list out any assumptions you are making (such as location, year, unit, or scope)."
         )
-        def generator():
-            for chunk in response:
-                delta = getattr(chunk.choices[0], 'delta', None)
-                if delta and hasattr(delta, 'content') and delta.content:
-                    yield delta.content
-        return generator()
+        return "", prompt, query
+    # Broad code matches can be hundreds of rows; keep the prompt bounded
+    summary_md = summarize_cost_matches(result)
+    summary_md = f"_{adjustment.describe()}._\n\n{summary_md}"
+    user_input = f"User question: {query}\n\nRSMeans data (markdown table):\n{summary_md}"
+    return f"**RSMeans Data:**\n\n{summary_md}\n\n**Interpretation:**\n", COST_BENCHMARK_PROMPT, user_input
 
 def get_cost_benchmark_answer(query: str, stream: bool = False):
     """
@@ -319,63 +369,356 @@ def get_cost_benchmark_answer(query: str, stream: bool = False):
     If RSMeans data is found, include a summary table and a short LLM-generated explanation referencing the data.
     If not, fallback to LLM only.
     """
-    result = get_cost_data(rsmeans_df, query)
-    if not result.empty:
-        summary_md = result[['Masterformat Section Code', 'Section Name', 'Name', 'Unit', 'Total Incl O&P']].to_markdown(index=False)
-        system_prompt = (
-            "You are a cost benchmark assistant. "
-            "Given the following RSMeans cost data (in markdown table format) and the user's question, provide a concise, clear answer. "
-            "Summarize the typical cost per unit, mention any relevant range, and note that actual costs may vary by project and location. "
-            "If multiple items are shown, explain the range and what affects it. "
-            "Always explicitly list out any assumptions you are making (such as location, year, unit, or scope). "
-            "Do not invent numbers; use only the data provided."
-        )
-        user_input = f"User question: {query}\n\nRSMeans data (markdown table):\n{summary_md}"
-        if not stream:
-            explanation = run_llm_query(system_prompt, user_input)
-            return f"**RSMeans Data:**\n\n{summary_md}\n\n**Interpretation:**\n{explanation}"
-        else:
-            def generator():
-                yield f"**RSMeans Data:**\n\n{summary_md}\n\n**Interpretation:**\n"
-                for chunk in run_llm_query(system_prompt, user_input, stream=True):
-                    yield chunk
-            return generator()
-    else:
-        prompt = (
-            agent_prompt_dict["get cost benchmarks"] + "\nAlways explicitly list out any assumptions you are making (such as location, year, unit, or scope)."
-        )
-        if not stream:
-            return run_llm_query(system_prompt=prompt, user_input=query)
-        else:
-            return run_llm_query(system_prompt=prompt, user_input=query, stream=True)
+    header, system_prompt, user_input = _cost_benchmark_request(query)
+    return _with_header(header, run_llm_query(system_prompt, user_input, stream=stream))
+
+ROI_INPUTS_PROMPT = (
+    "Extract real estate development inputs from the user's question. Return only a JSON object, no prose.\n"
+    "Format: {\"base\": {...}, \"changes\": {...}}\n"
+    "Keys for \"base\" (include only values stated in the question):\n"
+    "- construction_cost: total development cost in dollars\n"
+    "- annual_rent: gross potential rent per year in dollars\n"
+    "- occupancy, opex_ratio, cap_rate, interest_rate, loan_to_cost, rent_growth: fractions (0.065 for 6.5%)\n"
+    "- hold_years: years\n"
+    "Keys for \"changes\" (what-if changes asked about): construction_cost and annual_rent as relative "
+    "changes (0.10 for +10%, -0.05 for -5%); rates as absolute changes (0.01 for +1 percentage point); "
+    "hold_years in years.\n"
+    "Example: \"With a $12M budget and 6% cap rate, what if costs rise 10% and rates go up 1 point?\" -> "
+    "{\"base\": {\"construction_cost\": 12000000, \"cap_rate\": 0.06}, "
+    "\"changes\": {\"construction_cost\": 0.10, \"interest_rate\": 0.01}}"
+)
+
+def extract_roi_inputs(query: str) -> dict:
+    """
+    Extract the ROI base case and any what-if changes stated in the query with one JSON-only LLM call.
+    Returns {"base": {...}, "changes": {...}} with only the values the user actually gave;
+    anything unparseable is dropped and the engine defaults are used instead.
+    """
+    return _parse_roi_inputs(run_llm_query(ROI_INPUTS_PROMPT, query))
+
+def _parse_roi_inputs(raw: str) -> dict:
+    match = re.search(r"\{.*\}", raw, re.DOTALL)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    base = data.get("base") if isinstance(data.get("base"), dict) else {}
+    changes = data.get("changes") if isinstance(data.get("changes"), dict) else {}
+    return {"base": base, "changes": changes}
+
+ROI_ANALYSIS_PROMPT = (
+    "You are a financial analyst for architecture projects, focusing on ROI sensitivity. "
+    "Given the ROI model output below (markdown tables) and the user's question, explain the result in plain language. "
+    "Answer the question first (use the scenario column if there is one), then name the inputs with the largest impact "
+    "from the sensitivity table and describe the range of outcomes from the Monte Carlo table. "
+    "All numbers are already computed; quote them as given and do not recalculate or invent figures. "
+    "State which inputs are default assumptions, and note that these are planning estimates, not predictions."
+)
+
+def _roi_request(query: str, inputs: dict):
+    """
+    Run the ROI engine on the extracted inputs. Returns (header, system_prompt, user_input).
+    """
+    case = roi_engine.base_case(**inputs["base"])
+    report_md = roi_engine.roi_report(case, changes=inputs["changes"])
+    assumed = [roi_engine.ROI_LABELS[k] for k in roi_engine.ROI_LABELS if k not in inputs["base"]]
+    if assumed:
+        report_md += "\n\n_Default assumptions (not given in the question): " + ", ".join(assumed) + "._"
+    user_input = f"User question: {query}\n\nROI model output:\n{report_md}"
+    return f"**ROI Model:**\n\n{report_md}\n\n**Interpretation:**\n", ROI_ANALYSIS_PROMPT, user_input
+
+def get_roi_analysis_answer(query: str, stream: bool = False):
+    """
+    Answer an ROI question from the deterministic ROI engine: the base case (and scenario) are
+    extracted from the question, metrics, one-at-a-time sensitivities and a Monte Carlo run are
+    computed locally, and the LLM only narrates the resulting tables.
+    """
+    header, system_prompt, user_input = _roi_request(query, extract_roi_inputs(query))
+    return _with_header(header, run_llm_query(system_prompt, user_input, stream=stream))
+
+def _value_engineering_request(question: str, result: dict):
+    """(system_prompt, user_input) explaining value-engineering options."""
+    options_md = summarize_value_engineering(result)
+    system_prompt = (
+        agent_prompt_dict["suggest cost optimizations"]
+        + "\nThe substitution options below were computed from RSMeans data: each replaces a takeoff line item "
+        "with a cheaper item from the same Masterformat section and unit. Explain each option briefly, point out "
+        "substitutions that may change scope, quality or performance and should be checked by the design team, "
+        "and recommend one option. Use only the savings shown; do not invent numbers."
+    )
+    return system_prompt, f"User question: {question}\n\nSubstitution options:\n{options_md}"
+
+def explain_value_engineering(question: str, result: dict) -> str:
+    """
+    Explain substitution sets found by the value-engineering optimizer (rsmeans_utils.value_engineer).
+    The options and savings are computed locally; the LLM only explains trade-offs between them.
+    """
+    return run_llm_query(*_value_engineering_request(question, result))
+
+# Routes answered by route_query_to_function, as they appear in classify_question_type output
+ROUTES = ["cost benchmark", "roi analysis", "design-cost comparison", "value engineering", "project data lookup"]
+# Routes answered from retrieved documents when RAG is on (the others use RSMeans or the ROI engine)
+RETRIEVAL_ROUTES = ["design-cost comparison", "value engineering", "project data lookup"]
+
+# Start retrieval and the RSMeans lookup while the question is classified; work the route doesn't need is discarded
+SPECULATIVE_PIPELINE = True
+_pipeline_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative")
+
+def _submit(fn, *args):
+    # Run in the caller's context, so stage timings reach the request's metrics (utils/metrics.py)
+    return _pipeline_executor.submit(contextvars.copy_context().run, fn, *args)
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def _route_jobs(message: str, collection=None, ranker=None, use_rag: bool = False, speculative: bool = True):
+    """
+    Submit the classification and, if speculative, the RSMeans lookup and (with RAG) retrieval + reranking.
+    Returns the jobs by stage name, for _speculative_route.
+    """
+    jobs = {"classify": _submit(_timed, classify_question_type, message)}
+    if speculative:
+        # Local lookup only: a section the LLM has to pick is looked up after the label, if needed
+        jobs["rsmeans"] = _submit(_timed, _cost_benchmark_request, message, False)
+        if use_rag and collection is not None:
+            jobs["retrieve"] = _submit(_timed, rag_utils.rag_context, message, collection, ranker)
+    return jobs
 
-def route_query_to_function(message: str, collection=None, ranker=None, use_rag: bool=False, stream: bool = False):
+def _speculative_route(message: str, collection=None, ranker=None, use_rag: bool = False, jobs: dict = None,
+                       start: float = None):
+    """
+    Run classification, the RSMeans lookup and (with RAG) retrieval + reranking concurrently, then join on the label.
+    jobs / start: stages already submitted with _route_jobs and when.
+    Returns (classification, prefetched) where prefetched maps 'rsmeans' / 'retrieve' to the results the route uses.
+    Stage times and the time saved against running the used stages one after another are logged.
+    """
+    if jobs is None:
+        start, jobs = time.perf_counter(), _route_jobs(message, collection, ranker, use_rag)
+
+    classification, classify_seconds = jobs["classify"].result()
+    classification = classification.lower()
+    needed = set()
+    if "cost benchmark" in classification:
+        needed.add("rsmeans")
+    if "retrieve" in jobs and any(r in classification for r in RETRIEVAL_ROUTES):
+        needed.add("retrieve")
+
+    prefetched, stages = {}, {"classify": classify_seconds}
+    for name, job in jobs.items():
+        if name == "classify":
+            continue
+        if name not in needed:
+            job.cancel()  # no-op if already running; its result is ignored
+            continue
+        try:
+            result, stages[name] = job.result()
+        except Exception as e:
+            # Leave it to the route to redo the work (and surface the error) the normal way
+            logger.warning({"event": "speculative_stage_failed", "stage": name, "error": str(e)})
+            continue
+        # None: the local lookup wasn't enough, the route does the full one
+        if result is not None:
+            prefetched[name] = result
+    wall = time.perf_counter() - start
+    saved = max(sum(stages.values()) - wall, 0.0)
+    discarded = sorted(set(jobs) - needed - {"classify"})
+    logger.info({
+        "event": "pipeline_timing",
+        "classification": classification,
+        "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in stages.items()},
+        "wall_ms": round(wall * 1000, 3),
+        "saved_ms": round(saved * 1000, 3),
+        "discarded": discarded,
+    })
+    return classification, prefetched
+
+def route_query_to_function(message: str, collection=None, ranker=None, use_rag: bool=False, stream: bool = False,
+                            speculative: bool = None):
     """
     Classify the user message into one of the five core categories and route it to the appropriate response function.
     If stream=True, returns a generator for streaming output.
+    Paraphrases of questions answered before are served from the semantic answer cache (utils/semantic_cache.py).
+    With speculative=True (default: SPECULATIVE_PIPELINE) retrieval and the RSMeans lookup run while the
+    question is being classified (see _speculative_route).
+    Time to first token and total time are logged as an answer_timing event (see _time_answer).
     """
-    classification = classify_question_type(message).lower()
+    request = metrics.start_request()
+    cache = get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None
+    scope = collection_scope(collection, use_rag)
+    if speculative is None:
+        speculative = SPECULATIVE_PIPELINE
+    # The question is embedded for the semantic cache while it is being classified, so a cache
+    # miss doesn't pay the embedding round trip before classification starts
+    start = time.perf_counter()
+    embed_job = _submit(embed_question, message) if cache is not None else None
+    jobs = _route_jobs(message, collection, ranker, use_rag, speculative)
+    vector = None
+    if embed_job is not None:
+        try:
+            vector = embed_job.result()
+        except Exception as e:
+            logger.warning({"event": "semantic_cache_skipped", "error": str(e)})
+        if vector is not None:
+            hit = cache.lookup(vector, message, scope)
+            if hit is not None:
+                for job in jobs.values():
+                    job.cancel()  # no-op if already running; its result is ignored
+                answer = replay_chunks(hit["answer"]) if stream else hit["answer"]
+                return _time_answer((answer, hit["sources"]) if use_rag else answer, request, hit["route"], use_rag,
+                                    cached=True)
+
+    if speculative:
+        classification, prefetched = _speculative_route(message, collection, ranker, use_rag, jobs=jobs, start=start)
+    else:
+        classification, prefetched = jobs["classify"].result()[0].lower(), None
     print(classification)
+    answer_start = time.perf_counter()
+    result = _answer_route(classification, message, collection, ranker, use_rag, stream, prefetched=prefetched)
+    route = next((r for r in ROUTES if r in classification), None)
+    if vector is None or route is None:
+        return _time_answer(result, request, route, use_rag, answer_start=answer_start)
+
+    def store(answer, sources=None):
+        cache.store(vector, message, route, answer, sources=sources, scope=scope)
+
+    if use_rag:
+        answer, sources = result
+        result = _remember_answer(answer, lambda text: store(text, sources)), sources
+    else:
+        result = _remember_answer(result, store)
+    return _time_answer(result, request, route, use_rag, answer_start=answer_start)
+
+def _log_answer_timing(request, route, use_rag: bool, stream: bool, cached: bool, ttft: float, total: float,
+                       chunks: int, answer_start: float = None):
+    """Record the answer stages on the request metrics (utils/metrics.py) and log them as an answer_timing event."""
+    request.observe("ttft", ttft)
+    if answer_start is not None:
+        request.observe("generate", request.start + total - answer_start)
+    request.observe("total", total)
+    fields = request.finish(route, cached=cached)
+    logger.info({
+        "event": "answer_timing",
+        "route": route,
+        "rag": use_rag,
+        "stream": stream,
+        "cached": cached,
+        "mode": config.get_mode(),
+        "model": config.completion_model,
+        "ttft_ms": round(ttft * 1000, 3),
+        "total_ms": round(total * 1000, 3),
+        "chunks": chunks,
+        **fields,
+    })
+
+def _time_answer(result, request, route, use_rag: bool, cached: bool = False, answer_start: float = None):
+    """
+    Log time to first token and total time since the request started for a route_query_to_function result,
+    with the stage times and token usage collected on `request` (utils/metrics.py). answer_start is when the
+    route's answer function was called: the 'generate' stage runs from there to the last chunk.
+    A streamed answer is timed as the caller consumes it, so its first token is the one the client sees;
+    for a string answer both times are the same.
+    """
+    answer, sources = result if use_rag else (result, None)
+    if isinstance(answer, str):
+        elapsed = time.perf_counter() - request.start
+        _log_answer_timing(request, route, use_rag, False, cached, elapsed, elapsed, 1, answer_start)
+        return result
+
+    def generator():
+        first, chunks = None, 0
+        for chunk in answer:
+            if first is None:
+                first = time.perf_counter() - request.start
+            chunks += 1
+            yield chunk
+        total = time.perf_counter() - request.start
+        _log_answer_timing(request, route, use_rag, True, cached, total if first is None else first, total, chunks,
+                           answer_start)
+    return (generator(), sources) if use_rag else generator()
 
+def _remember_answer(answer, store):
+    """
+    Pass `answer` through to the caller and store it once complete: immediately for a string,
+    after the last chunk for a streamed generator.
+    """
+    if isinstance(answer, str):
+        store(answer)
+        return answer
+
+    def generator():
+        parts = []
+        for chunk in answer:
+            parts.append(chunk)
+            yield chunk
+        store("".join(parts))
+    return generator()
+
+def _route_prompt(classification: str, message: str):
+    """
+    System prompt for the routes answered by a single prompted LLM (or RAG) call, None for other classifications.
+    """
     match classification:
-        case x if "cost benchmark" in x:
-            return get_cost_benchmark_answer(message, stream=stream)
-        case x if "roi analysis" in x:
-            prompt = agent_prompt_dict["analyze roi sensitivity"]
         case x if "design-cost comparison" in x:
             prompt = agent_prompt_dict["analyze cost tradeoffs"]
+            # Ground the comparison in the precomputed RSMeans distributions when the question names known systems
+            comparison_md = compare_design_costs(rsmeans_df, message, adjustment=_question_adjustment(message))
+            if comparison_md:
+                prompt += (
+                    "\nRSMeans unit-cost distributions for the systems in the question (markdown table):\n"
+                    f"{comparison_md}\n"
+                    "Base the cost comparison on these numbers (median as typical, p25-p75 as range) and only compare "
+                    "rows with the same unit directly. Do not invent cost figures that contradict this data; "
+                    "say so if a system has no data.\n"
+                )
+            return prompt
         case x if "value engineering" in x:
-            prompt = agent_prompt_dict["suggest cost optimizations"]
+            return agent_prompt_dict["suggest cost optimizations"]
         case x if "project data lookup" in x:
-            prompt = agent_prompt_dict["analyze project data inputs"]
-        case _:
-            return "I'm sorry, I cannot process this request. Please ask a question related to cost, ROI, or project data."
-    
+            return agent_prompt_dict["analyze project data inputs"]
+    return None
+
+# Answer for classifications that match none of the routes
+UNROUTED_ANSWER = "I'm sorry, I cannot process this request. Please ask a question related to cost, ROI, or project data."
+
+def _answer_route(classification: str, message: str, collection=None, ranker=None, use_rag: bool=False, stream: bool = False,
+                  prefetched: dict = None):
+    """
+    Answer the message with the response function for its classification.
+    prefetched holds results of the speculative pipeline ('rsmeans', 'retrieve') to use instead of recomputing them.
+    """
+    prefetched = prefetched or {}
+    match classification:
+        case x if "cost benchmark" in x:
+            if "rsmeans" in prefetched:
+                header, system_prompt, user_input = prefetched["rsmeans"]
+                answer = _with_header(header, run_llm_query(system_prompt, user_input, stream=stream))
+            else:
+                answer = get_cost_benchmark_answer(message, stream=stream)
+            # Answered from RSMeans, not retrieved documents, but RAG callers expect (answer, sources)
+            return (answer, []) if use_rag else answer
+        case x if "roi analysis" in x:
+            answer = get_roi_analysis_answer(message, stream=stream)
+            # The ROI engine doesn't use retrieved documents, but RAG callers expect (answer, sources)
+            return (answer, []) if use_rag else answer
+
+    prompt = _route_prompt(classification, message)
+    if prompt is None:
+        return (UNROUTED_ANSWER, []) if use_rag else UNROUTED_ANSWER
     if use_rag:
-        (answer, source) = rag_utils.rag_call_alt(message, collection, ranker, agent_prompt=prompt)
+        # Retrieval and reranking finish first; with stream=True the generated tokens then flow as they arrive
+        if "retrieve" in prefetched:
+            rag_result = prefetched["retrieve"]
+            answer = rag_utils.rag_answer(question=message, prompt=rag_utils.rag_prompt(message, rag_result, prompt),
+                                          stream=stream)
+            return answer, rag_result
+        (answer, source) = rag_utils.rag_call_alt(message, collection, ranker, agent_prompt=prompt, stream=stream)
         return (answer, source)
     else:
         if not stream:
             return run_llm_query(system_prompt=prompt, user_input=message)
         else:
-            return run_llm_query(system_prompt=prompt, user_input=message, stream=True)
\ No newline at end of file
+            return run_llm_query(system_prompt=prompt, user_input=message, stream=True)
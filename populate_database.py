@@ -209,6 +209,7 @@
 import argparse
 import os
 import shutil
+from datetime import datetime, timezone
 from tqdm import tqdm
 import chromadb
 from chromadb.config import Settings
@@ -216,6 +217,7 @@ from chromadb.utils import embedding_functions
 from PyPDF2 import PdfReader
 import markdown
 from bs4 import BeautifulSoup
+from utils.sparse_index import build_chunk_index
 
 CHROMA_PATH = "chroma"
 SOURCE_DATA_DIR = "source_data"
@@ -298,6 +300,18 @@ def split_text(text, source_file):
     
     return chunks, chunk_ids, metadata_list
 
+def bump_collection_version(collection):
+    """
+    Set a new metadata 'version' on the collection. Caches keyed by the collection version
+    (utils/retrieval_cache.py, utils/semantic_cache.py) stop matching the old contents.
+    A timestamp rather than a counter, so a --reset database never reuses a version.
+    """
+    # Chroma refuses hnsw:* keys in modify(); they are kept from creation anyway
+    metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    metadata["version"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    collection.modify(metadata=metadata)
+    return metadata["version"]
+
 def populate_database():
     """Create or update the database with documents"""
     client = chromadb.PersistentClient(
@@ -322,6 +336,8 @@ def populate_database():
 
     # Process documents
     print("\nProcessing documents...")
+    # Chroma skips ids that already exist, so new chunks are counted from the collection size
+    count_before = collection.count()
     for filename in tqdm(os.listdir(SOURCE_DATA_DIR)):
         if filename.endswith(('.pdf', '.md', '.markdown')):
             file_path = os.path.join(SOURCE_DATA_DIR, filename)
@@ -348,6 +364,16 @@ def populate_database():
                 print(f"\nError processing {filename}: {str(e)}")
                 continue
 
+    # Keyword index over the same chunk ids, used next to dense search (utils/sparse_index.py)
+    print("\nBuilding BM25 index...")
+    index = build_chunk_index(collection)
+    print(f"BM25 index: {len(index)} chunks")
+
+    added = collection.count() - count_before
+    print(f"New chunks: {added}")
+    if added:
+        print(f"Collection version: {bump_collection_version(collection)}")
+
     print("\n✅ Database population complete!")
 
 if __name__ == "__main__":
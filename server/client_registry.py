@@ -0,0 +1,248 @@
+# Lazily created provider clients with one tuned httpx connection pool per provider.
+# A provider's OpenAI / AsyncOpenAI client is only built the first time it is used, and all
+# requests to that provider reuse the same keep-alive connections (HTTP/2 if the h2
+# package is installed), so the TCP + TLS handshake is paid once per connection instead of
+# showing up in request latency. prewarm() opens connections in the background.
+
+import asyncio
+import logging
+import threading
+import time
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool limits per provider and client kind (sync / async)
+POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120.0)
+# Generations can take minutes to stream; connecting or waiting for a pooled connection can't
+HTTP_TIMEOUT = httpx.Timeout(connect=5.0, read=300.0, write=30.0, pool=10.0)
+PREWARM_TIMEOUT = 5.0
+
+logger = logging.getLogger("app_logger")
+
+
+class _PoolStats:
+    """Request / error counts and distinct connections seen for one httpx client."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.connections_seen = set()
+
+    def record(self, response, seconds, connections):
+        with self.lock:
+            self.requests += 1
+            self.seconds += seconds
+            if response.status_code >= 400:
+                self.errors += 1
+            self.connections_seen.update(id(c) for c in connections)
+
+
+def _pool_connections(http_client):
+    """httpcore connections of an httpx client's default transport (empty if unavailable)."""
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []) or [])
+
+
+class ProviderClients:
+    """
+    Lazily built sync and async OpenAI clients for one provider, each on its own pooled
+    httpx client (sync and async transports can't share connections).
+    """
+
+    def __init__(self, name, base_url=None, api_key=None):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._http = None
+        self._async_http = None
+        self._stats = {"sync": _PoolStats(), "async": _PoolStats()}
+
+    def _hooks(self, kind):
+        stats = self._stats[kind]
+
+        def on_request(request):
+            request.extensions["pool_start"] = time.perf_counter()
+
+        def on_response(response):
+            start = response.request.extensions.get("pool_start", time.perf_counter())
+            stats.record(response, time.perf_counter() - start, _pool_connections(self._http))
+
+        async def on_async_request(request):
+            on_request(request)
+
+        async def on_async_response(response):
+            start = response.request.extensions.get("pool_start", time.perf_counter())
+            stats.record(response, time.perf_counter() - start, _pool_connections(self._async_http))
+
+        if kind == "sync":
+            return {"request": [on_request], "response": [on_response]}
+        return {"request": [on_async_request], "response": [on_async_response]}
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._http = DefaultHttpxClient(http2=HTTP2_AVAILABLE, limits=POOL_LIMITS, timeout=HTTP_TIMEOUT,
+                                                    event_hooks=self._hooks("sync"))
+                    self._client = OpenAI(base_url=self.base_url, api_key=self.api_key, http_client=self._http)
+        return self._client
+
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_http = DefaultAsyncHttpxClient(http2=HTTP2_AVAILABLE, limits=POOL_LIMITS,
+                                                               timeout=HTTP_TIMEOUT, event_hooks=self._hooks("async"))
+                    self._async_client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key,
+                                                     http_client=self._async_http)
+        return self._async_client
+
+    def prewarm(self, connections=1):
+        """
+        Open `connections` pooled connections by listing the provider's models (a cheap
+        authenticated GET). Failures are ignored; the pool just stays cold.
+        """
+        client = self.client()
+        url = str(client.base_url).rstrip("/") + "/models"
+        headers = {"Authorization": f"Bearer {client.api_key}"}
+
+        def ping():
+            try:
+                self._http.get(url, headers=headers, timeout=PREWARM_TIMEOUT)
+            except httpx.HTTPError:
+                pass
+
+        threads = [threading.Thread(target=ping, daemon=True) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    async def async_prewarm(self, connections=1):
+        """prewarm for the async client's pool; call from the event loop that will use it."""
+        client = self.async_client()
+        url = str(client.base_url).rstrip("/") + "/models"
+        headers = {"Authorization": f"Bearer {client.api_key}"}
+
+        async def ping():
+            try:
+                await self._async_http.get(url, headers=headers, timeout=PREWARM_TIMEOUT)
+            except httpx.HTTPError:
+                pass
+
+        await asyncio.gather(*(ping() for _ in range(connections)))
+
+    def stats(self):
+        result = {"created": {"sync": self._client is not None, "async": self._async_client is not None}}
+        for kind, http_client in (("sync", self._http), ("async", self._async_http)):
+            stats = self._stats[kind]
+            connections = _pool_connections(http_client) if http_client is not None else []
+            idle = sum(1 for c in connections if c.is_idle())
+            with stats.lock:
+                result[kind] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "avg_seconds": stats.seconds / stats.requests if stats.requests else 0.0,
+                    # Connections ever used: requests per connection shows how well they are reused
+                    "connections_opened": len(stats.connections_seen),
+                    "connections": len(connections),
+                    "active": len(connections) - idle,
+                    "idle": idle,
+                    "http2": sum(1 for c in connections if "HTTP/2" in c.info()),
+                    "max_connections": POOL_LIMITS.max_connections,
+                }
+        return result
+
+    def _detach(self):
+        with self._lock:
+            pools = (self._http, self._async_http)
+            self._client = self._async_client = self._http = self._async_http = None
+        return pools
+
+    def close(self):
+        """
+        Close both pools. The async pool's aclose runs on the current event loop if there is
+        one (as a task), otherwise to completion here; from async code prefer aclose().
+        """
+        http, async_http = self._detach()
+        if http is not None:
+            http.close()
+        if async_http is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                try:
+                    asyncio.run(async_http.aclose())
+                except Exception as e:  # connections bound to an event loop that is gone
+                    logger.warning({"event": "async_pool_close_failed", "provider": self.name, "error": str(e)})
+            else:
+                loop.create_task(async_http.aclose())
+
+    async def aclose(self):
+        """Close both pools; call from the event loop that used the async client."""
+        http, async_http = self._detach()
+        if http is not None:
+            http.close()
+        if async_http is not None:
+            await async_http.aclose()
+
+
+class ClientRegistry:
+    """
+    Provider name -> ProviderClients, e.g. registry.client("openai").
+    """
+
+    def __init__(self, providers):
+        self._providers = {name: ProviderClients(name, base_url, api_key)
+                           for name, (base_url, api_key) in providers.items()}
+
+    def provider(self, name):
+        try:
+            return self._providers[name]
+        except KeyError:
+            raise ValueError(f"Unknown provider: {name}") from None
+
+    def client(self, name):
+        return self.provider(name).client()
+
+    def async_client(self, name):
+        return self.provider(name).async_client()
+
+    def prewarm(self, names, connections=1, background=True):
+        """Pre-open connections to the given providers, in a daemon thread unless background=False."""
+        def run():
+            for name in names:
+                self.provider(name).prewarm(connections)
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    async def async_prewarm(self, names, connections=1):
+        for name in names:
+            await self.provider(name).async_prewarm(connections)
+
+    def stats(self):
+        return {name: provider.stats() for name, provider in self._providers.items()}
+
+    def close(self):
+        for provider in self._providers.values():
+            provider.close()
+
+    async def aclose(self):
+        for provider in self._providers.values():
+            await provider.aclose()
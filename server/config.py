@@ -1,5 +1,5 @@
 import random
-from openai import OpenAI
+from server.client_registry import ClientRegistry
 # from server.keys import *
 import os
 from dotenv import load_dotenv
@@ -10,6 +10,16 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CLOUDFLARE_ACCOUNT_ID = os.getenv("CLOUDFLARE_ACCOUNT_ID")
 CLOUDFLARE_API_KEY = os.getenv("CLOUDFLARE_API_KEY")
+# Providers to hedge / fail over to when the active one is slow or failing (server/provider_router.py),
+# e.g. LLM_FALLBACK_PROVIDERS=openai,cloudflare, or "none" to use only the active provider.
+# Unset: every cloud provider below that has credentials (the active one is skipped at call time).
+def _fallback_providers(setting):
+    if setting is None:
+        configured = {"openai": OPENAI_API_KEY, "cloudflare": CLOUDFLARE_API_KEY and CLOUDFLARE_ACCOUNT_ID}
+        return [name for name, credentials in configured.items() if credentials]
+    return [p.strip() for p in setting.split(",") if p.strip() and p.strip().lower() != "none"]
+
+FALLBACK_PROVIDERS = _fallback_providers(os.getenv("LLM_FALLBACK_PROVIDERS"))
 
 # Mode control using getter/setter
 _mode = "cloudflare"  # default
@@ -19,14 +29,31 @@ def get_mode():
     return _mode
 
 def set_mode(new_mode, cf_gen_model=None, cf_emb_model=None):
-    global _mode, client, completion_model, embedding_model
+    global _mode, completion_model, embedding_model
+    completion_model, embedding_model = models_for(new_mode, cf_gen_model, cf_emb_model)
     _mode = new_mode
-    client, completion_model, embedding_model = api_mode(_mode, cf_gen_model, cf_emb_model)
 
 # API
-local_client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-cloudflare_client = OpenAI(base_url = f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/v1", api_key = CLOUDFLARE_API_KEY)
+# Provider clients are created on first use and keep one pooled HTTP connection set each
+# (server/client_registry.py): registry.client(mode) / registry.async_client(mode).
+registry = ClientRegistry({
+    "local": ("http://localhost:1234/v1", "lm-studio"),
+    "openai": (None, OPENAI_API_KEY),
+    "cloudflare": (f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/v1", CLOUDFLARE_API_KEY),
+})
+
+# Old module-level names, resolved lazily so importing config doesn't build every client.
+# client / async_client are the clients of the current mode, built the first time they are used.
+_CLIENT_NAMES = {"local_client": "local", "openai_client": "openai", "cloudflare_client": "cloudflare"}
+
+def __getattr__(name):
+    if name in _CLIENT_NAMES:
+        return registry.client(_CLIENT_NAMES[name])
+    if name == "client":
+        return registry.client(_mode)
+    if name == "async_client":
+        return registry.async_client(_mode)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Embedding Models
@@ -58,27 +85,33 @@ llama3 = [
 cloudflare_model = "@cf/meta/llama-3.3-70b-instruct-fp8-fast"
 
 # Define what models to use according to chosen "mode"
-def api_mode (mode, cf_gen_model=None, cf_emb_model=None):
+def models_for(mode, cf_gen_model=None, cf_emb_model=None):
+    """(completion_model, embedding_model) of a mode."""
     if mode == "local":
-        client = local_client
-        completion_model = llama3[0]['model']
-        embedding_model = local_embedding_model
-        return client, completion_model, embedding_model
-    
+        return llama3[0]['model'], local_embedding_model
     if mode == "cloudflare":
-        client = cloudflare_client
         completion_model = cf_gen_model if cf_gen_model else cloudflare_model
         embedding_model = cf_emb_model if cf_emb_model else cloudflare_embedding_model
-        return client, completion_model, embedding_model
-    
+        return completion_model, embedding_model
     elif mode == "openai":
-        client = openai_client
-        completion_model = gpt4o
-        completion_model = completion_model[0]['model']
-        embedding_model = openai_embedding_model
-
-        return client, completion_model, embedding_model
+        return gpt4o[0]['model'], openai_embedding_model
     else:
         raise ValueError("Please specify if you want to run local or openai models")
 
-client, completion_model, embedding_model = api_mode(_mode)
\ No newline at end of file
+def api_mode (mode, cf_gen_model=None, cf_emb_model=None):
+    completion_model, embedding_model = models_for(mode, cf_gen_model, cf_emb_model)
+    return registry.client(mode), completion_model, embedding_model
+
+def completion_model_for(mode):
+    """Completion model of a provider: the active model for the current mode, the default for the others."""
+    if mode == _mode:
+        return completion_model
+    if mode == "local":
+        return llama3[0]['model']
+    if mode == "cloudflare":
+        return cloudflare_model
+    if mode == "openai":
+        return gpt4o[0]['model']
+    raise ValueError(f"Unknown mode: {mode}")
+
+completion_model, embedding_model = models_for(_mode)
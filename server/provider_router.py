@@ -0,0 +1,424 @@
+# Latency-aware provider routing for chat completions.
+# Every call goes to the active provider (config.get_mode()) unless its circuit breaker is
+# open. Fallback providers come from config.FALLBACK_PROVIDERS: LLM_FALLBACK_PROVIDERS, or by
+# default every cloud provider with credentials in server/config.py. Without any, hedging and
+# failover do nothing (a warning is logged when the router is created). Otherwise a
+# request still running after the primary's p95 latency gets a hedged duplicate on the
+# next provider; the first answer wins and the other call is cancelled (async) or
+# abandoned (sync). Timeouts, connection errors, 429 and 5xx responses are retried with
+# exponential backoff (or the 429's Retry-After) on the next available provider and count
+# toward its circuit breaker; other errors (400, 401, 404, context length, ...) are the
+# request's fault and are raised at once. Use utils/mock_openai_server.py to try it with injected delays and
+# errors (benchmarks/bench_hedging.py).
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import openai
+
+import server.config as config
+
+logger = logging.getLogger("app_logger")
+
+HEDGING_ENABLED = True
+# Hedge delay: the primary's p95 latency, clamped; HEDGE_DEFAULT_DELAY until MIN_SAMPLES calls are recorded.
+# Streamed calls (time to response headers) and full non-stream generations keep separate windows.
+HEDGE_MIN_DELAY = 0.25
+HEDGE_MAX_DELAY = 10.0
+HEDGE_DEFAULT_DELAY = 2.0
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Circuit breaker: open after this many consecutive failures, for a cooldown that doubles
+# on every failed half-open probe
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 15.0
+BREAKER_MAX_COOLDOWN = 300.0
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.2  # seconds, doubled per attempt, with jitter
+RETRY_AFTER_MAX = 30.0  # longest 429 Retry-After honoured, seconds
+
+
+class ProviderHealth:
+    """
+    Rolling latency and outcome window plus a circuit breaker for one (provider, model).
+    Latencies are kept per call kind: stream=True (time until the stream starts) and
+    stream=False (whole generation). Breaker states: 'closed' (normal), 'open' (skipped until the cooldown ends),
+    'half-open' (cooldown over, the next call is a probe).
+    """
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self._lock = threading.Lock()
+        self.latencies = {False: deque(maxlen=LATENCY_WINDOW), True: deque(maxlen=LATENCY_WINDOW)}
+        self.outcomes = deque(maxlen=LATENCY_WINDOW)
+        self.consecutive_failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.opened = 0
+
+    def state(self, now=None):
+        now = time.monotonic() if now is None else now
+        if self.consecutive_failures < BREAKER_FAILURES:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def available(self):
+        return self.state() != "open"
+
+    def record_success(self, seconds, stream=False):
+        with self._lock:
+            self.latencies[bool(stream)].append(seconds)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.cooldown = BREAKER_COOLDOWN
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            half_open = self.state() == "half-open"
+            self.consecutive_failures += 1
+            if half_open:
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+            if self.consecutive_failures >= BREAKER_FAILURES:
+                if half_open or self.consecutive_failures == BREAKER_FAILURES:
+                    self.opened += 1
+                self.open_until = time.monotonic() + self.cooldown
+
+    def percentile(self, q, stream=False):
+        with self._lock:
+            latencies = self.latencies[bool(stream)]
+            if len(latencies) < MIN_SAMPLES:
+                return None
+            return float(np.percentile(np.fromiter(latencies, dtype=float), q))
+
+    def hedge_delay(self, stream=False):
+        p95 = self.percentile(95, stream)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(max(p95, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    def snapshot(self):
+        with self._lock:
+            outcomes = list(self.outcomes)
+        return {
+            "state": self.state(),
+            "calls": len(outcomes),
+            "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "hedge_delay_seconds": self.hedge_delay(),
+            "stream_p50_seconds": self.percentile(50, stream=True),
+            "stream_p95_seconds": self.percentile(95, stream=True),
+            "stream_hedge_delay_seconds": self.hedge_delay(stream=True),
+            "breaker_opened": self.opened,
+        }
+
+
+class _Target:
+    """
+    A provider to call: name, model, its clients (server/client_registry.py ProviderClients;
+    the sync or async client is only built when used) and its health record.
+    """
+
+    def __init__(self, name, model, provider, health):
+        self.name = name
+        self.model = model
+        self.provider = provider
+        self.health = health
+
+    @property
+    def client(self):
+        return self.provider.client()
+
+    @property
+    def async_client(self):
+        return self.provider.async_client()
+
+
+def _without_retries(client):
+    # The router retries across providers itself; the SDK's own retries would hide failures from the breaker
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if with_options else client
+
+
+class ProviderRouter:
+    """
+    Chat completions across the active provider and configured fallbacks with hedging,
+    circuit breakers and retries. create(...) / acreate(...) take the arguments of
+    client.chat.completions.create except model.
+    """
+
+    def __init__(self, fallbacks=None, hedging=HEDGING_ENABLED, attempts=RETRY_ATTEMPTS):
+        self.fallbacks = list(config.FALLBACK_PROVIDERS if fallbacks is None else fallbacks)
+        self.hedging = hedging
+        self.attempts = attempts
+        self._health = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="provider")
+        self.counters = {"requests": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "failovers": 0, "failures": 0}
+        if not [name for name in self.fallbacks if name != config.get_mode()]:
+            logger.warning({"event": "provider_router_no_fallback", "mode": config.get_mode(),
+                            "hedging": self.hedging, "fallbacks": self.fallbacks,
+                            "message": "no fallback provider: hedging and failover are off; "
+                                       "set LLM_FALLBACK_PROVIDERS or provider credentials"})
+
+    def health(self, provider, model):
+        with self._lock:
+            key = (provider, model)
+            if key not in self._health:
+                self._health[key] = ProviderHealth(provider, model)
+            return self._health[key]
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def targets(self, exclude=(), stream=False):
+        """
+        Providers to try, best first: the active provider, then fallbacks by median latency
+        (of streamed or non-stream calls, as given).
+        Providers with an open breaker go last (all open: the one closest to its half-open probe first).
+        """
+        mode = config.get_mode()
+        targets = [_Target(mode, config.completion_model, config.registry.provider(mode),
+                           self.health(mode, config.completion_model))]
+        for name in self.fallbacks:
+            if name == mode:
+                continue
+            try:
+                model = config.completion_model_for(name)
+                targets.append(_Target(name, model, config.registry.provider(name), self.health(name, model)))
+            except Exception as e:  # e.g. missing API key
+                logger.warning({"event": "fallback_provider_unavailable", "provider": name, "error": str(e)})
+        targets = [t for t in targets if t.name not in exclude] or targets
+        primary, others = targets[0], targets[1:]
+        others.sort(key=lambda t: t.health.percentile(50, stream) or float("inf"))
+        ordered = [primary] + others
+        return sorted(ordered, key=lambda t: (not t.health.available(), t.health.open_until if not t.health.available() else 0))
+
+    # Sync
+
+    def _call(self, target, params, started=None):
+        if started is not None:
+            started.set()
+        start = time.perf_counter()
+        try:
+            response = _without_retries(target.client).chat.completions.create(model=target.model, **params)
+        except Exception as e:
+            if is_retryable(e):
+                target.health.record_failure()
+            raise
+        target.health.record_success(time.perf_counter() - start, params.get("stream", False))
+        return response
+
+    def _hedged(self, primary, hedge, params):
+        if hedge is None:
+            return self._call(primary, params), primary
+        started = threading.Event()
+        first = self._executor.submit(self._call, primary, params, started)
+        # Time spent queued for an executor thread doesn't count toward the hedge delay
+        started.wait()
+        done, _ = wait([first], timeout=primary.health.hedge_delay(params.get("stream", False)))
+        if done and first.exception() is None:
+            return first.result(), primary
+        if done and not is_retryable(first.exception()):
+            raise first.exception()
+        # Still running after the hedge delay: duplicate it; already failed: fail over right away
+        hedged = not done
+        if hedged:
+            self._count("hedges")
+        second = self._executor.submit(self._call, hedge, params)
+        futures = {first: primary, second: hedge}
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        # A running sync call can't be interrupted; close its stream once it returns
+                        loser.cancel()
+                        loser.add_done_callback(_close_stream)
+                    if hedged and futures[future] is hedge:
+                        self._count("hedge_wins")
+                    return future.result(), futures[future]
+                error = future.exception()
+                if not is_retryable(error):
+                    for loser in pending:
+                        loser.cancel()
+                        loser.add_done_callback(_close_stream)
+                    raise error
+        raise error
+
+    def create(self, **params):
+        return self.create_routed(**params)[0]
+
+    def create_routed(self, **params):
+        """create, also returning the _Target (provider name, model) that answered."""
+        self._count("requests")
+        tried, error = [], None
+        for attempt in range(self.attempts):
+            if attempt:
+                self._count("retries")
+                time.sleep(_backoff(attempt, error))
+            targets = self.targets(exclude=tried, stream=params.get("stream", False))
+            hedge = targets[1] if self.hedging and len(targets) > 1 else None
+            try:
+                response, winner = self._hedged(targets[0], hedge, params)
+            except Exception as e:
+                if not is_retryable(e):
+                    self._count("failures")
+                    raise
+                error = e
+                tried.extend(t.name for t in (targets[0], hedge) if t is not None)
+                continue
+            if winner.name != config.get_mode():
+                self._count("failovers")
+            return response, winner
+        self._count("failures")
+        raise error
+
+    # Async
+
+    async def _acall(self, target, params):
+        start = time.perf_counter()
+        try:
+            response = await _without_retries(target.async_client).chat.completions.create(model=target.model, **params)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                target.health.record_failure()
+            raise
+        target.health.record_success(time.perf_counter() - start, params.get("stream", False))
+        return response
+
+    async def _ahedged(self, primary, hedge, params):
+        first = asyncio.create_task(self._acall(primary, params))
+        if hedge is None:
+            return await first, primary
+        done, _ = await asyncio.wait([first], timeout=primary.health.hedge_delay(params.get("stream", False)))
+        if done and first.exception() is None:
+            return first.result(), primary
+        if done and not is_retryable(first.exception()):
+            raise first.exception()
+        hedged = not done
+        if hedged:
+            self._count("hedges")
+        second = asyncio.create_task(self._acall(hedge, params))
+        tasks = {first: primary, second: hedge}
+        pending, error = set(tasks), None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged and tasks[task] is hedge:
+                            self._count("hedge_wins")
+                        return task.result(), tasks[task]
+                    error = task.exception()
+                    if not is_retryable(error):
+                        raise error
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+
+    async def acreate(self, **params):
+        return (await self.acreate_routed(**params))[0]
+
+    async def acreate_routed(self, **params):
+        """acreate, also returning the _Target (provider name, model) that answered."""
+        self._count("requests")
+        tried, error = [], None
+        for attempt in range(self.attempts):
+            if attempt:
+                self._count("retries")
+                await asyncio.sleep(_backoff(attempt, error))
+            targets = self.targets(exclude=tried, stream=params.get("stream", False))
+            hedge = targets[1] if self.hedging and len(targets) > 1 else None
+            try:
+                response, winner = await self._ahedged(targets[0], hedge, params)
+            except Exception as e:
+                if not is_retryable(e):
+                    self._count("failures")
+                    raise
+                error = e
+                tried.extend(t.name for t in (targets[0], hedge) if t is not None)
+                continue
+            if winner.name != config.get_mode():
+                self._count("failovers")
+            return response, winner
+        self._count("failures")
+        raise error
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            health = dict(self._health)
+        counters["providers"] = {f"{provider}/{model}": h.snapshot() for (provider, model), h in health.items()}
+        return counters
+
+
+def is_retryable(error):
+    """
+    Whether a failed call may succeed on a retry or another provider: timeouts, connection
+    errors, 429 and 5xx. Errors in the request itself (400, 401, 403, 404, 422, ...) are not.
+    """
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def retry_after(error):
+    """Seconds from the Retry-After(-ms) header of a 429 response, or None."""
+    if not isinstance(error, openai.RateLimitError):
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt, error=None):
+    wait_seconds = retry_after(error)
+    if wait_seconds is not None:
+        return min(wait_seconds, RETRY_AFTER_MAX)
+    return RETRY_BACKOFF * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+def _close_stream(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close:
+        close()
+
+
+_router = None
+
+
+def get_provider_router():
+    """Return the shared ProviderRouter, creating it on first use."""
+    global _router
+    if _router is None:
+        _router = ProviderRouter()
+    return _router
@@ -0,0 +1,43 @@
+# Shared fixtures. Run the suite from the repository root:  python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# A few rows in the layout of cost_data/rsmeans/combined.csv: two concrete sections, one
+# steel section and a finishes section with a percent adder.
+RSMEANS_CSV = """Masterformat Section Code,Section Name,ID,Name,Crew,Daily Output,Labor-Hours,Unit,Material,Labor,Equipment,Total,Total Incl O&P
+03 30 53.40,0010 CAST-IN-PLACE CONCRETE,100,"Footing, 3000 psi",C-14C,50,2.24,C.Y.,160,112,1.5,273.5,345
+03 30 53.40,0010 CAST-IN-PLACE CONCRETE,200,"Footing, 4000 psi",C-14C,50,2.24,C.Y.,175,112,1.5,288.5,365
+03 30 53.40,0010 CAST-IN-PLACE CONCRETE,300,"Slab on grade, 4"" thick",C-8,3000,0.02,S.F.,2.1,0.9,0.3,3.3,4.1
+03 35 43.10,0010 POLISHED CONCRETE FLOORS,110,"Paint, epoxy, 1 coat",J-4,3.6,6.667,M.S.F.,22,340,64,426,590
+05 12 23.75,0010 STRUCTURAL STEEL MEMBERS,100,"Beam, W8x10",E-2,600,0.09,L.F.,21,5,2.6,28.6,34
+05 12 23.75,0010 STRUCTURAL STEEL MEMBERS,200,"Beam, W10x22",E-2,600,0.09,L.F.,44,5,2.6,51.6,60
+09 29 10.30,0010 GYPSUM BOARD,100,"Drywall, 1/2"" on walls",2 Carp,2000,0.008,S.F.,0.4,0.8,,1.2,1.7
+09 29 10.30,0010 GYPSUM BOARD,900,"For high ceilings, add",,,,,,10 %,,,
+"""
+
+
+@pytest.fixture
+def rsmeans_csv(tmp_path):
+    path = tmp_path / "combined.csv"
+    path.write_text(RSMEANS_CSV, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def rsmeans_df(rsmeans_csv):
+    from cost_data.rsmeans_store import read_typed_csv
+    return read_typed_csv(rsmeans_csv)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so caches written under cache/ stay out of the checkout."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
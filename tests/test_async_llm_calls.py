@@ -0,0 +1,29 @@
+# async_llm_calls with the provider calls replaced. Importing llm_calls loads
+# cost_data/rsmeans/combined.csv, so run from the repository root.
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("flashrank")
+async_llm_calls = pytest.importorskip("async_llm_calls")
+
+
+def test_local_classification_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def local_classify(classifier, message):
+        threads.append(threading.current_thread())
+        return ("Cost Benchmark", 0.9)
+    monkeypatch.setattr(async_llm_calls, "local_classify", local_classify)
+    assert asyncio.run(async_llm_calls.classify_question_type("cost of a slab")) == "Cost Benchmark"
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+def test_unconfident_classification_asks_the_llm(monkeypatch):
+    async def chat(system_prompt, user_input, stream=False, use_cache=True, **params):
+        return "ROI Analysis"
+    monkeypatch.setattr(async_llm_calls, "local_classify", lambda classifier, message: None)
+    monkeypatch.setattr(async_llm_calls, "_chat", chat)
+    assert asyncio.run(async_llm_calls.classify_question_type("irr of a hotel")) == "ROI Analysis"
@@ -0,0 +1,44 @@
+import math
+
+import numpy as np
+
+from utils.bm25 import BM25Index, tokenize
+
+DOCS = ["concrete slab on grade", "concrete footing concrete", "steel beam", "gypsum board partition"]
+
+
+def reference_bm25(docs, query, k1=1.5, b=0.75):
+    docs = [tokenize(d) for d in docs]
+    avg_len = sum(len(d) for d in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in tokenize(query):
+            df = sum(term in d for d in docs)
+            if not df:
+                continue
+            tf = doc.count(term)
+            idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * len(doc) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("What is the cost of Polished Floors per 3.5 in?") == ["polished", "floor", "3.5"]
+    assert tokenize("glass") == ["glass"]
+
+
+def test_scores_match_the_bm25_formula():
+    index = BM25Index(DOCS)
+    for query in ["concrete footing", "steel", "concrete concrete beam", "roof"]:
+        assert np.allclose(index.score(query), reference_bm25(DOCS, query))
+
+
+def test_top_k_returns_positive_scores_best_first():
+    index = BM25Index(DOCS)
+    top, scores = index.top_k("concrete footing", 3)
+    assert top.tolist() == [1, 0]
+    assert scores[0] > scores[1] > 0
+    assert len(index.top_k("roof", 3)[0]) == 0
+    assert len(BM25Index([]).top_k("concrete", 3)[0]) == 0
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from utils import cache_utils
+from utils.cache_utils import LRUCache, SQLiteCache, TieredCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable replacement for time.time as seen by cache_utils."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_utils.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_is_stable_and_order_independent():
+    assert make_key({"a": 1, "b": 2}, "x") == make_key({"b": 2, "a": 1}, "x")
+    assert make_key("x", 1) != make_key("x", "1")
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_ttl(clock):
+    cache = LRUCache(ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=100)
+    clock[0] += 11
+    assert cache.get("a", "gone") == "gone"
+    assert cache.get("b") == 2
+
+
+def test_sqlite_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteCache("ns", path=path).set("k", {"rows": [1, 2]})
+    assert SQLiteCache("ns", path=path).get("k") == {"rows": [1, 2]}
+    assert SQLiteCache("other", path=path).get("k") is None
+
+
+def test_sqlite_ttl_and_pruning(tmp_path, clock):
+    cache = SQLiteCache("ns", path=str(tmp_path / "cache.sqlite"), ttl=10, max_entries=3)
+    cache.set("old", 1)
+    clock[0] += 11
+    assert cache.get("old") is None
+    for i in range(5):
+        clock[0] += 1
+        cache.set(f"k{i}", i, ttl=1000)
+    assert len(cache) == 3
+    assert cache.get("k0") is None and cache.get("k4") == 4
+
+
+def test_tiered_promotes_disk_hits_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TieredCache("ns", path=path).set("k", "v")
+    cache = TieredCache("ns", path=path)
+    assert len(cache.memory) == 0
+    assert cache.get("k") == "v"
+    assert cache.memory.get("k") == "v"
+    assert cache.get("missing", "default") == "default"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_only_tiered_cache():
+    cache = TieredCache("ns", persistent=False)
+    cache.set("k", [1])
+    assert cache.disk is None
+    assert cache.get("k") == [1]
+
+
+def test_unopenable_database_falls_back_to_memory_with_a_warning(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        cache = TieredCache("ns", path=str(tmp_path))  # a directory, not a database file
+    assert cache.disk is None
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+    assert [r.msg["event"] for r in caplog.records] == ["cache_memory_only"]
+
+
+def test_failed_disk_writes_are_logged(tmp_path, caplog):
+    cache = TieredCache("ns", path=str(tmp_path / "cache.sqlite"))
+    cache.disk._conn.close()
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        cache.set("k", 1)
+    assert cache.get("k") == 1
+    assert [r.msg["event"] for r in caplog.records] == ["cache_disk_write_failed"]
+
+
+def test_async_access_runs_the_disk_tier_off_the_event_loop(tmp_path):
+    cache = TieredCache("ns", path=str(tmp_path / "cache.sqlite"))
+    threads = []
+    disk_get, disk_set = cache.disk.get, cache.disk.set
+
+    def get(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return disk_get(*args, **kwargs)
+
+    def set(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return disk_set(*args, **kwargs)
+    cache.disk.get, cache.disk.set = get, set
+
+    async def roundtrip():
+        await cache.aset("k", "v")
+        cache.memory.clear()
+        return await cache.aget("k"), await cache.aget("missing", "default")
+    assert asyncio.run(roundtrip()) == ("v", "default")
+    assert len(threads) == 3 and threading.main_thread() not in threads
+    assert cache.memory.get("k") == "v"
@@ -0,0 +1,67 @@
+import asyncio
+import importlib.util
+import logging
+
+import pytest
+
+import server.config as config
+from server.client_registry import ClientRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = ClientRegistry({"local": ("http://localhost:1234/v1", "lm-studio")})
+    yield registry
+    registry.close()
+
+
+def test_clients_are_built_on_first_use_and_reused(registry):
+    provider = registry.provider("local")
+    assert provider.stats()["created"] == {"sync": False, "async": False}
+    client = registry.client("local")
+    assert registry.client("local") is client
+    assert provider.stats()["created"] == {"sync": True, "async": False}
+    assert str(client.base_url).startswith("http://localhost:1234/v1")
+
+
+def test_unknown_provider():
+    with pytest.raises(ValueError, match="Unknown provider"):
+        ClientRegistry({}).client("anthropic")
+
+
+def test_importing_config_builds_no_clients():
+    spec = importlib.util.spec_from_file_location("fresh_config", config.__file__)
+    fresh_config = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fresh_config)
+    created = [p.stats()["created"] for p in fresh_config.registry._providers.values()]
+    assert not any(kind for c in created for kind in c.values())
+    assert fresh_config.local_client is fresh_config.registry.client("local")
+
+
+def test_close_closes_the_async_pool_outside_an_event_loop(registry):
+    provider = registry.provider("local")
+    registry.async_client("local")
+    async_http = provider._async_http
+    registry.close()
+    assert async_http.is_closed
+    assert provider.stats()["created"] == {"sync": False, "async": False}
+
+
+def test_aclose_from_the_event_loop(registry):
+    registry.client("local")
+    registry.async_client("local")
+    provider = registry.provider("local")
+    http, async_http = provider._http, provider._async_http
+    asyncio.run(registry.aclose())
+    assert http.is_closed and async_http.is_closed
+
+
+def test_async_pool_that_cannot_be_closed_is_logged(registry, caplog, capsys):
+    class Pool:
+        async def aclose(self):
+            raise RuntimeError("Event loop is closed")
+    registry.provider("local")._async_http = Pool()
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        registry.close()
+    assert [r.msg["event"] for r in caplog.records] == ["async_pool_close_failed"]
+    assert capsys.readouterr().out == ""
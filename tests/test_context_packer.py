@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+from utils import context_packer
+from utils.context_packer import context_budget, count_tokens, pack_context
+
+LOCAL_MODEL = "lmstudio-community/Meta-Llama-3-8B-Instruct-GGUF"
+
+
+@pytest.fixture
+def char_counts(monkeypatch):
+    """Count ~4 characters per token, as without the tokenizer."""
+    monkeypatch.setattr(context_packer, "_tokenizer", False)
+
+
+def chunk(words, score, source=None):
+    return {"text": " ".join(["word"] * words), "score": score, "source": source}
+
+
+def test_context_budget(monkeypatch):
+    assert context_budget("gpt-4o") == 2000
+    assert context_budget("some-new-model") == context_packer.DEFAULT_CONTEXT_TOKENS
+    monkeypatch.setitem(context_packer.CONTEXT_TOKEN_BUDGETS, LOCAL_MODEL, 100_000)
+    window = context_packer.CONTEXT_WINDOWS[LOCAL_MODEL]
+    assert context_budget(LOCAL_MODEL) == window - context_packer.ANSWER_TOKENS - context_packer.PROMPT_TOKENS
+
+
+def test_char_estimate(char_counts):
+    assert count_tokens(["", "abcd", "abcde"]) == [1, 1, 2]
+
+
+def test_top_chunk_first_then_best_score_per_token(char_counts):
+    chunks = [chunk(40, 0.5, "a.pdf"), chunk(200, 0.9), chunk(20, 0.4), chunk(20, 0.3)]
+    packed = pack_context(chunks, budget=110)
+    assert packed["selected"] == [0, 2, 3]
+    assert packed["dropped"] == 1 and not packed["truncated"]
+    assert packed["tokens"] <= 110
+    assert packed["context"].split("\n\n")[0].endswith("[Source: a.pdf]")
+
+
+def test_oversized_top_chunk_is_cut_on_a_sentence(char_counts):
+    text = " ".join(f"Sentence number {i} is here." for i in range(100))
+    packed = pack_context([{"text": text, "score": 1.0, "source": "b.pdf"}], budget=60)
+    assert packed["truncated"] and packed["selected"] == [0]
+    assert packed["tokens"] <= 60
+    assert packed["context"].startswith("Sentence number 0 is here.")
+    assert packed["context"].split("\n")[0].endswith(".")
+
+
+def test_empty():
+    assert pack_context([], budget=10)["context"] == ""
+
+
+def test_missing_tokenizer_is_logged_once(monkeypatch, caplog):
+    monkeypatch.setattr(context_packer, "_tokenizer", None)
+    monkeypatch.setattr(context_packer, "TOKENIZER_PATH", "/nonexistent/tokenizer.json")
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        assert count_tokens(["abcdefgh"]) == [2]
+        assert count_tokens(["abcdefgh"]) == [2]
+    assert [r.msg["event"] for r in caplog.records] == ["context_packer_no_tokenizer"]
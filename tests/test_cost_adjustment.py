@@ -0,0 +1,114 @@
+import json
+import logging
+
+import pytest
+
+from cost_data import cost_adjustment
+from cost_data.cost_adjustment import detect_adjustment, detect_year, get_cost_adjustment
+
+CITY_CSV = """zip_prefix,city,state,division,material,installation,total
+021,Boston,MA,ALL,104.0,130.0,115.0
+021,Boston,MA,03,110.0,140.0,120.0
+100,New York,NY,ALL,106.0,170.0,132.0
+"""
+ESCALATION_CSV = """year,index
+2022,95.0
+2023,100.0
+2024,104.0
+2025,108.0
+"""
+
+
+def _reset_caches():
+    cost_adjustment.load_cost_index.cache_clear()
+    cost_adjustment._cached_adjustment.cache_clear()
+
+
+@pytest.fixture
+def no_cost_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(cost_adjustment, "COST_INDEX_DIR", str(tmp_path / "location_index"))
+    _reset_caches()
+    yield
+    _reset_caches()
+
+
+@pytest.fixture
+def cost_index(tmp_path, monkeypatch):
+    directory = tmp_path / "location_index" / "v1"
+    directory.mkdir(parents=True)
+    (directory / "city.csv").write_text(CITY_CSV, encoding="utf-8")
+    (directory / "escalation.csv").write_text(ESCALATION_CSV, encoding="utf-8")
+    (directory / "manifest.json").write_text(json.dumps({
+        "version": "v1", "rsmeans_base_year": 2023, "city_cost_index": "city.csv", "escalation": "escalation.csv",
+    }), encoding="utf-8")
+    monkeypatch.setattr(cost_adjustment, "COST_INDEX_DIR", str(tmp_path / "location_index"))
+    _reset_caches()
+    yield
+    _reset_caches()
+
+
+@pytest.mark.parametrize("text, year", [
+    ("Cost of a slab in 2025?", 2025),
+    ("What will framing cost by 2027", 2027),
+    ("Give me 2024 dollars for drywall", 2024),
+    ("from 2023 to 2025 prices", 2025),
+    ("a 2000 sf slab", None),
+    ("2050 LF of curb in Boston", None),
+    ("price for 2000 sq ft", None),
+    ("concrete footing cost", None),
+])
+def test_detect_year_needs_year_context(text, year):
+    assert detect_year(text) == year
+
+
+def test_without_an_index_adjustments_are_the_identity(no_cost_index, rsmeans_df):
+    adjustment = detect_adjustment("concrete in Boston in 2025")
+    assert adjustment.is_identity
+    assert adjustment.apply(rsmeans_df) is rsmeans_df
+    assert get_cost_adjustment().is_identity
+    with pytest.raises(ValueError):
+        get_cost_adjustment("Boston")
+    with pytest.raises(ValueError):
+        get_cost_adjustment(year=2025)
+
+
+def test_location_and_escalation_factors(cost_index, rsmeans_df):
+    adjustment = get_cost_adjustment("02134", 2025)
+    assert adjustment.location_name == "Boston, MA"
+    assert adjustment.escalation == pytest.approx(1.08)
+    adjusted = adjustment.apply(rsmeans_df)
+    # Division 03 has its own row, division 05 uses the location's weighted average
+    assert adjusted['Material'].iloc[0] == pytest.approx(160 * 1.10 * 1.08)
+    assert adjusted['Labor'].iloc[0] == pytest.approx(112 * 1.40 * 1.08)
+    assert adjusted['Total Incl O&P'].iloc[4] == pytest.approx(34 * 1.15 * 1.08)
+    assert rsmeans_df['Material'].iloc[0] == 160
+    assert "Boston, MA" in adjustment.describe()
+
+
+def test_locations_resolve_from_zip_city_prefix_and_alias(cost_index):
+    tables = cost_adjustment.load_cost_index()
+    assert [tables.find_location(x) for x in ["021", "02134", "bost", "New York, NY", "nyc", "999", "paris"]] == \
+        ["021", "021", "021", "100", "100", None, None]
+    assert tables.detect_location("slab cost near 10001") == "100"
+    with pytest.raises(ValueError):
+        get_cost_adjustment("Paris")
+
+
+def test_years_after_the_table_are_extrapolated(cost_index):
+    tables = cost_adjustment.load_cost_index()
+    assert tables.escalation_factor(2023) == 1.0
+    assert tables.escalation_factor(2027) > tables.escalation_factor(2025)
+
+
+def test_years_before_the_table_are_not_clamped(cost_index, caplog):
+    with pytest.raises(ValueError):
+        get_cost_adjustment("Boston", 2015)
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        adjustment = detect_adjustment("concrete in Boston in 2015")
+    assert adjustment.year is None and adjustment.zip_prefix == "021"
+    assert any("cost_index_year_missing" in str(r.msg) for r in caplog.records)
+
+
+def test_quantities_are_not_escalated(cost_index):
+    adjustment = detect_adjustment("2050 LF of curb in Boston")
+    assert adjustment.year is None and adjustment.escalation == 1.0
@@ -0,0 +1,54 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+
+from cost_data.cost_cube import CostCube, build_cube_records, detect_families, load_cost_cube, tag_material_families
+
+
+def test_detect_families_prefers_longer_phrases():
+    assert detect_families("Precast concrete vs steel frame vs CLT?") == ["precast concrete", "steel", "timber"]
+    assert detect_families("concrete or concrete block") == ["concrete", "masonry"]
+    assert detect_families("what is a good roof") == []
+
+
+def test_tag_material_families(rsmeans_df):
+    families = tag_material_families(rsmeans_df)
+    assert families.tolist()[:6] == ["concrete"] * 4 + ["steel"] * 2
+    assert families.iloc[6:].isna().all()
+
+
+def test_cube_quantiles_per_family_and_unit(rsmeans_df):
+    cube = CostCube(build_cube_records(rsmeans_df))
+    entry = cube.get('family', 'concrete', 'C.Y.')
+    assert entry['n'] == 2 and entry['division'] == "03"
+    assert entry['metrics']['unit_cost']['median'] == pytest.approx(np.median([345, 365]))
+    assert cube.units('section', '03 30 53.40') == ['cy', 'sf']
+    assert cube.get('division', '05', 'lf')['metrics']['unit_cost']['p90'] == pytest.approx(np.quantile([34, 60], 0.9))
+
+
+def test_compare_lists_missing_families(rsmeans_df):
+    table, missing = CostCube(build_cube_records(rsmeans_df)).compare(["steel", "timber"])
+    assert table['family'].tolist() == ["steel"]
+    assert table['cost median'].tolist() == [47.0]
+    assert missing == ["timber"]
+
+
+def test_cube_is_cached_on_disk(rsmeans_df, tmp_path):
+    cache_dir = str(tmp_path / "cube")
+    built = load_cost_cube(rsmeans_df, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    loaded = load_cost_cube(rsmeans_df, cache_dir=cache_dir)
+    assert loaded.key == built.key
+    assert loaded.get('family', 'steel', 'lf') == built.get('family', 'steel', 'lf')
+
+
+def test_unwritable_cache_is_logged_and_the_cube_still_built(rsmeans_df, tmp_path, caplog, capsys):
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        cube = load_cost_cube(rsmeans_df, cache_dir=str(not_a_dir))
+    assert cube.get('family', 'steel', 'lf') is not None
+    assert [r.msg["event"] for r in caplog.records] == ["cost_cube_cache_write_failed"]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from utils.hybrid_reranker import KEYWORD_WEIGHTS, HybridReranker
+
+QUESTION = "design of a concrete building structure"
+DOCUMENTS = [
+    "The building structure uses concrete.",
+    "Unrelated text about parking.",
+    "Design design design of the facade and the building.",
+]
+EMBEDDINGS = np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]])
+
+
+def reference_keyword(question, document):
+    """The per-document loop the reranker replaced."""
+    words = set(document.lower().split())
+    return sum(KEYWORD_WEIGHTS.get(w, 1.0) for w in question.lower().split() if w in words)
+
+
+def test_signals_match_the_per_document_definitions():
+    signals = HybridReranker().signals(QUESTION, [2.0, 0.0], DOCUMENTS, EMBEDDINGS)
+    assert signals["keyword"].tolist() == [reference_keyword(QUESTION, d) for d in DOCUMENTS]
+    np.testing.assert_allclose(signals["semantic"], [1.0, 0.0, 0.6], rtol=1e-6)
+    np.testing.assert_allclose(signals["position"], [1.0, 2 / 3, 1 / 3])
+    np.testing.assert_allclose(signals["density"], [len(set(d.lower().split())) / (len(d) + 1) for d in DOCUMENTS])
+
+
+def test_rerank_orders_by_score_within_the_length_budget():
+    reranker = HybridReranker()
+    assert reranker.rerank(QUESTION, [1.0, 0.0], DOCUMENTS, EMBEDDINGS) == [0, 2, 1]
+    # The second best doesn't fit, the shorter third one still does
+    assert reranker.rerank(QUESTION, [1.0, 0.0], DOCUMENTS, EMBEDDINGS, max_length=70) == [0, 1]
+    assert reranker.rerank(QUESTION, [1.0, 0.0], DOCUMENTS, EMBEDDINGS, top_k=1) == [0]
+    assert reranker.rerank(QUESTION, [1.0, 0.0], [], np.empty((0, 2))) == []
+
+
+def test_chunk_cache_is_bounded_and_there_is_no_shared_vocabulary():
+    reranker = HybridReranker(cache_size=2)
+    reranker.rerank(QUESTION, [1.0, 0.0], DOCUMENTS, EMBEDDINGS)
+    reranker.rerank("a question with brand new words", [1.0, 0.0], DOCUMENTS, EMBEDDINGS)
+    assert list(reranker._chunks) == DOCUMENTS[1:]
+    assert not hasattr(reranker, "_vocabulary")
+
+
+def test_enhanced_rerank_results_embeds_a_missing_question_embedding(monkeypatch):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("flashrank")
+    rag_utils = pytest.importorskip("utils.rag_utils")
+    embedded = []
+
+    def embed_query(embedding_fn, text):
+        embedded.append((embedding_fn, text))
+        return np.array([1.0, 0.0])
+    monkeypatch.setattr(rag_utils, "embed_query", embed_query)
+    results = {"documents": [DOCUMENTS], "embeddings": [EMBEDDINGS]}
+    ranked = rag_utils.enhanced_rerank_results(results, QUESTION, embedding_fn="collection-embedding-fn")
+    assert ranked == [DOCUMENTS[0], DOCUMENTS[2], DOCUMENTS[1]]
+    assert embedded == [("collection-embedding-fn", QUESTION)]
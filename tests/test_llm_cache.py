@@ -0,0 +1,101 @@
+import asyncio
+import types
+
+import pytest
+
+import server.config as config
+from utils import llm_cache
+from utils.cache_utils import TieredCache
+
+MESSAGES = [{"role": "system", "content": "Answer briefly."}, {"role": "user", "content": "Cost of a slab?"}]
+
+
+def completion(text):
+    message = types.SimpleNamespace(content=text)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+def chunk(text):
+    delta = types.SimpleNamespace(content=text)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+
+
+class FakeRouter:
+    """Answers from a list; answered_by is the (provider, model) reported as the winner."""
+
+    def __init__(self):
+        self.calls = []
+        self.answers = []
+        self.answered_by = None
+
+    def create_routed(self, messages, stream, **params):
+        self.calls.append(params)
+        name, model = self.answered_by or (config.get_mode(), config.completion_model)
+        text = self.answers.pop(0)
+        response = iter([chunk(text[:3]), chunk(text[3:])]) if stream else completion(text)
+        return response, types.SimpleNamespace(name=name, model=model)
+
+    async def acreate_routed(self, messages, stream, **params):
+        assert not stream
+        return self.create_routed(messages, stream, **params)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    router = FakeRouter()
+    monkeypatch.setattr(llm_cache, "get_provider_router", lambda: router)
+    monkeypatch.setattr(llm_cache, "_response_cache", TieredCache("llm_responses", persistent=False))
+    return router
+
+
+def test_key_depends_on_provider_model_prompt_and_params():
+    key = llm_cache.response_cache_key(MESSAGES, ("openai", "gpt-4o"), temperature=0.0)
+    assert key == llm_cache.response_cache_key(list(MESSAGES), ("openai", "gpt-4o"), temperature=0.0)
+    assert key != llm_cache.response_cache_key(MESSAGES, ("cloudflare", "gpt-4o"), temperature=0.0)
+    assert key != llm_cache.response_cache_key(MESSAGES, ("openai", "gpt-4o"), temperature=0.0, max_tokens=10)
+    other_system = [{"role": "system", "content": "Answer at length."}] + MESSAGES[1:]
+    assert key != llm_cache.response_cache_key(other_system, ("openai", "gpt-4o"), temperature=0.0)
+
+
+def test_deterministic_requests_are_answered_from_the_cache(router):
+    router.answers.append(" About $5/sf. ")
+    assert llm_cache.cached_chat_completion(MESSAGES) == "About $5/sf."
+    assert llm_cache.cached_chat_completion(MESSAGES) == "About $5/sf."
+    assert len(router.calls) == 1
+
+
+def test_sampled_requests_bypass_the_cache(router):
+    router.answers.extend(["one", "two"])
+    assert llm_cache.cached_chat_completion(MESSAGES, temperature=0.7) == "one"
+    assert llm_cache.cached_chat_completion(MESSAGES, temperature=0.7) == "two"
+
+
+def test_streams_are_cached_once_consumed_and_replayed(router):
+    router.answers.append("streamed answer")
+    stream = llm_cache.cached_chat_completion(MESSAGES, stream=True)
+    assert llm_cache.get_response_cache().get(llm_cache.response_cache_key(MESSAGES, temperature=0.0)) is None
+    assert "".join(stream) == "streamed answer"
+    assert "".join(llm_cache.cached_chat_completion(MESSAGES, stream=True)) == "streamed answer"
+    assert len(router.calls) == 1
+
+
+def test_failover_answers_are_not_replayed_as_the_primary(router):
+    router.answered_by = ("fallback-provider", "fallback-model")
+    router.answers.extend(["fallback answer", "primary answer"])
+    assert llm_cache.cached_chat_completion(MESSAGES) == "fallback answer"
+    stored = llm_cache.response_cache_key(MESSAGES, ("fallback-provider", "fallback-model"), temperature=0.0)
+    assert llm_cache.get_response_cache().get(stored)["text"] == "fallback answer"
+    router.answered_by = None
+    assert llm_cache.cached_chat_completion(MESSAGES) == "primary answer"
+    assert len(router.calls) == 2
+
+
+def test_async_requests_share_the_cache_with_sync_ones(router):
+    router.answers.append("async answer")
+    assert asyncio.run(llm_cache.async_cached_chat_completion(MESSAGES)) == "async answer"
+    assert llm_cache.cached_chat_completion(MESSAGES) == "async answer"
+
+    async def replayed():
+        return "".join([part async for part in await llm_cache.async_cached_chat_completion(MESSAGES, stream=True)])
+    assert asyncio.run(replayed()) == "async answer"
+    assert len(router.calls) == 1
@@ -0,0 +1,85 @@
+import json
+import logging
+
+import pytest
+
+from utils import local_router
+from utils.local_router import LocalRouter, harvest_log_examples, load_seed_examples, normalize_label
+
+
+@pytest.fixture
+def fresh_router(monkeypatch, tmp_path):
+    """No shared router yet, saved to and loaded from a temporary directory instead of cache/router/."""
+    monkeypatch.setattr(local_router, "_router", None)
+    monkeypatch.setattr(local_router, "_router_disabled", False)
+    path = str(tmp_path / "router" / "local_router.joblib")
+    monkeypatch.setattr(local_router, "router_path", lambda router_dir=None: path)
+    return path
+
+
+def test_normalize_label():
+    assert normalize_label("route", "3. Design-Cost Comparison.") == "Design-Cost Comparison"
+    assert normalize_label("route", "roi analysis") == "ROI Analysis"
+    assert normalize_label("relevance", "Refuse to answer.") == "Refuse to answer"
+    assert normalize_label("route", "no idea") is None
+
+
+def test_harvest_log_examples(tmp_path):
+    log = tmp_path / "app.log"
+    records = [
+        {"event": "classifier_output", "source": "llm", "classifier": "route",
+         "message": "IRR of a 10 unit project", "output": "ROI Analysis."},
+        {"event": "classifier_output", "source": "local", "classifier": "route",
+         "message": "ignored", "output": "Cost Benchmark"},
+        {"event": "user_message", "message": "tell me a joke"},
+        {"event": "router_output", "output": "Refuse to answer"},
+    ]
+    log.write_text("\n".join(json.dumps(r) for r in records) + "\nnot json\n", encoding="utf-8")
+    examples = harvest_log_examples([str(log)])
+    assert examples["route"] == [("IRR of a 10 unit project", "ROI Analysis")]
+    assert examples["relevance"] == [("tell me a joke", "Refuse to answer")]
+
+
+def test_router_trained_on_the_seeds_recognizes_them():
+    pytest.importorskip("sklearn")
+    seeds = load_seed_examples()
+    router = LocalRouter.train({"route": seeds["route"]})
+    text, label = seeds["route"][0]
+    assert router.predict("route", text)[0] == label
+
+
+def test_confidence_threshold_falls_back_to_the_llm(fresh_router, monkeypatch):
+    class Router:
+        def predict(self, classifier, message):
+            return ("ROI Analysis", 0.9) if "irr" in message else ("Cost Benchmark", 0.3)
+    monkeypatch.setattr(local_router, "_router", Router())
+    assert local_router.local_classify("route", "irr of a hotel") == ("ROI Analysis", 0.9)
+    assert local_router.local_classify("route", "slab") is None
+
+
+def test_missing_scikit_learn_disables_the_router_once(fresh_router, monkeypatch, caplog):
+    calls = []
+
+    def train(examples):
+        calls.append(1)
+        raise ImportError("No module named 'sklearn'")
+    monkeypatch.setattr(LocalRouter, "train", staticmethod(train))
+    monkeypatch.setattr(local_router, "training_examples", lambda log_paths=None: {})
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        assert local_router.get_local_router() is None
+        assert local_router.local_classify("route", "cost of a slab") is None
+    assert len(calls) == 1
+    assert [r.msg["event"] for r in caplog.records] == ["local_router_disabled"]
+
+
+def test_unsaved_router_is_still_used_and_the_failure_logged(fresh_router, monkeypatch, tmp_path, caplog):
+    pytest.importorskip("joblib")
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+    monkeypatch.setattr(local_router, "router_path", lambda router_dir=None: str(not_a_dir / "local_router.joblib"))
+    router = LocalRouter({}, trained_on={"route": 0})
+    monkeypatch.setattr(LocalRouter, "train", staticmethod(lambda examples: router))
+    monkeypatch.setattr(local_router, "training_examples", lambda log_paths=None: {})
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        assert local_router.get_local_router() is router
+    assert [r.msg["event"] for r in caplog.records] == ["local_router_save_failed"]
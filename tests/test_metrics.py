@@ -0,0 +1,75 @@
+import contextvars
+import threading
+import types
+
+import pytest
+
+import server.config as config
+from utils import metrics
+from utils.metrics import Counter, Histogram
+
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    """Empty module metrics, a fixed mode / model, and no request in the current context."""
+    monkeypatch.setattr(metrics, "stage_seconds", Histogram("llm_stage_seconds", "Stages.", buckets=(0.1, 1.0)))
+    monkeypatch.setattr(metrics, "tokens_total", Counter("llm_tokens_total", "Tokens."))
+    monkeypatch.setattr(metrics, "requests_total", Counter("llm_requests_total", "Requests."))
+    monkeypatch.setattr(config, "_mode", "openai")
+    monkeypatch.setattr(config, "completion_model", "gpt-4o")
+    token = metrics._current.set(None)
+    yield
+    metrics._current.reset(token)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("h", "Help.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, (("stage", "rerank"),))
+    assert histogram.render() == [
+        "# HELP h Help.",
+        "# TYPE h histogram",
+        'h_bucket{stage="rerank",le="0.1"} 1',
+        'h_bucket{stage="rerank",le="1.0"} 2',
+        'h_bucket{stage="rerank",le="+Inf"} 3',
+        'h_sum{stage="rerank"} 5.55',
+        'h_count{stage="rerank"} 3',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("c", "Help.")
+    counter.inc(2, (("model", 'a"b\\c\nd'),))
+    assert counter.render()[-1] == 'c{model="a\\"b\\\\c\\nd"} 2'
+
+
+def test_request_samples_are_recorded_once_under_the_route(fresh_metrics):
+    request = metrics.start_request()
+    metrics.observe("classify", 0.05)
+
+    def worker():
+        metrics.observe("rerank", 0.5)
+        metrics.record_usage(types.SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+    thread.start()
+    thread.join()
+    assert metrics.render().count("_count{") == 0
+
+    fields = request.finish("cost benchmark", cached=False)
+    assert fields == {"stages_ms": {"classify": 50.0, "rerank": 500.0}, "prompt_tokens": 100, "completion_tokens": 20}
+    assert request.finish("cost benchmark") == {}
+    text = metrics.render()
+    assert 'llm_stage_seconds_count{stage="rerank",route="cost benchmark",mode="openai",model="gpt-4o"} 1' in text
+    assert 'llm_tokens_total{type="prompt",route="cost benchmark",mode="openai",model="gpt-4o"} 100' in text
+    assert 'llm_requests_total{cached="false",route="cost benchmark",mode="openai",model="gpt-4o"} 1' in text
+
+
+def test_samples_outside_a_request_are_recorded_directly(fresh_metrics):
+    with metrics.timer("generate"):
+        pass
+    metrics.record_usage(types.SimpleNamespace(prompt_tokens=0, completion_tokens=7))
+    metrics.record_usage(None)
+    text = metrics.render()
+    assert 'llm_stage_seconds_count{stage="generate",route="none",mode="openai",model="gpt-4o"} 1' in text
+    assert 'llm_tokens_total{type="completion",route="none",mode="openai",model="gpt-4o"} 7' in text
+    assert 'type="prompt"' not in text
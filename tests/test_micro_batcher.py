@@ -0,0 +1,136 @@
+import logging
+import pathlib
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils import micro_batcher
+from utils.micro_batcher import MicroBatcher
+
+PASSAGES = [{"id": 1, "text": "concrete slab on grade"}, {"id": 2, "text": "structural steel beam"},
+            {"id": 3, "text": "precast concrete plank"}]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def gated():
+    """batch_fn that blocks its first call until `release` is set, so later items queue up."""
+    calls, entered, release = [], threading.Event(), threading.Event()
+
+    def batch_fn(items):
+        calls.append(list(items))
+        entered.set()
+        release.wait(timeout=5)
+        return [item * 10 for item in items]
+    return batch_fn, calls, entered, release
+
+
+def test_items_queued_during_a_batch_run_as_the_next_batch(gated):
+    batch_fn, calls, entered, release = gated
+    batcher = MicroBatcher(batch_fn, max_batch=8, max_wait=0.0)
+    first = batcher.submit(1)
+    entered.wait(timeout=5)
+    rest = [batcher.submit(i) for i in range(2, 6)]
+    release.set()
+    assert [f.result(timeout=5) for f in [first] + rest] == [10, 20, 30, 40, 50]
+    assert calls == [[1], [2, 3, 4, 5]]
+    assert batcher.snapshot()["max_items"] == 4
+
+
+def test_size_fn_bounds_the_batch(gated):
+    batch_fn, calls, entered, release = gated
+    batcher = MicroBatcher(batch_fn, max_batch=4, max_wait=0.0, size_fn=lambda item: item)
+    futures = [batcher.submit(1)]
+    entered.wait(timeout=5)
+    futures += [batcher.submit(i) for i in (3, 1, 2)]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert calls == [[1], [3, 1], [2]]
+
+
+def test_a_failed_batch_fails_every_caller_in_it(gated):
+    batch_fn, calls, entered, release = gated
+
+    def failing(items):
+        results = batch_fn(items)
+        if 4 not in items:
+            raise ValueError("embeddings endpoint down")
+        return results
+    batcher = MicroBatcher(failing, max_batch=8, max_wait=0.0)
+    futures = [batcher.submit(1)]
+    entered.wait(timeout=5)
+    futures += [batcher.submit(2), batcher.submit(3)]
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError, match="endpoint down"):
+            future.result(timeout=5)
+    assert calls == [[1], [2, 3]]
+    assert batcher(4) == 40  # the worker is still running
+
+
+def test_idle_batchers_are_forgotten(monkeypatch):
+    monkeypatch.setattr(micro_batcher, "IDLE_TIMEOUT", 0.05)
+    monkeypatch.setattr(micro_batcher, "_batchers", {})
+
+    def embedding_fn(texts):
+        return [[float(len(text))] for text in texts]
+    assert micro_batcher.embed_query(embedding_fn, "slab") == [4.0]
+    assert len(micro_batcher.batch_stats()) == 1
+    wait_until(lambda: not micro_batcher._batchers)
+    assert micro_batcher.embed_query(embedding_fn, "footing") == [7.0]
+
+
+class FakeSession:
+    """ONNX session stand-in: one logit per pair from its unpadded token ids."""
+
+    def run(self, output_names, onnx_input):
+        ids, mask = onnx_input["input_ids"], onnx_input["attention_mask"]
+        return [((ids * mask).sum(axis=1, keepdims=True) % 97) / 10.0 - 5.0]
+
+
+@pytest.fixture
+def ranker():
+    """A FlashRank pairwise Ranker on the bundled L-12 tokenizer, with FakeSession for the model."""
+    flashrank = pytest.importorskip("flashrank")
+    ranker = object.__new__(flashrank.Ranker)
+    ranker.logger = logging.getLogger("flashrank-test")
+    ranker.llm_model = None
+    ranker.model_dir = pathlib.Path("models", "ms-marco-MiniLM-L-12-v2")
+    ranker.tokenizer = ranker._get_tokenizer()
+    ranker.session = FakeSession()
+    return ranker
+
+
+def test_batched_rerank_matches_ranker_rerank(ranker, monkeypatch):
+    from flashrank import RerankRequest
+    monkeypatch.setattr(micro_batcher, "_batchers", {})
+    questions = ["cost of a concrete slab", "steel beam", "a much longer question about precast concrete planks"]
+    expected = [ranker.rerank(RerankRequest(query=q, passages=[dict(p) for p in PASSAGES])) for q in questions]
+    # Every question's pairs scored in one session.run, padded to the longest pair of all three
+    batched = micro_batcher._rerank_batch(ranker)([(q, PASSAGES) for q in questions])
+    for got, want in zip(batched, expected):
+        assert [p["id"] for p in got] == [p["id"] for p in want]
+        np.testing.assert_allclose([p["score"] for p in got], [p["score"] for p in want], rtol=1e-6)
+    assert [p["id"] for p in micro_batcher.rerank(ranker, questions[0], PASSAGES)] == [p["id"] for p in expected[0]]
+    assert "score" not in PASSAGES[0]
+
+
+def test_ranker_without_flashrank_internals_raises(monkeypatch):
+    monkeypatch.setattr(micro_batcher, "_batchers", {})
+
+    class OtherRanker:
+        llm_model = None
+
+        def rerank(self, request):
+            return request.passages
+    with pytest.raises(RuntimeError, match="flashrank=="):
+        micro_batcher.rerank(OtherRanker(), "slab", PASSAGES)
@@ -0,0 +1,55 @@
+# populate_database with an in-process embedding function; documents are read by a fake
+# read_document, so no PDF or Markdown parsing is involved.
+import numpy as np
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+pytest.importorskip("PyPDF2")
+pytest.importorskip("markdown")
+pytest.importorskip("bs4")
+populate_database = pytest.importorskip("populate_database")
+
+
+class EmbeddingFunction(chromadb.EmbeddingFunction):
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        return [np.array([len(text), 1.0], dtype=np.float32) for text in input]
+
+    @staticmethod
+    def name():
+        return "test-embedding"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return EmbeddingFunction()
+
+
+@pytest.fixture
+def source_data(workdir, monkeypatch):
+    documents = workdir / "source_data"
+    documents.mkdir()
+    (documents / "slabs.md").write_text("", encoding="utf-8")
+    monkeypatch.setattr(populate_database, "get_embedding_function", EmbeddingFunction)
+    monkeypatch.setattr(populate_database, "read_document", lambda path: "Concrete slab on grade. " * 100)
+    return documents
+
+
+def collection():
+    client = chromadb.PersistentClient(path=populate_database.CHROMA_PATH,
+                                       settings=populate_database.Settings(anonymized_telemetry=False))
+    return client.get_collection("cost_estimating_docs", embedding_function=EmbeddingFunction())
+
+
+def test_version_changes_only_when_chunks_are_added(source_data):
+    populate_database.populate_database()
+    version = collection().metadata["version"]
+    populate_database.populate_database()
+    assert collection().metadata["version"] == version
+    (source_data / "beams.md").write_text("", encoding="utf-8")
+    populate_database.populate_database()
+    assert collection().metadata["version"] != version
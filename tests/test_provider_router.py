@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import threading
+import time
+import types
+
+import httpx
+import openai
+import pytest
+
+import server.config as config
+from server import provider_router
+from server.provider_router import BREAKER_FAILURES, ProviderHealth, ProviderRouter, is_retryable, retry_after
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "https://example.invalid/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    error_class = {400: openai.BadRequestError, 429: openai.RateLimitError}.get(status, openai.InternalServerError)
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class FakeProvider:
+    """Provider whose completions return "<name> answer" after `delay`, or raise the next queued error."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = []
+        self.delay = 0.0
+        completions = types.SimpleNamespace(create=self.create)
+        self.chat = types.SimpleNamespace(completions=completions)
+        async_completions = types.SimpleNamespace(create=self.acreate)
+        self.async_chat = types.SimpleNamespace(chat=types.SimpleNamespace(completions=async_completions))
+
+    def _answer(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"{self.name} answer"
+
+    def create(self, model, **params):
+        time.sleep(self.delay)
+        return self._answer()
+
+    async def acreate(self, model, **params):
+        await asyncio.sleep(self.delay)
+        return self._answer()
+
+    def client(self):
+        return self
+
+    def async_client(self):
+        return self.async_chat
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    providers = {name: FakeProvider(name) for name in ("cloudflare", "openai")}
+    monkeypatch.setattr(config, "_mode", "cloudflare")
+    monkeypatch.setattr(config, "registry", types.SimpleNamespace(provider=providers.__getitem__))
+    monkeypatch.setattr(provider_router, "RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(provider_router, "HEDGE_DEFAULT_DELAY", 0.05)
+    return providers
+
+
+def test_breaker_opens_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(provider_router.time, "monotonic", lambda: now[0])
+    health = ProviderHealth("openai", "gpt-4o")
+    for _ in range(BREAKER_FAILURES):
+        assert health.available()
+        health.record_failure()
+    assert health.state() == "open" and health.opened == 1
+    now[0] += provider_router.BREAKER_COOLDOWN
+    assert health.state() == "half-open"
+    health.record_failure()  # failed probe: open again for twice as long
+    assert health.state() == "open" and health.cooldown == 2 * provider_router.BREAKER_COOLDOWN
+    now[0] += health.cooldown
+    health.record_success(0.1)
+    assert health.state() == "closed" and health.cooldown == provider_router.BREAKER_COOLDOWN
+
+
+def test_only_transient_errors_are_retryable():
+    assert is_retryable(status_error(429)) and is_retryable(status_error(503))
+    assert not is_retryable(status_error(400))
+    assert is_retryable(TimeoutError()) and not is_retryable(ValueError())
+
+
+def test_retry_after():
+    assert retry_after(status_error(429, {"retry-after": "3"})) == 3.0
+    assert retry_after(status_error(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(status_error(503, {"retry-after": "3"})) is None
+
+
+def test_fallback_providers_setting(monkeypatch):
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(config, "CLOUDFLARE_API_KEY", None)
+    assert config._fallback_providers(None) == ["openai"]
+    assert config._fallback_providers("cloudflare, openai") == ["cloudflare", "openai"]
+    assert config._fallback_providers("none") == []
+
+
+def test_transient_failure_fails_over(providers):
+    providers["cloudflare"].errors.append(status_error(503))
+    router = ProviderRouter(fallbacks=["openai"], hedging=False)
+    response, winner = router.create_routed(messages=[])
+    assert (response, winner.name) == ("openai answer", "openai")
+    assert router.counters["retries"] == 1 and router.counters["failovers"] == 1
+
+
+def test_request_errors_are_raised_without_retrying(providers):
+    providers["cloudflare"].errors.append(status_error(400))
+    router = ProviderRouter(fallbacks=["openai"], hedging=False)
+    with pytest.raises(openai.BadRequestError):
+        router.create(messages=[])
+    assert providers["openai"].calls == 0
+    assert router.counters["failures"] == 1
+    assert router.health("cloudflare", config.completion_model).consecutive_failures == 0
+
+
+def test_slow_primary_is_hedged(providers):
+    providers["cloudflare"].delay = 0.5
+    router = ProviderRouter(fallbacks=["openai"])
+    assert router.create(messages=[]) == "openai answer"
+    assert router.counters["hedges"] == 1 and router.counters["hedge_wins"] == 1
+
+
+def test_async_slow_primary_is_hedged_and_cancelled(providers):
+    providers["cloudflare"].delay = 0.5
+    router = ProviderRouter(fallbacks=["openai"])
+    response, winner = asyncio.run(router.acreate_routed(messages=[]))
+    assert (response, winner.name) == ("openai answer", "openai")
+    assert providers["cloudflare"].calls == 0  # cancelled before it answered
+
+
+def test_unavailable_fallback_is_logged(providers, monkeypatch, caplog):
+    def completion_model_for(mode):
+        if mode == "openai":
+            raise ValueError("no API key")
+        return config.completion_model
+    monkeypatch.setattr(config, "completion_model_for", completion_model_for)
+    router = ProviderRouter(fallbacks=["openai"], hedging=False)
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        assert [t.name for t in router.targets()] == ["cloudflare"]
+    assert [r.msg["event"] for r in caplog.records] == ["fallback_provider_unavailable"]
+
+
+def test_router_without_fallbacks_warns(providers, caplog):
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        ProviderRouter(fallbacks=["cloudflare"])
+    assert [r.msg["event"] for r in caplog.records] == ["provider_router_no_fallback"]
+
+
+def test_stream_and_full_generation_latencies_are_kept_apart(monkeypatch):
+    monkeypatch.setattr(provider_router, "MIN_SAMPLES", 2)
+    health = ProviderHealth("openai", "gpt-4o")
+    for seconds in (0.3, 0.3):
+        health.record_success(seconds, stream=True)
+    for seconds in (20.0, 20.0):
+        health.record_success(seconds)
+    assert health.hedge_delay(stream=True) == pytest.approx(0.3)
+    assert health.hedge_delay() == provider_router.HEDGE_MAX_DELAY
+
+
+def test_without_a_hedge_the_call_runs_on_the_caller_thread(providers):
+    threads = []
+    create = providers["cloudflare"].create
+
+    def record_thread(model, **params):
+        threads.append(threading.current_thread())
+        return create(model, **params)
+    providers["cloudflare"].chat.completions.create = record_thread
+    assert ProviderRouter(fallbacks=[]).create(messages=[]) == "cloudflare answer"
+    assert threads == [threading.current_thread()]
@@ -0,0 +1,23 @@
+import logging
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("flashrank")
+rag_utils = pytest.importorskip("utils.rag_utils")
+
+
+def test_rag_context_packs_the_reranked_chunks_and_logs_it(monkeypatch, caplog, capsys):
+    documents = ["Slab on grade, 4 in.", "Steel beam W8x10."]
+    metadatas = [{"source": "slabs.pdf"}, {"source": "steel.pdf"}]
+    monkeypatch.setattr(rag_utils, "HYBRID_SEARCH", True)
+    monkeypatch.setattr(rag_utils, "RERANK_CASCADE", True)
+    monkeypatch.setattr(rag_utils, "hybrid_search", lambda question, collection, n_results: (documents, metadatas))
+    monkeypatch.setattr(rag_utils, "cascade_rerank", lambda question, passages, ranker, budget_tokens=None: [
+        {**passages[0], "score": 0.9}, {**passages[1], "score": 0.4}])
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        context = rag_utils.rag_context("cost of a slab", collection=None, ranker=None, max_context_tokens=500)
+    assert context == "Slab on grade, 4 in.\n[Source: slabs.pdf]\n\nSteel beam W8x10.\n[Source: steel.pdf]"
+    event = next(r.msg for r in caplog.records if isinstance(r.msg, dict) and r.msg["event"] == "context_packing")
+    assert event["budget"] == 500 and event["selected"] == [0, 1]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+pytest.importorskip("flashrank")
+
+from utils import context_packer, rerank_cascade  # noqa: E402
+from utils.rerank_cascade import cascade_rerank  # noqa: E402
+
+
+def passage(name, score, tokens=10):
+    # ~4 characters per token without the tokenizer (see char_counts)
+    return {"id": name, "text": name.ljust(4 * tokens, "."), "true_score": score}
+
+
+@pytest.fixture
+def scorer(monkeypatch):
+    """L-12 replaced by the passages' true_score; records the passages of every batch."""
+    batches = []
+
+    def rerank(ranker, question, passages):
+        batches.append([p["id"] for p in passages])
+        return [{**p, "score": p["true_score"]} for p in passages]
+    monkeypatch.setattr(rerank_cascade, "rerank", rerank)
+    monkeypatch.setattr(context_packer, "_tokenizer", False)
+    return batches
+
+
+def test_keeps_the_shortlist_best_first_and_drops_low_scores(scorer):
+    passages = [passage(f"p{i}", score) for i, score in enumerate([0.2, 0.9, 0.01, 0.6, 0.99])]
+    kept = cascade_rerank("q", passages, ranker=None, keep=4)
+    assert [p["id"] for p in kept] == ["p1", "p3", "p0"]
+    assert scorer == [["p0", "p1", "p2", "p3"]]
+
+
+def test_best_passage_is_kept_even_below_the_minimum(scorer):
+    kept = cascade_rerank("q", [passage("a", 0.01), passage("b", 0.02)], ranker=None)
+    assert [p["id"] for p in kept] == ["b"]
+
+
+def test_batches_stop_once_high_scoring_passages_fill_the_budget(scorer, caplog):
+    passages = [passage(f"p{i}", 0.9) for i in range(6)]
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        kept = cascade_rerank("q", passages, ranker=None, budget_tokens=20, keep=6)
+    assert scorer == [["p0", "p1"]]
+    assert len(kept) == 2
+    event = next(r.msg for r in caplog.records if isinstance(r.msg, dict) and r.msg["event"] == "rerank_cascade")
+    assert event["early_exit"] and event["batches"] == 1
+
+
+def test_low_scores_keep_the_batches_going(scorer):
+    passages = [passage(f"p{i}", 0.1) for i in range(4)]
+    cascade_rerank("q", passages, ranker=None, budget_tokens=20, keep=4)
+    assert scorer == [["p0", "p1"], ["p2", "p3"]]
+
+
+def test_unavailable_first_stage_falls_back_to_retrieval_order(scorer, monkeypatch, caplog):
+    def no_model():
+        raise RuntimeError("model download failed")
+    monkeypatch.setattr(rerank_cascade, "get_first_stage_ranker", no_model)
+    passages = [passage(f"p{i}", 0.9) for i in range(3)]
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        cascade_rerank("q", passages, ranker=None, first_stage="tinybert", keep=2)
+    assert scorer == [["p0", "p1"]]
+    assert [r.msg["event"] for r in caplog.records] == ["first_stage_reranker_unavailable"]
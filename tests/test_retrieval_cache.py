@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from utils import retrieval_cache
+from utils.cache_utils import TieredCache
+from utils.retrieval_cache import embed_query, embedding_model_id, normalize_query, query_collection
+
+CHUNKS = {"a": "concrete slab", "b": "steel beam", "c": "gypsum board"}
+
+
+class EmbeddingFunction:
+    """Chroma OpenAIEmbeddingFunction stand-in that counts the texts it embeds."""
+
+    _model_name = "nomic-embed-text"
+    _api_base = "http://localhost:1234/v1/"
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [np.array([len(text), 1.0], dtype=np.float32) for text in texts]
+
+
+class FakeCollection:
+    """Chroma collection whose search returns the chunks in insertion order."""
+
+    def __init__(self, chunks):
+        self.name = "docs"
+        self.metadata = {"version": "v1"}
+        self.chunks = dict(chunks)
+        self.queries = 0
+
+    def count(self):
+        return len(self.chunks)
+
+    def query(self, query_texts, n_results, include):
+        self.queries += 1
+        ids = list(self.chunks)[:n_results]
+        results = {"ids": [ids], "distances": [[0.1 * i for i in range(len(ids))]]}
+        if "documents" in include:
+            results["documents"] = [[self.chunks[i] for i in ids]]
+        return results
+
+    def get(self, ids, include):
+        found = [i for i in reversed(ids) if i in self.chunks]  # Chroma doesn't keep the order
+        return {"ids": found, "documents": [self.chunks[i] for i in found]}
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    monkeypatch.setattr(retrieval_cache, "_embedding_cache", TieredCache("query_embeddings", persistent=False))
+    monkeypatch.setattr(retrieval_cache, "_search_cache", TieredCache("search_results", persistent=False))
+
+
+def test_normalize_query():
+    assert normalize_query("  cost of a\n slab ") == "cost of a slab"
+
+
+def test_embedding_model_id():
+    assert embedding_model_id(EmbeddingFunction()) == ("http://localhost:1234/v1", "nomic-embed-text", None)
+    assert embedding_model_id(lambda texts: texts) is None
+
+
+def test_query_embeddings_are_cached_per_normalized_text():
+    embedding_fn = EmbeddingFunction()
+    first = embed_query(embedding_fn, "cost of a slab")
+    assert np.array_equal(embed_query(embedding_fn, " cost of a\nslab"), first)
+    embed_query(embedding_fn, "cost of a beam")
+    assert embedding_fn.texts == ["cost of a slab", "cost of a beam"]
+
+
+def test_repeated_searches_read_the_chunks_back_by_id():
+    collection = FakeCollection(CHUNKS)
+    first = query_collection(collection, "slab", 2, ["documents"])
+    again = query_collection(collection, " slab ", 2, ["documents", "distances"])
+    assert collection.queries == 1
+    assert first == {"ids": [["a", "b"]], "documents": [["concrete slab", "steel beam"]]}
+    assert again == {**first, "distances": [[0.0, 0.1]]}
+
+
+def test_a_new_collection_version_searches_again():
+    collection = FakeCollection(CHUNKS)
+    query_collection(collection, "slab", 2, ["documents"])
+    collection.metadata = {"version": "v2"}
+    query_collection(collection, "slab", 2, ["documents"])
+    collection.chunks["d"] = "brick veneer"  # written without a version bump: the count changes
+    query_collection(collection, "slab", 2, ["documents"])
+    assert collection.queries == 3
+
+
+def test_deleted_chunks_search_again():
+    collection = FakeCollection(CHUNKS)
+    query_collection(collection, "slab", 2, ["documents"])
+    del collection.chunks["a"]
+    collection.chunks["z"] = "replacement"  # same count, same version
+    results = query_collection(collection, "slab", 2, ["documents"])
+    assert results["ids"] == [["b", "c"]] and collection.queries == 2
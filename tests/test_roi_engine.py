@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from utils.roi_engine import apply_changes, base_case, evaluate_roi, monte_carlo, sensitivity_grid, tornado
+
+
+def reference_cash_flows(case):
+    """Equity and yearly levered cash flows of one scenario, computed the long way."""
+    cost = case['construction_cost']
+    debt = cost * case['loan_to_cost']
+    r, n, hold = case['interest_rate'], case['amortization_years'], int(case['hold_years'])
+    payment = debt * r / (1 - (1 + r) ** -n)
+    balance = debt
+    for _ in range(hold):
+        balance = balance * (1 + r) - payment
+    noi = case['annual_rent'] * case['occupancy'] * (1 - case['opex_ratio'])
+    flows = [noi * (1 + case['rent_growth']) ** t - payment for t in range(hold)]
+    exit_value = noi * (1 + case['rent_growth']) ** hold / case['cap_rate']
+    flows[-1] += exit_value * (1 - case['sale_cost']) - balance
+    return cost - debt, flows
+
+
+def test_base_case_accepts_percentages_and_derives_rent():
+    case = base_case(construction_cost="$10,000,000", interest_rate="6.5%", cap_rate=5, occupancy=None)
+    assert case['construction_cost'] == 10_000_000
+    assert case['interest_rate'] == pytest.approx(0.065)
+    assert case['cap_rate'] == pytest.approx(0.05)
+    assert case['occupancy'] == 0.93
+    assert case['annual_rent'] == pytest.approx(1_200_000)
+
+
+def test_evaluate_roi_matches_the_reference_cash_flows():
+    case = base_case()
+    result = evaluate_roi(case)
+    equity, flows = reference_cash_flows(case)
+    assert float(result['equity']) == pytest.approx(equity)
+    assert float(result['profit']) == pytest.approx(sum(flows) - equity)
+    irr = float(result['irr'])
+    assert sum(f / (1 + irr) ** (t + 1) for t, f in enumerate(flows)) == pytest.approx(equity, rel=1e-6)
+
+
+def test_vectorized_scenarios_match_scalar_runs():
+    case = base_case()
+    costs = np.array([15e6, 20e6, 25e6])
+    holds = np.array([5, 10, 7])
+    stacked = evaluate_roi(dict(case, construction_cost=costs, hold_years=holds))
+    for i in range(3):
+        single = evaluate_roi(dict(case, construction_cost=costs[i], hold_years=holds[i]))
+        for metric in ('irr', 'roi', 'dscr', 'profit'):
+            assert stacked[metric][i] == pytest.approx(float(single[metric]))
+
+
+def test_tornado_is_sorted_by_swing():
+    table = tornado(base_case())
+    assert table['swing'].is_monotonic_decreasing
+    cap = table.set_index('input').loc['cap_rate']
+    assert cap['irr at low'] > table.attrs['base'] > cap['irr at high']
+
+
+def test_sensitivity_grid_shape():
+    grid = sensitivity_grid(base_case(), 'cap_rate', [0.05, 0.06], 'interest_rate', [0.05, 0.06, 0.07])
+    assert grid.shape == (3, 2)
+    assert grid.iloc[0, 0] > grid.iloc[0, 1] and grid.iloc[0, 0] > grid.iloc[2, 0]
+
+
+def test_monte_carlo_is_reproducible():
+    case = base_case()
+    first = monte_carlo(case, n=2000, seed=1)
+    second = monte_carlo(case, n=2000, seed=1)
+    assert first['summary'].equals(second['summary'])
+    assert 0.0 <= first['risk']['p_irr_negative'] <= 1.0
+    assert first['summary'].loc['irr', 'p5'] < first['summary'].loc['irr', 'p95']
+
+
+def test_apply_changes():
+    case = base_case()
+    scenario = apply_changes(case, {"construction_cost": 0.10, "interest_rate": 1, "occupancy": 2.0, "hold_years": 2})
+    assert scenario['construction_cost'] == pytest.approx(case['construction_cost'] * 1.1)
+    assert scenario['interest_rate'] == pytest.approx(case['interest_rate'] + 0.01)
+    assert scenario['occupancy'] == pytest.approx(0.95)
+    assert scenario['hold_years'] == case['hold_years'] + 2
+    assert case['construction_cost'] == 20_000_000
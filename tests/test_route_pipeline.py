@@ -0,0 +1,111 @@
+# route_query_to_function with the provider calls replaced: classification, embedding and
+# route answers are fakes, so these tests check the control flow only. Importing llm_calls
+# loads cost_data/rsmeans/combined.csv, so run from the repository root.
+import logging
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("flashrank")
+llm_calls = pytest.importorskip("llm_calls")
+
+from utils.semantic_cache import SemanticCache  # noqa: E402
+
+QUESTION = "What does a 4000 psi footing cost?"
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Fake stages; `events` records what ran, `classify_started` is set when classification begins."""
+    events = []
+    classify_started = threading.Event()
+
+    def classify_question_type(message):
+        classify_started.set()
+        events.append("classify")
+        return "Cost Benchmark"
+
+    def embed_question(message):
+        # Waits for classification to start: only returns True if both run at the same time
+        events.append(("embed_overlapped", classify_started.wait(timeout=5)))
+        return np.array([1.0, 0.0], dtype=np.float32)
+
+    def answer_route(classification, message, collection=None, ranker=None, use_rag=False, stream=False,
+                     prefetched=None):
+        events.append(("answer", classification, sorted(prefetched or {})))
+        return "About $365 per CY."
+
+    def cost_benchmark_request(message, use_llm=True):
+        events.append(("rsmeans", use_llm))
+        return "header", "sys", "user"
+
+    cache = SemanticCache()
+    monkeypatch.setattr(llm_calls, "classify_question_type", classify_question_type)
+    monkeypatch.setattr(llm_calls, "embed_question", embed_question)
+    monkeypatch.setattr(llm_calls, "_answer_route", answer_route)
+    monkeypatch.setattr(llm_calls, "_cost_benchmark_request", cost_benchmark_request)
+    monkeypatch.setattr(llm_calls, "get_semantic_cache", lambda: cache)
+    return events
+
+
+def test_question_is_embedded_while_it_is_classified(pipeline):
+    assert llm_calls.route_query_to_function(QUESTION) == "About $365 per CY."
+    assert ("embed_overlapped", True) in pipeline
+    assert ("answer", "cost benchmark", ["rsmeans"]) in pipeline
+    # Speculatively only the local lookup: no LLM call for a route that may not need it
+    assert ("rsmeans", False) in pipeline
+
+
+def test_semantic_hit_skips_the_route(pipeline, capsys):
+    llm_calls.route_query_to_function(QUESTION)
+    pipeline.clear()
+    assert llm_calls.route_query_to_function(QUESTION) == "About $365 per CY."
+    assert not any(isinstance(e, tuple) and e[0] == "answer" for e in pipeline)
+    assert "semantic cache hit" not in capsys.readouterr().out
+
+
+def test_failed_embedding_is_logged_and_answered_uncached(pipeline, monkeypatch, caplog, capsys):
+    def broken_embedding(message):
+        raise ConnectionError("embeddings endpoint down")
+    monkeypatch.setattr(llm_calls, "embed_question", broken_embedding)
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        assert llm_calls.route_query_to_function(QUESTION) == "About $365 per CY."
+    assert any(r.msg.get("event") == "semantic_cache_skipped" for r in caplog.records if isinstance(r.msg, dict))
+    assert "embeddings endpoint down" not in capsys.readouterr().out
+
+
+def test_speculative_work_the_route_does_not_need_is_discarded(pipeline, monkeypatch, caplog):
+    monkeypatch.setattr(llm_calls, "classify_question_type", lambda message: "ROI Analysis")
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        assert llm_calls._speculative_route(QUESTION) == ("roi analysis", {})
+    timing = [r.msg for r in caplog.records if isinstance(r.msg, dict) and r.msg["event"] == "pipeline_timing"]
+    assert timing[0]["discarded"] == ["rsmeans"]
+
+
+def test_failed_speculative_stage_is_logged_and_left_to_the_route(pipeline, monkeypatch, caplog, capsys):
+    def broken_lookup(message, use_llm=True):
+        raise KeyError("section")
+    monkeypatch.setattr(llm_calls, "_cost_benchmark_request", broken_lookup)
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        assert llm_calls._speculative_route(QUESTION) == ("cost benchmark", {})
+    events = [r.msg["event"] for r in caplog.records if isinstance(r.msg, dict)]
+    assert events == ["speculative_stage_failed", "pipeline_timing"]
+    assert capsys.readouterr().out == ""
+
+
+def test_streamed_answer_is_timed_as_it_is_consumed(pipeline, monkeypatch, caplog, capsys):
+    def answer_route(classification, message, collection=None, ranker=None, use_rag=False, stream=False,
+                     prefetched=None):
+        return iter(["About ", "$365 ", "per CY."])
+    monkeypatch.setattr(llm_calls, "_answer_route", answer_route)
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        stream = llm_calls.route_query_to_function(QUESTION, stream=True)
+        assert not [r for r in caplog.records if isinstance(r.msg, dict) and r.msg["event"] == "answer_timing"]
+        assert "".join(stream) == "About $365 per CY."
+    timing = [r.msg for r in caplog.records if isinstance(r.msg, dict) and r.msg["event"] == "answer_timing"]
+    assert len(timing) == 1
+    assert timing[0]["stream"] and timing[0]["chunks"] == 3 and timing[0]["route"] == "cost benchmark"
+    assert 0 < timing[0]["ttft_ms"] <= timing[0]["total_ms"]
+    assert "time to first token" not in capsys.readouterr().out
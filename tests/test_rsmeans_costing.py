@@ -0,0 +1,40 @@
+import pytest
+
+from cost_data.rsmeans_costing import CostingTables, normalize_line_id, normalize_unit, price_takeoff
+
+
+def test_normalize_unit_and_line_id():
+    assert [normalize_unit(u) for u in ["S.F.", "Ea .", "LF.", "Each", "M.S.F."]] == ["sf", "ea", "lf", "ea", "msf"]
+    assert normalize_unit('"') is None and normalize_unit(float("nan")) is None
+    assert [normalize_line_id(i) for i in ["110", "380.0", 7]] == ["0110", "0380", "0007"]
+
+
+def test_takeoff_matches_line_then_section_unit_then_section(rsmeans_df):
+    takeoff = [
+        {"code": "03 30 53.40 0200", "quantity": 10},
+        {"code": "03 30 53.40", "quantity": 2, "unit": "CY"},
+        {"code": "0330 53.40", "quantity": 1},
+        {"code": "05 12 23.75", "id": 100, "quantity": 100, "unit": "SF"},
+        {"code": "99 99 99", "quantity": 5},
+    ]
+    result = price_takeoff(CostingTables(rsmeans_df), takeoff)
+    lines = result['lines']
+    assert lines['match'].iloc[:4].tolist() == ["line", "section_unit", "section", "line"]
+    assert lines['match'].isna().iloc[4]
+    assert lines['unit_total_incl_op'].iloc[:4].tolist() == [365.0, 355.0, 345.0, 34.0]
+    assert lines['total_incl_op'].iloc[:4].tolist() == [3650.0, 710.0, 345.0, 3400.0]
+    assert lines['unit_mismatch'].tolist() == [False, False, False, True, False]
+    assert result['totals']['total_incl_op'] == 3650.0 + 710.0 + 345.0 + 3400.0
+    assert (result['totals']['matched_lines'], result['totals']['unmatched_lines']) == (4, 1)
+    divisions = result['divisions'].set_index('division')
+    assert divisions.loc["03", "lines"] == 3 and divisions.loc["05", "total_incl_op"] == 3400.0
+
+
+def test_percent_adders_are_not_priced(rsmeans_df):
+    result = price_takeoff(CostingTables(rsmeans_df), [{"code": "09 29 10.30", "quantity": 100}])
+    assert result['lines']['unit_total_incl_op'].tolist() == [1.7]
+
+
+def test_takeoff_needs_code_and_quantity(rsmeans_df):
+    with pytest.raises(ValueError):
+        price_takeoff(CostingTables(rsmeans_df), [{"code": "03 30 53.40"}])
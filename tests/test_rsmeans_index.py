@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from cost_data.rsmeans_index import (CODE_COLUMN, build_rsmeans_index, find_code_positions, get_rsmeans_index,
+                                     prebuilt_rsmeans_index, scan_code_positions)
+
+QUERIES = ["03 30 53.40", "03 30", "0330", "03", "3543", "23.75", "99 99", ""]
+STAGES = [("exact", "prefix", "contains"), ("exact",), ("contains",)]
+
+
+def test_exact_prefix_and_contains(rsmeans_df):
+    index = build_rsmeans_index(rsmeans_df)
+    assert index.exact("03 30 53.40").tolist() == [0, 1, 2]
+    assert index.exact("03 30").tolist() == []
+    assert index.prefix("0330").tolist() == [0, 1, 2]
+    assert index.contains("3543").tolist() == [3]
+    assert index.find_code_positions("05 12").tolist() == [4, 5]
+    assert index.find_code_positions("99 99").tolist() == []
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("stages", STAGES)
+def test_index_and_scan_agree(rsmeans_df, query, stages):
+    build_rsmeans_index(rsmeans_df)
+    indexed = find_code_positions(rsmeans_df, query, stages)
+    assert np.array_equal(indexed, scan_code_positions(rsmeans_df, query, stages))
+
+
+def test_scan_matches_pandas_filter(rsmeans_df):
+    codes = rsmeans_df[CODE_COLUMN].str.replace(' ', '').str.lower()
+    expected = np.flatnonzero(codes.str.contains("2375", regex=False).to_numpy())
+    assert np.array_equal(scan_code_positions(rsmeans_df, "23 75"), expected)
+
+
+def test_filtered_frame_is_scanned_without_building_an_index(rsmeans_df):
+    build_rsmeans_index(rsmeans_df)
+    concrete = rsmeans_df[rsmeans_df[CODE_COLUMN].str.startswith("03")]
+    assert find_code_positions(concrete, "3543").tolist() == [3]
+    assert prebuilt_rsmeans_index(concrete) is None
+
+
+def test_index_is_built_once_and_suffixes_lazily(rsmeans_df):
+    index = build_rsmeans_index(rsmeans_df)
+    assert get_rsmeans_index(rsmeans_df) is index
+    assert index._suffixes is None
+    index.prefix("03")
+    assert index._suffixes is None
+    index.contains("53")
+    assert index._suffixes is not None
+
+
+def test_find_by_section_code_uses_the_loaded_index(rsmeans_csv, workdir):
+    from cost_data.rsmeans_utils import find_by_section_code, load_rsmeans_data
+    df = load_rsmeans_data(rsmeans_csv, use_cache=False)
+    assert prebuilt_rsmeans_index(df) is not None
+    assert find_by_section_code(df, "05 12 23.75")['ID'].tolist() == ["100", "200"]
+    assert find_by_section_code(df, "0929")['ID'].tolist() == ["100", "900"]
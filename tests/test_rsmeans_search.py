@@ -0,0 +1,72 @@
+import sys
+import types
+
+import pytest
+
+from cost_data.rsmeans_search import SectionSearch
+
+
+def test_shortlist_ranks_sections_by_name_and_items(rsmeans_df):
+    search = SectionSearch(rsmeans_df)
+    indices, scores = search.shortlist("epoxy floor paint", 5)
+    assert search.codes[indices[0]] == "03 35 43.10"
+    assert all(scores > 0)
+    assert search.section_labels(indices[:1]) == ["03 35 43.10: 0010 POLISHED CONCRETE FLOORS"]
+    assert len(search.section_labels()) == 4
+
+
+def test_confident_code_needs_a_margin_over_other_codes(rsmeans_df):
+    search = SectionSearch(rsmeans_df)
+    indices, scores = search.shortlist("structural steel beam", 5)
+    assert search.confident_code(indices, scores, 0.5) == "05 12 23.75"
+    indices, scores = search.shortlist("concrete", 5)
+    assert search.confident_code(indices, scores, 0.5) is None
+    assert search.confident_code([], [], 0.5) is None
+
+
+@pytest.fixture
+def local_description_cache(monkeypatch):
+    from cost_data import rsmeans_utils
+    from utils.cache_utils import TieredCache
+    cache = TieredCache("rsmeans_description", persistent=False)
+    monkeypatch.setattr(rsmeans_utils, "_description_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def llm_answers(monkeypatch):
+    """Replace llm_calls.run_llm_query with a recorder that answers from a list."""
+    calls, answers = [], []
+
+    def run_llm_query(system_prompt, user_input):
+        calls.append(user_input)
+        return answers.pop(0)
+    monkeypatch.setitem(sys.modules, "llm_calls", types.SimpleNamespace(run_llm_query=run_llm_query))
+    return calls, answers
+
+
+def test_find_by_description_skips_the_llm_when_confident(rsmeans_df, local_description_cache, llm_answers):
+    from cost_data.rsmeans_utils import find_by_description
+    match = find_by_description(rsmeans_df, "gypsum drywall", use_llm=False)
+    assert set(match['Masterformat Section Code']) == {"09 29 10.30"}
+    assert find_by_description(rsmeans_df, "concrete", use_llm=False) is None
+    assert llm_answers[0] == []
+
+
+def test_find_by_description_sends_only_the_shortlist(rsmeans_df, local_description_cache, llm_answers):
+    from cost_data.rsmeans_utils import find_by_description
+    calls, answers = llm_answers
+    answers.append(" 03 30 53.40\n")
+    match = find_by_description(rsmeans_df, "concrete", top_k=2)
+    assert match['ID'].tolist() == ["100", "200", "300"]
+    assert "05 12 23.75" not in calls[0] and "03 35 43.10" in calls[0]
+
+
+def test_description_lookups_are_memoized(rsmeans_df, local_description_cache, llm_answers):
+    from cost_data.rsmeans_utils import find_by_description
+    calls, answers = llm_answers
+    answers.append("03 30 53.40")
+    first = find_by_description(rsmeans_df, "Concrete.", top_k=2)
+    second = find_by_description(rsmeans_df, "  concrete ", top_k=2)
+    assert len(calls) == 1
+    assert second['ID'].tolist() == first['ID'].tolist()
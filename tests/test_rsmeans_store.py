@@ -0,0 +1,56 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from cost_data.rsmeans_store import (NUMERIC_COLUMNS, PERCENT_ADDER_COLUMN, load_typed_rsmeans, parse_numeric_column,
+                                     read_cache_meta, read_typed_csv)
+
+
+def test_parse_numeric_column():
+    parsed = parse_numeric_column(pd.Series(["1,300", "$5.33", " 926 ", "10 %", None]))
+    assert parsed.iloc[:3].tolist() == [1300.0, 5.33, 926.0]
+    assert parsed.iloc[3:].isna().all()
+
+
+def test_percent_adders_are_kept_as_text(rsmeans_csv):
+    df = read_typed_csv(rsmeans_csv)
+    adder = df[df['ID'] == "900"].iloc[0]
+    assert adder[PERCENT_ADDER_COLUMN] == "Labor: 10 %"
+    assert np.isnan(adder['Labor'])
+    assert df[PERCENT_ADDER_COLUMN].notna().sum() == 1
+
+
+def test_binary_cache_round_trip(rsmeans_csv, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    expected = read_typed_csv(rsmeans_csv)
+    first = load_typed_rsmeans(rsmeans_csv, cache_dir=cache_dir)
+    assert read_cache_meta(cache_dir)["n_rows"] == len(expected)
+    cached = load_typed_rsmeans(rsmeans_csv, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(cached.reset_index(drop=True), expected, check_dtype=False)
+    assert all(cached[c].dtype == np.float64 for c in NUMERIC_COLUMNS)
+    assert cached.attrs['rsmeans_sha256'] == read_cache_meta(cache_dir)["csv_sha256"]
+
+
+def test_cache_is_rebuilt_when_the_csv_changes(rsmeans_csv, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_typed_rsmeans(rsmeans_csv, cache_dir=cache_dir)
+    with open(rsmeans_csv, "a", encoding="utf-8") as f:
+        f.write("31 23 16.13,0010 EXCAVATING,100,Trench,B-11C,150,0.107,B.C.Y.,,5.4,2.3,7.7,10.5\n")
+    os.utime(rsmeans_csv, ns=(1, 1))
+    df = load_typed_rsmeans(rsmeans_csv, cache_dir=cache_dir)
+    assert df['Masterformat Section Code'].iloc[-1] == "31 23 16.13"
+    assert df['Total Incl O&P'].iloc[-1] == 10.5
+
+
+def test_unwritable_cache_is_logged_and_the_csv_still_loaded(rsmeans_csv, tmp_path, caplog, capsys):
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        df = load_typed_rsmeans(rsmeans_csv, cache_dir=str(not_a_dir))
+    assert len(df) == len(read_typed_csv(rsmeans_csv))
+    assert df.attrs['rsmeans_sha256']
+    assert [r.msg["event"] for r in caplog.records] == ["rsmeans_cache_write_failed"]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from utils.semantic_cache import SemanticCache, collection_scope, question_numbers
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SemanticCache(capacity=2, default_threshold=0.9, route_thresholds={"roi analysis": 0.99})
+    monkeypatch.setattr(SemanticCache, "current_namespace", staticmethod(lambda: ("cloudflare", "gen", "emb")))
+    return cache
+
+
+def test_question_numbers():
+    assert question_numbers("IRR at 6.5% on $2,000,000 in 2025?") == ("2000000", "2025", "6.5")
+    assert question_numbers("what is a good cap rate") == ()
+
+
+def test_close_paraphrase_hits(cache):
+    cache.store(unit(1, 0, 0), "cost of a concrete slab", "cost benchmark", "answer", sources=["a"])
+    hit = cache.lookup(unit(1, 0.1, 0), "how much does a concrete slab cost")
+    assert hit["answer"] == "answer" and hit["sources"] == ["a"]
+    assert hit["similarity"] > 0.99
+    assert cache.lookup(unit(0, 1, 0), "something else") is None
+
+
+def test_different_numbers_never_hit(cache):
+    cache.store(unit(1, 0, 0), "slab cost in 2024", "cost benchmark", "2024 answer")
+    assert cache.lookup(unit(1, 0, 0), "slab cost in 2025") is None
+    assert cache.lookup(unit(1, 0, 0), "slab cost for 2024")["answer"] == "2024 answer"
+
+
+def test_route_thresholds_are_stricter_for_exact_figures(cache):
+    cache.store(unit(1, 0, 0), "roi of this project", "roi analysis", "roi answer")
+    assert cache.lookup(unit(1, 0.2, 0), "return of this project") is None
+    assert cache.lookup(unit(1, 0.01, 0), "roi for this project")["answer"] == "roi answer"
+
+
+def test_scopes_are_kept_apart(cache):
+    collection = type("Collection", (), {"name": "docs", "metadata": {"version": 3}})()
+    rag = collection_scope(collection, use_rag=True)
+    assert rag == ("rag", "docs", 3) and collection_scope(collection, use_rag=False) == ("llm",)
+    cache.store(unit(1, 0, 0), "q", "cost benchmark", "rag answer", scope=rag)
+    assert cache.lookup(unit(1, 0, 0), "q", scope=("llm",)) is None
+    assert cache.lookup(unit(1, 0, 0), "q", scope=rag)["answer"] == "rag answer"
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.store(unit(1, 0, 0), "a", "cost benchmark", "A")
+    cache.store(unit(0, 1, 0), "b", "cost benchmark", "B")
+    cache.lookup(unit(1, 0, 0), "a")
+    cache.store(unit(0, 0, 1), "c", "cost benchmark", "C")
+    assert cache.lookup(unit(0, 1, 0), "b") is None
+    assert cache.lookup(unit(1, 0, 0), "a")["answer"] == "A"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_model_change_drops_everything(cache, monkeypatch):
+    cache.store(unit(1, 0, 0), "a", "cost benchmark", "A")
+    monkeypatch.setattr(SemanticCache, "current_namespace", staticmethod(lambda: ("openai", "gen", "emb")))
+    assert cache.lookup(unit(1, 0, 0), "a") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+
+from utils import retrieval_cache, sparse_index
+from utils.sparse_index import ChunkIndex, get_chunk_index, hybrid_search, rrf_fuse
+
+CHUNKS = {
+    "a": "Cast in place concrete footing 03 30 53.40",
+    "b": "Structural steel beam W8x10",
+    "c": "Gypsum board partition, fire rated",
+    "d": "Precast concrete slab 03 41 13.50",
+}
+
+
+class FakeCollection:
+    """Chroma collection whose dense search always returns `dense` in that order."""
+
+    def __init__(self, chunks, dense):
+        self.name = "docs"
+        self.metadata = {"version": 1}
+        self.chunks = dict(chunks)
+        self.dense = dense
+
+    def count(self):
+        return len(self.chunks)
+
+    def get(self, ids=None, include=(), limit=None, offset=0):
+        ids = list(self.chunks)[offset:offset + limit] if ids is None else [i for i in ids if i in self.chunks]
+        return {"ids": ids, "documents": [self.chunks[i] for i in ids],
+                "metadatas": [{"source": i} for i in ids]}
+
+    def query(self, query_texts, n_results, include):
+        ids = self.dense[:n_results]
+        return {"ids": [ids], "documents": [[self.chunks[i] for i in ids]],
+                "metadatas": [[{"source": i} for i in ids]], "distances": [[0.1] * len(ids)]}
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    """No shared indexes in memory, none on disk, and no retrieval cache."""
+    monkeypatch.setattr(sparse_index, "_indexes", {})
+    monkeypatch.setattr(sparse_index, "SPARSE_INDEX_DIR", str(tmp_path / "bm25"))
+    monkeypatch.setattr(retrieval_cache, "RETRIEVAL_CACHE_ENABLED", False)
+    return str(tmp_path / "bm25")
+
+
+def test_rrf_fuse():
+    assert rrf_fuse([["a", "b", "c"], ["c", "d"]], limit=3) == ["c", "a", "b"]
+    assert rrf_fuse([[], []], limit=3) == []
+
+
+def test_chunk_index_save_and_load(index_dir):
+    index = ChunkIndex.build(list(CHUNKS), list(CHUNKS.values()))
+    index.save("docs", index_dir)
+    loaded = ChunkIndex.load("docs", index_dir)
+    assert loaded.ids == index.ids
+    assert loaded.search("03 41 13.50", 1)[0] == ["d"]
+    assert ChunkIndex.load("missing", index_dir) is None
+
+
+def test_index_is_rebuilt_when_the_collection_changes(index_dir, caplog, capsys):
+    collection = FakeCollection(CHUNKS, dense=["a"])
+    with caplog.at_level(logging.INFO, logger="app_logger"):
+        assert len(get_chunk_index(collection)) == 4
+    assert [r.msg["event"] for r in caplog.records] == ["bm25_index_build"]
+    assert capsys.readouterr().out == ""
+    assert get_chunk_index(collection).search("gypsum", 1)[0] == ["c"]
+    collection.chunks["e"] = "Gypsum plaster ceiling"
+    assert get_chunk_index(collection).search("plaster", 1)[0] == ["e"]
+
+
+def test_hybrid_search_adds_exact_term_matches(index_dir):
+    collection = FakeCollection(CHUNKS, dense=["b", "c"])
+    documents, metadatas = hybrid_search("03 41 13.50 precast slab", collection, n_results=2, n_candidates=3)
+    assert [m["source"] for m in metadatas] == ["b", "d", "c"]
+    assert documents[1] == CHUNKS["d"]
+
+
+def test_hybrid_search_without_bm25_is_dense_only(index_dir, monkeypatch, caplog):
+    def broken(collection, question, k):
+        raise OSError("index unreadable")
+    monkeypatch.setattr(sparse_index, "_bm25_search", broken)
+    collection = FakeCollection(CHUNKS, dense=["b", "c"])
+    with caplog.at_level(logging.WARNING, logger="app_logger"):
+        documents, _ = hybrid_search("precast slab", collection, n_results=2)
+    assert documents == [CHUNKS["b"], CHUNKS["c"]]
+    assert [r.msg["event"] for r in caplog.records] == ["bm25_search_skipped"]
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from cost_data.rsmeans_utils import summarize_cost_matches
+
+
+def large_result(rsmeans_df, copies=20):
+    """The fixture rows repeated with spread-out prices, like a division-wide match."""
+    frames = []
+    for i in range(copies):
+        frame = rsmeans_df.copy()
+        frame['Total Incl O&P'] = frame['Total Incl O&P'] * (1 + i / 10)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_small_results_stay_a_plain_table(rsmeans_df):
+    text = summarize_cost_matches(rsmeans_df)
+    assert text.count("\n") == len(rsmeans_df) + 1
+    assert "Labor: 10 %" in text
+
+
+def test_large_results_become_statistics_and_representative_items(rsmeans_df):
+    result = large_result(rsmeans_df)
+    text = summarize_cost_matches(result, max_items=5, max_chars=4000)
+    assert text.startswith(f"{len(result)} matching line items in 5 section/unit groups")
+    assert "20 percent adder rows are not included" in text
+    assert "**Cost statistics by section and unit:**" in text
+    items = text.split("**Representative line items:**")[1].strip().splitlines()
+    assert 1 <= len(items) - 2 <= 5
+    assert len(text) <= 4000
+
+
+def test_statistics_are_per_section_and_unit(rsmeans_df):
+    result = large_result(rsmeans_df)
+    text = summarize_cost_matches(result, max_items=5, max_chars=10_000)
+    row = next(line for line in text.splitlines() if "03 30 53.40" in line and "| cy " in line)
+    cells = [c.strip() for c in row.strip("|").split("|")]
+    values = result[(result['Masterformat Section Code'] == "03 30 53.40") & (result['Unit'] == "C.Y.")]['Total Incl O&P']
+    assert int(cells[3]) == len(values)
+    assert float(cells[4].replace(",", "")) == values.min()
+    assert float(cells[5].replace(",", "")) == np.median(values)
+
+
+def test_output_never_exceeds_max_chars(rsmeans_df):
+    result = large_result(rsmeans_df, copies=60)
+    for max_chars in (300, 800, 2000):
+        assert len(summarize_cost_matches(result, max_chars=max_chars)) <= max_chars + len("\n_(truncated)_")
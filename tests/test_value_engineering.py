@@ -0,0 +1,52 @@
+import pytest
+
+from cost_data.rsmeans_costing import CostingTables, price_takeoff
+from cost_data.value_engineering import AlternativeTables, optimize_substitutions
+
+TAKEOFF = [
+    {"code": "03 30 53.40 0200", "quantity": 10},   # 4000 psi footing, 3000 psi saves $20/CY
+    {"code": "05 12 23.75 0200", "quantity": 100},  # W10x22 beam, W8x10 saves $26/LF
+    {"code": "09 29 10.30 0100", "quantity": 500},  # cheapest drywall already, no alternative
+]
+
+
+@pytest.fixture
+def tables(rsmeans_df):
+    costing = CostingTables(rsmeans_df)
+    return costing, AlternativeTables(costing)
+
+
+def optimize(tables, target, **kwargs):
+    costing, alternatives = tables
+    lines = price_takeoff(costing, TAKEOFF)['lines']
+    return optimize_substitutions(costing, alternatives, lines, target, **kwargs)
+
+
+def test_alternatives_are_cheaper_items_of_the_same_section_and_unit(tables):
+    _, alternatives = tables
+    positions = alternatives.alternatives("033053.40", "cy", 365.0)
+    assert alternatives.names[positions].tolist() == ["Footing, 3000 psi"]
+    assert len(alternatives.alternatives("033053.40", "cy", 345.0)) == 0
+    assert len(alternatives.alternatives("051223.75", "lf", 60.0, min_ratio=0.6)) == 0
+
+
+def test_mildest_substitution_that_reaches_the_target(tables):
+    result = optimize(tables, 150)
+    assert result['feasible'] and result['max_saving'] == pytest.approx(2800)
+    best = result['solutions'][0]
+    assert best['substitutions']['alternative_name'].tolist() == ["Footing, 3000 psi"]
+    assert best['saving'] == pytest.approx(200)
+    # The next set bans the previous set's largest substitution
+    assert result['solutions'][1]['substitutions']['alternative_name'].tolist() == ["Beam, W8x10"]
+
+
+def test_combines_substitutions_for_larger_targets(tables):
+    best = optimize(tables, 2700)['solutions'][0]
+    assert best['count'] == 2 and best['saving'] == pytest.approx(2800)
+    assert best['saving'] >= 2700
+
+
+def test_infeasible_target(tables):
+    result = optimize(tables, 3000)
+    assert not result['feasible'] and result['solutions'] == []
+    assert result['baseline'] == pytest.approx(3650 + 6000 + 850)
@@ -0,0 +1,115 @@
+# Small in-process BM25 index (NumPy only).
+# Postings are stored term-major (CSR style) with the BM25 term weight precomputed per
+# posting, so scoring a query is one np.bincount over the postings of its terms.
+
+import os
+import re
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or per the to what with "
+    "which who will this that these those do does i we you my our cost costs price".split()
+)
+
+
+def tokenize(text):
+    """
+    Lowercase word/number tokens with stopwords removed and a naive plural strip
+    ("floors" -> "floor"), so query and document forms line up.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss') and token.isalpha():
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """
+    BM25 over a fixed list of documents (each a string or a list of tokens).
+    score() returns a float array with one score per document.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        docs = [doc if isinstance(doc, list) else tokenize(doc) for doc in documents]
+        self.n_docs = len(docs)
+        doc_len = np.array([len(doc) for doc in docs], dtype=np.float64)
+        avg_len = doc_len.mean() if self.n_docs and doc_len.sum() else 1.0
+
+        # term -> {doc: tf}
+        postings = {}
+        for doc_id, doc in enumerate(docs):
+            for token in doc:
+                tf = postings.setdefault(token, {})
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        self.vocab = {term: i for i, term in enumerate(postings)}
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        doc_ids, weights = [], []
+        for term, i in self.vocab.items():
+            tf_by_doc = postings[term]
+            ids = np.fromiter(tf_by_doc.keys(), dtype=np.int64, count=len(tf_by_doc))
+            tf = np.fromiter(tf_by_doc.values(), dtype=np.float64, count=len(tf_by_doc))
+            df = len(tf_by_doc)
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * doc_len[ids] / avg_len)
+            doc_ids.append(ids)
+            weights.append(idf * tf * (k1 + 1.0) / (tf + norm))
+            offsets[i + 1] = offsets[i] + df
+        self._offsets = offsets
+        self._doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int64)
+        self._weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float64)
+
+    def score(self, query):
+        """BM25 score of every document for the query (string or token list)."""
+        tokens = query if isinstance(query, list) else tokenize(query)
+        term_ids = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not term_ids:
+            return np.zeros(self.n_docs)
+        spans = [np.arange(self._offsets[t], self._offsets[t + 1]) for t in term_ids]
+        idx = np.concatenate(spans)
+        return np.bincount(self._doc_ids[idx], weights=self._weights[idx], minlength=self.n_docs)
+
+    def top_k(self, query, k):
+        """
+        Return (doc_indices, scores) of the k best documents with a positive score,
+        best first.
+        """
+        scores = self.score(query)
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < self.n_docs else np.arange(self.n_docs)
+        candidates = candidates[scores[candidates] > 0]
+        order = np.argsort(-scores[candidates], kind='stable')
+        top = candidates[order]
+        return top, scores[top]
+
+    def save(self, path):
+        """Write the index to an .npz file (postings, weights and vocabulary)."""
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, offsets=self._offsets, doc_ids=self._doc_ids, weights=self._weights,
+                 terms=np.array(list(self.vocab), dtype=str),
+                 params=np.array([self.n_docs, self.k1, self.b], dtype=np.float64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            index = cls.__new__(cls)
+            n_docs, index.k1, index.b = data["params"].tolist()
+            index.n_docs = int(n_docs)
+            index.vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index._offsets = data["offsets"]
+            index._doc_ids = data["doc_ids"]
+            index._weights = data["weights"]
+        return index
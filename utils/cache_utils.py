@@ -0,0 +1,264 @@
+# Generic caching building blocks: an in-memory LRU tier, an on-disk SQLite tier and a
+# two-level cache that puts the LRU in front of SQLite.
+# Values stored in the SQLite tier must be JSON-serializable.
+# TieredCache.aget / aset are for the event loop: SQLite calls (which can wait up to 10 s on a
+# locked database) run in a worker thread there.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("app_logger")
+
+DEFAULT_CACHE_DB = os.path.join("cache", "llm_cache.sqlite")
+
+_MISSING = object()
+
+
+def make_key(*parts):
+    """
+    Stable hex key for any JSON-serializable parts (dicts are key-sorted).
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU with optional TTL (seconds).
+    get() returns `default` for missing or expired entries.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache in one SQLite table per namespace.
+    Entries expire after `ttl` seconds (None = never); when the table grows past
+    `max_entries` the least recently used entries are deleted.
+    """
+
+    def __init__(self, namespace, path=None, ttl=None, max_entries=100_000):
+        self.namespace = namespace
+        self.path = path or DEFAULT_CACHE_DB
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._table = "cache_" + "".join(c if c.isalnum() else "_" for c in namespace)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_access ON {self._table} (last_access)")
+        self._writes_since_prune = 0
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            value, expires_at = row
+            with self._conn:
+                if expires_at is not None and expires_at < now:
+                    self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+                    self.misses += 1
+                    return default
+                self._conn.execute(f"UPDATE {self._table} SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        payload = json.dumps(value)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, expires_at, now),
+            )
+            self._writes_since_prune += 1
+            # Pruning scans the table, so only do it every so often
+            if self._writes_since_prune >= max(1, self.max_entries // 100):
+                self._prune(now)
+                self._writes_since_prune = 0
+
+    def _prune(self, now):
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        self._conn.execute(f"DELETE FROM {self._table} WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def stats(self):
+        return {"size": len(self), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions, "path": self.path}
+
+
+class TieredCache:
+    """
+    LRU memory tier in front of an optional SQLite tier.
+    Disk hits are promoted to memory. Set persistent=False for a memory-only cache.
+    """
+
+    def __init__(self, namespace, memory_size=1024, ttl=None, max_entries=100_000, path=None, persistent=True):
+        self.namespace = namespace
+        self.memory = LRUCache(maxsize=memory_size, ttl=ttl)
+        self.disk = None
+        if persistent:
+            try:
+                self.disk = SQLiteCache(namespace, path=path, ttl=ttl, max_entries=max_entries)
+            except sqlite3.Error as e:
+                logger.warning({"event": "cache_memory_only", "namespace": namespace, "error": str(e)})
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.disk is not None:
+            value = self.disk.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            self._disk_set(key, value, ttl)
+
+    def _disk_set(self, key, value, ttl):
+        try:
+            self.disk.set(key, value, ttl=ttl)
+        except sqlite3.Error as e:
+            logger.warning({"event": "cache_disk_write_failed", "namespace": self.namespace, "error": str(e)})
+
+    async def aget(self, key, default=None):
+        """get for async code: the memory tier inline, the SQLite tier in a worker thread."""
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    async def aset(self, key, value, ttl=None):
+        """set for async code: the SQLite write runs in a worker thread."""
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,143 @@
+# Token-aware packing of reranked chunks into the RAG context.
+# Chunks are kept whole: the best-ranked chunk goes in first, then the rest greedily by
+# rerank score per token until the model's context budget is used up, and the selection is
+# written out in rank order with its [Source: ...] line. Tokens are counted with the
+# FlashRank reranker's tokenizer (models/ms-marco-MiniLM-L-12-v2/tokenizer.json). It is
+# not the generation model's tokenizer, but English WordPiece counts are close to Llama /
+# GPT counts; without the tokenizers package or the file, ~4 characters per token is assumed.
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger("app_logger")
+
+TOKENIZER_PATH = os.path.join("models", "ms-marco-MiniLM-L-12-v2", "tokenizer.json")
+CHARS_PER_TOKEN = 4
+
+# Context windows of the completion models, in tokens
+CONTEXT_WINDOWS = {
+    "lmstudio-community/Meta-Llama-3-8B-Instruct-GGUF": 8192,
+    "@cf/meta/llama-3.3-70b-instruct-fp8-fast": 128_000,
+    "gpt-4o": 128_000,
+}
+ANSWER_TOKENS = 1500  # max_tokens of the answer call (llm_calls.py / async_llm_calls.py)
+PROMPT_TOKENS = 1500  # system prompt, question and any RSMeans / ROI context next to the RAG context
+# Deliberate caps on the RAG context, well below what the windows allow: more chunks cost
+# more per request and slow the first token without improving answers much. The small local
+# model gets less because it is slow on long prompts.
+CONTEXT_TOKEN_BUDGETS = {
+    "lmstudio-community/Meta-Llama-3-8B-Instruct-GGUF": 1000,
+    "@cf/meta/llama-3.3-70b-instruct-fp8-fast": 2000,
+    "gpt-4o": 2000,
+}
+DEFAULT_CONTEXT_TOKENS = 1000  # about the 4,000 characters the context used to be cut to
+CHUNK_SEPARATOR = "\n\n"
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    from tokenizers import Tokenizer
+                    tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+                    # The reranker tokenizer truncates to 512 tokens; count everything
+                    tokenizer.no_truncation()
+                    tokenizer.no_padding()
+                    _tokenizer = tokenizer
+                except Exception as e:
+                    logger.warning({"event": "context_packer_no_tokenizer", "error": str(e),
+                                    "chars_per_token": CHARS_PER_TOKEN})
+                    _tokenizer = False
+    return _tokenizer or None
+
+
+def count_tokens(texts):
+    """Token counts of a list of texts (special tokens excluded)."""
+    tokenizer = _load_tokenizer()
+    if tokenizer is None:
+        return [max(1, -(-len(text) // CHARS_PER_TOKEN)) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+
+def context_budget(model=None):
+    """
+    Context token budget for a completion model (default: the current config model): its
+    cap from CONTEXT_TOKEN_BUDGETS, but never more than the window leaves after the prompt
+    and the answer.
+    """
+    if model is None:
+        import server.config as config
+        model = config.completion_model
+    budget = CONTEXT_TOKEN_BUDGETS.get(model, DEFAULT_CONTEXT_TOKENS)
+    window = CONTEXT_WINDOWS.get(model)
+    if window is not None:
+        budget = min(budget, window - ANSWER_TOKENS - PROMPT_TOKENS)
+    return max(0, budget)
+
+
+def _truncate(text, max_tokens):
+    """Longest prefix of text ending on a sentence (else word) boundary that fits max_tokens."""
+    pieces = re.split(r"(?<=[.!?])\s+", text)
+    if len(pieces) == 1:
+        pieces = text.split(" ")
+    counts = count_tokens(pieces)
+    kept, used = [], 0
+    for piece, tokens in zip(pieces, counts):
+        if used + tokens > max_tokens:
+            break
+        kept.append(piece)
+        used += tokens
+    return " ".join(kept)
+
+
+def pack_context(chunks, budget=None, model=None):
+    """
+    Pack reranked chunks into a context string within a token budget.
+
+    chunks: dicts with 'text', 'score' and optionally 'source', best first (FlashRank output).
+    Returns a dict with 'context', 'tokens' (used), 'budget', 'selected' (indices into
+    chunks, rank order), 'dropped' (count) and 'truncated' (the top chunk was cut to fit).
+    """
+    budget = context_budget(model) if budget is None else budget
+    if not chunks:
+        return {"context": "", "tokens": 0, "budget": budget, "selected": [], "dropped": 0, "truncated": False}
+
+    texts = [_format_chunk(c["text"], c.get("source")) for c in chunks]
+    # +1 per chunk for the separator (a newline or two costs at most a token in the LLM's tokenizer)
+    costs = [tokens + 1 for tokens in count_tokens(texts)]
+    truncated = costs[0] > budget
+    if truncated:
+        # The best chunk alone is over budget: keep its leading sentences and its source line in half of it
+        room = budget // 2 - count_tokens([_format_chunk("", chunks[0].get("source"))])[0] - 1
+        texts[0] = _format_chunk(_truncate(chunks[0]["text"], room), chunks[0].get("source"))
+        costs[0] = count_tokens([texts[0]])[0] + 1
+
+    # The top chunk always goes first (it carries the best citation), the rest by score per token
+    order = [0] + sorted(range(1, len(chunks)), key=lambda i: float(chunks[i].get("score", 0.0)) / costs[i],
+                         reverse=True)
+    selected, used = [], 0
+    for i in order:
+        if used + costs[i] <= budget:
+            selected.append(i)
+            used += costs[i]
+
+    selected.sort()
+    return {
+        "context": CHUNK_SEPARATOR.join(texts[i] for i in selected),
+        "tokens": used,
+        "budget": budget,
+        "selected": selected,
+        "dropped": len(chunks) - len(selected),
+        "truncated": truncated,
+    }
+
+
+def _format_chunk(text, source):
+    return f"{text}\n[Source: {source}]" if source else text
@@ -0,0 +1,136 @@
+# Vectorized hybrid reranking of retrieved chunks (replaces the per-document loop of
+# rag_utils.enhanced_rerank_results). All candidates are scored at once:
+# - semantic: cosine similarity as one product of the row-normalized embedding matrix with
+#   the normalized question embedding
+# - keyword: weighted count of question words found in the chunk, from per-chunk arrays of
+#   unique token ids that are computed once per chunk text and cached. A token id is the
+#   word's 64-bit str hash, so there is no shared vocabulary that grows with every new word;
+#   memory is bounded by the chunk cache.
+# - position: rank in the vector search results
+# - density: unique words per character of the chunk (cached with the token ids)
+# Selection fills max_length characters in score order, as before.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Architecture-specific important keywords, weighted higher in the keyword signal
+KEYWORD_WEIGHTS = {
+    'architect': 2.0, 'design': 1.5, 'building': 1.5, 'structure': 1.5,
+    'space': 1.5, 'form': 1.5, 'function': 1.5, 'style': 1.2,
+    'material': 1.2, 'construction': 1.2
+}
+DEFAULT_WEIGHTS = {"semantic": 0.4, "keyword": 0.3, "position": 0.2, "density": 0.1}
+CHUNK_CACHE_SIZE = 50_000
+
+
+class HybridReranker:
+    """
+    Scores candidate chunks with a weighted sum of semantic, keyword, position and density
+    signals. Token ids and densities of chunk texts are cached (LRU), so chunks retrieved
+    again by later questions are not re-tokenized.
+    """
+
+    def __init__(self, weights=None, keyword_weights=None, cache_size=CHUNK_CACHE_SIZE):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.keyword_weights = KEYWORD_WEIGHTS if keyword_weights is None else keyword_weights
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._chunks = OrderedDict()  # text -> (unique token ids, density)
+
+    @staticmethod
+    def _token_ids(words):
+        unique = set(words)
+        return np.fromiter((hash(w) for w in unique), dtype=np.int64, count=len(unique))
+
+    def _chunk_features(self, documents):
+        """Unique token ids and density per document, from the cache where possible."""
+        features = []
+        with self._lock:
+            for doc in documents:
+                cached = self._chunks.get(doc)
+                if cached is None:
+                    ids = self._token_ids(doc.lower().split())
+                    cached = (ids, len(ids) / (len(doc) + 1))  # +1 avoids division by zero
+                    self._chunks[doc] = cached
+                    if len(self._chunks) > self.cache_size:
+                        self._chunks.popitem(last=False)
+                else:
+                    self._chunks.move_to_end(doc)
+                features.append(cached)
+        return features
+
+    def _question_terms(self, question):
+        """(sorted token ids, summed weight per id) of the question's words."""
+        weights = {}
+        for word in question.lower().split():
+            token_id = hash(word)
+            weights[token_id] = weights.get(token_id, 0.0) + self.keyword_weights.get(word, 1.0)
+        ids = np.fromiter(sorted(weights), dtype=np.int64, count=len(weights))
+        return ids, np.array([weights[i] for i in ids.tolist()], dtype=np.float64)
+
+    def signals(self, question, question_embedding, documents, embeddings):
+        """Per-signal score arrays for the candidates, in retrieval order."""
+        n = len(documents)
+        features = self._chunk_features(documents)
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(n, -1)
+        query = np.asarray(question_embedding, dtype=np.float32).ravel()
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        semantic = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+
+        # Keyword: look every chunk token up in the question's sorted ids and sum the hits per chunk
+        term_ids, term_weights = self._question_terms(question)
+        keyword = np.zeros(n)
+        if len(term_ids):
+            lengths = np.fromiter((len(ids) for ids, _ in features), dtype=np.int64, count=n)
+            tokens = np.concatenate([ids for ids, _ in features]) if n else np.empty(0, dtype=np.int64)
+            positions = np.minimum(np.searchsorted(term_ids, tokens), len(term_ids) - 1)
+            hits = np.where(term_ids[positions] == tokens, term_weights[positions], 0.0)
+            keyword = np.bincount(np.repeat(np.arange(n), lengths), weights=hits, minlength=n)
+
+        position = 1.0 - np.arange(n) / n if n else np.zeros(0)
+        density = np.fromiter((d for _, d in features), dtype=np.float64, count=n)
+        return {"semantic": semantic.astype(np.float64), "keyword": keyword, "position": position, "density": density}
+
+    def score(self, question, question_embedding, documents, embeddings):
+        """Combined score per candidate, in retrieval order."""
+        signals = self.signals(question, question_embedding, documents, embeddings)
+        return sum(self.weights[name] * values for name, values in signals.items())
+
+    def rerank(self, question, question_embedding, documents, embeddings, max_length=4000, top_k=None):
+        """
+        Candidate indices in score order that fit max_length characters together (a
+        candidate that doesn't fit is skipped, shorter ones after it may still go in).
+        top_k limits the result to the k best candidates before the length budget.
+        """
+        if not len(documents):
+            return []
+        scores = self.score(question, question_embedding, documents, embeddings)
+        if top_k is not None and top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        else:
+            order = np.argsort(-scores, kind="stable")
+
+        lengths = np.fromiter((len(documents[i]) for i in order), dtype=np.int64, count=len(order))
+        # Everything before the first candidate that overflows fits; only the rest needs a loop
+        fits = int(np.searchsorted(np.cumsum(lengths), max_length, side="right"))
+        selected, total = order[:fits].tolist(), int(lengths[:fits].sum())
+        for i, length in zip(order[fits:].tolist(), lengths[fits:].tolist()):
+            if total + length <= max_length:
+                selected.append(i)
+                total += length
+        return selected
+
+
+_reranker = None
+
+
+def get_hybrid_reranker():
+    """Return the shared HybridReranker (default weights), creating it on first use."""
+    global _reranker
+    if _reranker is None:
+        _reranker = HybridReranker()
+    return _reranker
@@ -0,0 +1,230 @@
+# Deterministic response cache for chat completions.
+# Completions at temperature 0 are cached under (provider, model, system prompt hash,
+# user input, sampling params) in a TieredCache (memory LRU + SQLite in cache/). Lookups use
+# the active provider and model; a completion is stored under the provider and model that
+# actually answered it, so a failover or hedged answer is never replayed as the primary's.
+# Streaming calls replay a cached completion as a chunked generator.
+# async_cached_chat_completion is the same on config.async_client for the asyncio server.
+
+import hashlib
+import threading
+import time
+
+import server.config as config
+from server.provider_router import get_provider_router
+from utils import metrics
+from utils.cache_utils import TieredCache, make_key
+
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # seconds
+RESPONSE_CACHE_MEMORY_SIZE = 2048
+RESPONSE_CACHE_MAX_ENTRIES = 100_000
+# Size of the chunks a cached completion is replayed in when streaming
+REPLAY_CHUNK_CHARS = 64
+# Modes whose providers accept stream_options and send token usage at the end of a stream (utils/metrics.py)
+STREAM_USAGE_MODES = {"openai"}
+
+_response_cache = None
+_stats_lock = threading.Lock()
+_stats = {"bypassed": 0, "saved_seconds": 0.0, "provider_seconds": 0.0, "provider_calls": 0}
+
+
+def get_response_cache():
+    """
+    Return the shared LLM response cache, creating it on first use.
+    """
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = TieredCache(
+            "llm_responses",
+            memory_size=RESPONSE_CACHE_MEMORY_SIZE,
+            ttl=RESPONSE_CACHE_TTL,
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        )
+    return _response_cache
+
+
+def response_cache_key(messages, answered_by=None, **params):
+    """
+    Cache key for a chat request: provider and model (answered_by, default the active
+    provider mode and model), hash of the system prompt(s), the remaining messages and the
+    sampling parameters.
+    """
+    provider, model = answered_by or (config.get_mode(), config.completion_model)
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    conversation = [(m["role"], m["content"]) for m in messages if m["role"] != "system"]
+    system_hash = hashlib.sha256(system.encode('utf-8')).hexdigest()
+    return make_key(provider, model, system_hash, conversation, params)
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+def _usage_params(stream, params):
+    if stream and config.get_mode() in STREAM_USAGE_MODES:
+        return {**params, "stream_options": {"include_usage": True}}
+    return params
+
+
+def _create(messages, stream, **params):
+    """
+    Active provider, with hedging / failover to configured fallbacks (server/provider_router.py).
+    Returns (response, (provider, model) that answered).
+    """
+    params = _usage_params(stream, params)
+    response, target = get_provider_router().create_routed(messages=messages, stream=stream, **params)
+    if not stream:
+        metrics.record_usage(getattr(response, "usage", None))
+    return response, (target.name, target.model)
+
+
+def stream_text(response):
+    """Text chunks of a streamed chat completion."""
+    for chunk in response:
+        # Providers that report usage for streams send it with (or as) the last chunk
+        metrics.record_usage(getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        delta = getattr(chunk.choices[0], 'delta', None)
+        if delta and hasattr(delta, 'content') and delta.content:
+            yield delta.content
+
+
+def replay_chunks(text, size=REPLAY_CHUNK_CHARS):
+    """Generator over a finished completion in chunks of `size` characters, like a stream."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def cached_chat_completion(messages, stream=False, use_cache=True, **params):
+    """
+    Chat completion text for `messages` with the current config client and model.
+    Requests with temperature 0 (the default) are answered from the response cache when
+    possible; anything else bypasses it. With stream=True a generator of text chunks is
+    returned, and a completion is only cached once its stream has been fully consumed.
+    Extra keyword arguments (temperature, max_tokens, ...) are passed to the provider.
+    """
+    params.setdefault("temperature", 0.0)
+    cacheable = RESPONSE_CACHE_ENABLED and use_cache and not params["temperature"]
+    if not cacheable:
+        _record(bypassed=1)
+        if stream:
+            return stream_text(_create(messages, True, **params)[0])
+        response, _ = _create(messages, False, **params)
+        return response.choices[0].message.content.strip()
+
+    cache = get_response_cache()
+    key = response_cache_key(messages, **params)
+    lookup_start = time.perf_counter()
+    entry = cache.get(key)
+    if entry is not None:
+        _record(saved_seconds=max(entry["latency"] - (time.perf_counter() - lookup_start), 0.0))
+        return replay_chunks(entry["text"]) if stream else entry["text"]
+
+    start = time.perf_counter()
+    if not stream:
+        response, answered_by = _create(messages, False, **params)
+        text = response.choices[0].message.content.strip()
+        latency = time.perf_counter() - start
+        _record(provider_seconds=latency, provider_calls=1)
+        cache.set(response_cache_key(messages, answered_by, **params), {"text": text, "latency": latency})
+        return text
+
+    def generator():
+        response, answered_by = _create(messages, True, **params)
+        parts = []
+        for part in stream_text(response):
+            parts.append(part)
+            yield part
+        latency = time.perf_counter() - start
+        _record(provider_seconds=latency, provider_calls=1)
+        cache.set(response_cache_key(messages, answered_by, **params),
+                  {"text": "".join(parts).strip(), "latency": latency})
+    return generator()
+
+
+async def _async_create(messages, stream, **params):
+    params = _usage_params(stream, params)
+    response, target = await get_provider_router().acreate_routed(messages=messages, stream=stream, **params)
+    if not stream:
+        metrics.record_usage(getattr(response, "usage", None))
+    return response, (target.name, target.model)
+
+
+async def async_stream_text(response):
+    """Text chunks of a streamed async chat completion."""
+    async for chunk in response:
+        metrics.record_usage(getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        delta = getattr(chunk.choices[0], 'delta', None)
+        if delta and hasattr(delta, 'content') and delta.content:
+            yield delta.content
+
+
+async def async_replay_chunks(text, size=REPLAY_CHUNK_CHARS):
+    """Async generator version of replay_chunks."""
+    for part in replay_chunks(text, size):
+        yield part
+
+
+async def async_cached_chat_completion(messages, stream=False, use_cache=True, **params):
+    """
+    Async version of cached_chat_completion on config.async_client. Shares the response
+    cache and statistics with the sync version; its SQLite tier is read and written in a
+    worker thread. With stream=True an async generator of
+    text chunks is returned.
+    """
+    params.setdefault("temperature", 0.0)
+    cacheable = RESPONSE_CACHE_ENABLED and use_cache and not params["temperature"]
+    if not cacheable:
+        _record(bypassed=1)
+        if stream:
+            return async_stream_text((await _async_create(messages, True, **params))[0])
+        response, _ = await _async_create(messages, False, **params)
+        return response.choices[0].message.content.strip()
+
+    cache = get_response_cache()
+    key = response_cache_key(messages, **params)
+    lookup_start = time.perf_counter()
+    entry = await cache.aget(key)
+    if entry is not None:
+        _record(saved_seconds=max(entry["latency"] - (time.perf_counter() - lookup_start), 0.0))
+        return async_replay_chunks(entry["text"]) if stream else entry["text"]
+
+    start = time.perf_counter()
+    if not stream:
+        response, answered_by = await _async_create(messages, False, **params)
+        text = response.choices[0].message.content.strip()
+        latency = time.perf_counter() - start
+        _record(provider_seconds=latency, provider_calls=1)
+        await cache.aset(response_cache_key(messages, answered_by, **params), {"text": text, "latency": latency})
+        return text
+
+    response, answered_by = await _async_create(messages, True, **params)
+
+    async def generator():
+        parts = []
+        async for part in async_stream_text(response):
+            parts.append(part)
+            yield part
+        latency = time.perf_counter() - start
+        _record(provider_seconds=latency, provider_calls=1)
+        await cache.aset(response_cache_key(messages, answered_by, **params),
+                         {"text": "".join(parts).strip(), "latency": latency})
+    return generator()
+
+
+def response_cache_stats():
+    """
+    Hit rate of the response cache plus bypassed requests, provider time and the provider
+    latency saved by cache hits (the stored latency of each hit entry).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["cache"] = get_response_cache().stats()
+    stats["avg_provider_seconds"] = stats["provider_seconds"] / stats["provider_calls"] if stats["provider_calls"] else 0.0
+    return stats
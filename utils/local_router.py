@@ -0,0 +1,330 @@
+# Local learned router in front of the LLM classifiers.
+# Two small scikit-learn models (TF-IDF word + character n-grams, logistic regression)
+# answer classify_question_type (route) and classify_input (relevance) in-process.
+# They are trained from labelled seed examples (utils/router_data/seed_examples.json) and
+# from past LLM classifications in the app logs; predictions below a confidence threshold
+# fall back to the LLM.
+#
+#   python -m utils.local_router train            retrain from seeds + logs and save
+#   python -m utils.local_router report           cross-validated accuracy and latency
+#   python -m utils.local_router report --llm     ... and compare against the LLM router
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger("app_logger")
+
+LOCAL_ROUTER_ENABLED = True
+ROUTER_DIR = os.path.join("cache", "router")
+SEED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_data", "seed_examples.json")
+LOG_PATHS = [os.path.join("logs", "app.log"), os.path.join("logs", "gradio_app.log")]
+ROUTER_FORMAT_VERSION = 1
+
+# Classifier name -> labels, as the LLM classifiers return them
+ROUTE_LABELS = ["Cost Benchmark", "ROI Analysis", "Design-Cost Comparison", "Value Engineering", "Project Data Lookup"]
+RELEVANCE_LABELS = ["Related", "Refuse to answer"]
+ROUTER_LABELS = {"route": ROUTE_LABELS, "relevance": RELEVANCE_LABELS}
+# Minimum predicted probability to answer locally instead of asking the LLM
+CONFIDENCE_THRESHOLDS = {"route": 0.55, "relevance": 0.8}
+
+# Answer prefixes of the gradio app that identify the route that produced them
+_ANSWER_PREFIXES = {"**RSMeans Data:**": "Cost Benchmark", "**ROI Model:**": "ROI Analysis"}
+
+
+def normalize_label(classifier, text):
+    """
+    Map a raw classifier output ("ROI Analysis.", "3. Design-Cost Comparison") to one of the
+    classifier's labels, or None.
+    """
+    lowered = str(text).lower()
+    for label in sorted(ROUTER_LABELS[classifier], key=len, reverse=True):
+        if label.lower() in lowered:
+            return label
+    return None
+
+
+def seed_hash(path=SEED_PATH):
+    """Hash of the seed file; a saved router trained on other seeds is retrained."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_seed_examples(path=SEED_PATH):
+    """{classifier: [(text, label), ...]} from the seed file."""
+    with open(path, encoding="utf-8") as f:
+        seeds = json.load(f)
+    return {classifier: [(text, label) for label, texts in by_label.items() for text in texts]
+            for classifier, by_label in seeds.items()}
+
+
+def harvest_log_examples(paths=None):
+    """
+    Labelled examples from the JSON-lines app logs:
+
+    - 'classifier_output' events answered by the LLM (logged by llm_calls)
+    - a 'router_output' event right after a 'user_message' (main.py) -> relevance
+    - gradio requests whose answer starts with a route's prefix -> route
+
+    Returns {classifier: [(text, label), ...]}.
+    """
+    examples = {"route": [], "relevance": []}
+    for path in LOG_PATHS if paths is None else paths:
+        if not os.path.exists(path):
+            continue
+        last_message = None
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                event = record.get("event")
+                if event == "classifier_output" and record.get("source") == "llm":
+                    classifier = record.get("classifier")
+                    label = normalize_label(classifier, record.get("output", "")) if classifier in ROUTER_LABELS else None
+                    if label and record.get("message"):
+                        examples[classifier].append((record["message"], label))
+                elif event == "router_output" and last_message:
+                    label = normalize_label("relevance", record.get("output", ""))
+                    if label:
+                        examples["relevance"].append((last_message, label))
+                elif event is None and record.get("prompt") and isinstance(record.get("output"), str):
+                    for prefix, label in _ANSWER_PREFIXES.items():
+                        if record["output"].startswith(prefix):
+                            examples["route"].append((record["prompt"], label))
+                last_message = record.get("message") if event == "user_message" else None
+    return examples
+
+
+def training_examples(log_paths=None):
+    """
+    Seed examples plus harvested log examples, deduplicated (the latest label wins).
+    Every routed question is also an example of a 'Related' question.
+    """
+    seeds = load_seed_examples()
+    seeds["relevance"] = [(text, "Related") for text, _ in seeds.get("route", [])] + seeds.get("relevance", [])
+    logged = harvest_log_examples(log_paths)
+    examples = {}
+    for classifier in ROUTER_LABELS:
+        merged = {}
+        for text, label in seeds.get(classifier, []) + logged.get(classifier, []):
+            merged[" ".join(text.split()).lower()] = (text, label)
+        examples[classifier] = list(merged.values())
+    return examples
+
+
+def build_pipeline():
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline, make_union
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    features = make_union(
+        TfidfVectorizer(analyzer="word", ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), sublinear_tf=True, lowercase=True),
+    )
+    return make_pipeline(features, LogisticRegression(C=10.0, class_weight="balanced", max_iter=2000))
+
+
+class LocalRouter:
+    """
+    In-process route and relevance classifiers.
+    predict(classifier, message) returns (label, confidence).
+    """
+
+    def __init__(self, models, trained_on=None):
+        self.models = models
+        self.trained_on = trained_on or {}
+
+    @classmethod
+    def train(cls, examples):
+        models = {}
+        for classifier, pairs in examples.items():
+            texts, labels = zip(*pairs)
+            models[classifier] = build_pipeline().fit(list(texts), list(labels))
+        return cls(models, trained_on={c: len(p) for c, p in examples.items()})
+
+    def predict(self, classifier, message):
+        model = self.models[classifier]
+        probabilities = model.predict_proba([str(message)])[0]
+        best = int(np.argmax(probabilities))
+        return str(model.classes_[best]), float(probabilities[best])
+
+    def save(self, path):
+        import joblib
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump({"format_version": ROUTER_FORMAT_VERSION, "seed_hash": seed_hash(), "models": self.models,
+                     "trained_on": self.trained_on}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+
+        stored = joblib.load(path)
+        if stored.get("format_version") != ROUTER_FORMAT_VERSION or stored.get("seed_hash") != seed_hash():
+            raise ValueError("router format or seed examples changed")
+        return cls(stored["models"], stored.get("trained_on"))
+
+
+def router_path(router_dir=None):
+    return os.path.join(router_dir or ROUTER_DIR, "local_router.joblib")
+
+
+def train_router(router_dir=None, log_paths=None):
+    """Train the router from seeds and logs, save it and make it the shared router."""
+    global _router
+    router = LocalRouter.train(training_examples(log_paths))
+    try:
+        router.save(router_path(router_dir))
+    except OSError as e:
+        logger.warning({"event": "local_router_save_failed", "error": str(e)})
+    with _router_lock:
+        _router = router
+    return router
+
+
+_router = None
+_router_disabled = False
+_router_lock = threading.Lock()
+
+
+def get_local_router():
+    """
+    Return the shared LocalRouter, loading it from cache/router/ or training it (seeds and
+    logs) on first use. Returns None if scikit-learn is unavailable.
+    """
+    global _router, _router_disabled
+    if _router is not None or _router_disabled:
+        return _router
+    with _router_lock:
+        if _router is None and not _router_disabled:
+            try:
+                _router = LocalRouter.load(router_path())
+            except (OSError, ValueError, KeyError, EOFError, ImportError):
+                try:
+                    _router = LocalRouter.train(training_examples())
+                    _router.save(router_path())
+                except ImportError as e:
+                    logger.warning({"event": "local_router_disabled", "error": str(e)})
+                    _router = None
+                    _router_disabled = True
+                except OSError as e:
+                    logger.warning({"event": "local_router_save_failed", "error": str(e)})
+    return _router
+
+
+def local_classify(classifier, message):
+    """
+    (label, confidence) from the local router if it is confident enough, else None.
+    """
+    if not LOCAL_ROUTER_ENABLED:
+        return None
+    router = get_local_router()
+    if router is None:
+        return None
+    label, confidence = router.predict(classifier, message)
+    if confidence < CONFIDENCE_THRESHOLDS[classifier]:
+        return None
+    return label, confidence
+
+
+def _cross_validate(examples, folds, seed=0):
+    """Out-of-fold predictions and probabilities of a fresh pipeline."""
+    texts = np.array([t for t, _ in examples], dtype=object)
+    labels = np.array([l for _, l in examples], dtype=object)
+    order = np.random.default_rng(seed).permutation(len(texts))
+    predicted = np.empty(len(texts), dtype=object)
+    confidence = np.zeros(len(texts))
+    for fold in np.array_split(order, folds):
+        train = np.setdiff1d(order, fold)
+        model = build_pipeline().fit(list(texts[train]), list(labels[train]))
+        probabilities = model.predict_proba(list(texts[fold]))
+        predicted[fold] = model.classes_[probabilities.argmax(axis=1)]
+        confidence[fold] = probabilities.max(axis=1)
+    return texts, labels, predicted, confidence
+
+
+def router_report(folds=5, compare_llm=False, log_paths=None):
+    """
+    Accuracy and latency of the local router, per classifier:
+
+    - cross-validated accuracy overall and on the predictions above the confidence threshold
+      (the ones served locally), plus the share served locally
+    - median / p95 single-query latency of the trained router
+    - with compare_llm, accuracy and latency of the LLM classifiers on the same examples
+    """
+    examples = training_examples(log_paths)
+    router = get_local_router()
+    report = {}
+    for classifier, pairs in examples.items():
+        texts, labels, predicted, confidence = _cross_validate(pairs, folds)
+        local = confidence >= CONFIDENCE_THRESHOLDS[classifier]
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            router.predict(classifier, text)
+            latencies.append((time.perf_counter() - start) * 1000)
+        entry = {
+            "examples": len(texts),
+            "cv_accuracy": float(np.mean(predicted == labels)),
+            "local_share": float(np.mean(local)),
+            "local_accuracy": float(np.mean(predicted[local] == labels[local])) if local.any() else None,
+            "latency_ms_median": float(np.median(latencies)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+        }
+        if compare_llm:
+            entry.update(_llm_report(classifier, texts, labels))
+        report[classifier] = entry
+    return report
+
+
+def _llm_report(classifier, texts, labels):
+    # Imported here: llm_calls loads the RSMeans data and the RAG stack
+    import llm_calls
+
+    llm_classify = {"route": llm_calls.classify_question_type, "relevance": llm_calls.classify_input}[classifier]
+    correct, latencies = [], []
+    for text, label in zip(texts, labels):
+        start = time.perf_counter()
+        output = llm_classify(text, use_local=False, use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct.append(normalize_label(classifier, output) == label)
+    return {
+        "llm_accuracy": float(np.mean(correct)),
+        "llm_latency_ms_median": float(np.median(latencies)),
+        "llm_latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local query router.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="retrain from the seed examples and the app logs")
+    train.add_argument("--logs", nargs="*", default=None, help="JSON-lines log files to harvest")
+    report = commands.add_parser("report", help="cross-validated accuracy and latency")
+    report.add_argument("--logs", nargs="*", default=None, help="JSON-lines log files to harvest")
+    report.add_argument("--folds", type=int, default=5)
+    report.add_argument("--llm", action="store_true", help="also run the LLM classifiers for comparison")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        router = train_router(log_paths=args.logs)
+        print(f"Trained local router on {router.trained_on} examples -> {router_path()}")
+    else:
+        train_router(log_paths=args.logs)
+        print(json.dumps(router_report(args.folds, compare_llm=args.llm, log_paths=args.logs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
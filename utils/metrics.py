@@ -0,0 +1,185 @@
+# In-process request metrics: per-stage latency histograms and provider token counts,
+# exported in the Prometheus text format (GET /metrics on gh_server.py / gh_async_server.py).
+#
+# route_query_to_function starts a RequestMetrics for each question. Stages timed while it
+# runs (classify, embed, chroma_query, rerank, context_pack, generate, ttft, total) and the
+# token usage reported by providers are collected on it, including from worker threads that
+# copy the context, and recorded once the answer is complete, when the route is known.
+# Samples outside a request (e.g. explain_value_engineering) are recorded with route "none".
+# All samples are labelled with route, mode and completion model.
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import server.config as config
+
+# Seconds; stages range from sub-millisecond local lookups to minute-long generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, like a Prometheus histogram."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            text = _label_text(labels)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{{text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{text},le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{text}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{text}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, value, labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{{{_label_text(labels)}}} {value}")
+        return lines
+
+
+stage_seconds = Histogram("llm_stage_seconds", "Duration of request stages in seconds.")
+tokens_total = Counter("llm_tokens_total", "Prompt and completion tokens reported by providers.")
+requests_total = Counter("llm_requests_total", "Answered questions.")
+
+
+def _labels(route, **extra):
+    return tuple(extra.items()) + (("route", route or "none"), ("mode", config.get_mode()),
+                                   ("model", config.completion_model))
+
+
+class RequestMetrics:
+    """Stage durations and token usage of one question, recorded with its route by finish()."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = []
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.finished = False
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages.append((stage, seconds))
+
+    def add_tokens(self, prompt, completion):
+        with self._lock:
+            self.tokens["prompt"] += prompt
+            self.tokens["completion"] += completion
+
+    def finish(self, route, cached=False):
+        """
+        Record the collected samples under the route; returns log fields (stages_ms, tokens).
+        Later calls are ignored.
+        """
+        with self._lock:
+            if self.finished:
+                return {}
+            self.finished = True
+            stages, tokens = list(self.stages), dict(self.tokens)
+        for stage, seconds in stages:
+            stage_seconds.observe(seconds, _labels(route, stage=stage))
+        for kind, count in tokens.items():
+            if count:
+                tokens_total.inc(count, _labels(route, type=kind))
+        requests_total.inc(1, _labels(route, cached=str(bool(cached)).lower()))
+        stages_ms = {}
+        for stage, seconds in stages:
+            stages_ms[stage] = round(stages_ms.get(stage, 0.0) + seconds * 1000, 3)
+        return {"stages_ms": stages_ms, "prompt_tokens": tokens["prompt"], "completion_tokens": tokens["completion"]}
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def start_request():
+    """Start collecting metrics for a question in the current context."""
+    request = RequestMetrics()
+    _current.set(request)
+    return request
+
+
+def observe(stage, seconds):
+    """Record a stage duration on the current request, or directly if there is none."""
+    request = _current.get()
+    if request is not None and not request.finished:
+        request.observe(stage, seconds)
+    else:
+        stage_seconds.observe(seconds, _labels(None, stage=stage))
+
+
+@contextmanager
+def timer(stage):
+    """Time the enclosed block as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_usage(usage):
+    """Add the token usage of a provider response (response.usage, may be None)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    request = _current.get()
+    if request is not None and not request.finished:
+        request.add_tokens(prompt, completion)
+        return
+    for kind, count in (("prompt", prompt), ("completion", completion)):
+        if count:
+            tokens_total.inc(count, _labels(None, type=kind))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (stage_seconds, tokens_total, requests_total):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
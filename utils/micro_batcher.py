@@ -0,0 +1,221 @@
+# Dynamic micro-batching of query embeddings and FlashRank reranking across concurrent
+# requests. Each caller submits its own item and blocks on its own result; a worker thread
+# runs everything queued so far as one batched call: one embeddings request for several
+# questions, one ONNX session.run for the query-passage pairs of several rerank requests.
+# A lone request is dispatched at once; only when the previous batch held more than one
+# item (i.e. under concurrency) does the worker wait up to max_wait for more, so p50 does
+# not grow at low load.
+# FlashRank's Ranker.rerank scores one query per call, so batching the pairs of several
+# queries has to go below it: _rerank_batch repeats its pairwise steps on the ranker's
+# tokenizer and ONNX session. Those are FlashRank internals, so requirements.txt pins the
+# version this was written against (FLASHRANK_VERSION) and a ranker without them raises
+# instead of silently scoring differently.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+MICRO_BATCHING = True
+EMBED_MAX_BATCH = 32
+EMBED_MAX_WAIT = 0.003  # seconds
+RERANK_MAX_BATCH = 64   # query-passage pairs per session.run
+RERANK_MAX_WAIT = 0.002
+IDLE_TIMEOUT = 60.0     # seconds without work before the worker thread exits
+FLASHRANK_VERSION = "0.2.10"  # the pinned FlashRank whose Ranker internals _rerank_batch uses
+
+
+class MicroBatcher:
+    """
+    Runs batch_fn(items) -> results (same order) over items submitted from many threads.
+    size_fn(item) is an item's share of max_batch (default 1; e.g. the pair count of a
+    rerank request). An exception from batch_fn is raised to every caller in the batch.
+    on_exit(batcher) is called when the worker thread exits after IDLE_TIMEOUT.
+    """
+
+    def __init__(self, batch_fn, max_batch, max_wait, name="batcher", size_fn=None, on_exit=None):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self.size_fn = size_fn or (lambda item: 1)
+        self.on_exit = on_exit
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_batch = 0
+        self.stats = {"batches": 0, "items": 0, "max_items": 0, "seconds": 0.0}
+
+    def submit(self, item):
+        """Queue an item; returns a Future with its result."""
+        future = Future()
+        with self._lock:
+            self._queue.put((item, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self, first):
+        batch, size = [first], self.size_fn(first[0])
+        deadline = time.perf_counter() + self.max_wait if self._last_batch > 1 else None
+        while size < self.max_batch:
+            try:
+                if deadline is None:
+                    entry = self._queue.get_nowait()
+                else:
+                    entry = self._queue.get(timeout=max(deadline - time.perf_counter(), 0.0))
+            except queue.Empty:
+                break
+            batch.append(entry)
+            size += self.size_fn(entry[0])
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                with self._lock:
+                    if not self._queue.empty():
+                        continue
+                    self._thread = None
+                if self.on_exit is not None:
+                    self.on_exit(self)
+                return
+            batch = self._collect(first)
+            self._last_batch = len(batch)
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["max_items"] = max(self.stats["max_items"], len(batch))
+            self.stats["seconds"] += time.perf_counter() - start
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats["avg_items"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+
+def _embed_batch(embedding_fn):
+    def run(texts):
+        return list(embedding_fn(list(texts)))
+    return run
+
+
+def _check_pairwise_ranker(ranker):
+    """Raise RuntimeError unless ranker has the FlashRank internals _rerank_batch relies on."""
+    tokenizer = getattr(ranker, "tokenizer", None)
+    session = getattr(ranker, "session", None)
+    if not callable(getattr(tokenizer, "encode_batch", None)) or not callable(getattr(session, "run", None)):
+        raise RuntimeError(
+            f"{type(ranker).__name__} has no tokenizer.encode_batch / session.run; micro-batched "
+            f"reranking needs flashrank=={FLASHRANK_VERSION} (set MICRO_BATCHING = False to "
+            f"call Ranker.rerank directly)")
+
+
+def _rerank_batch(ranker):
+    """
+    One FlashRank pairwise forward pass for several (query, passages) requests: the steps
+    of Ranker.rerank, with the pairs of all requests tokenized and run together.
+    """
+    _check_pairwise_ranker(ranker)
+
+    def run(requests):
+        pairs = [[query, passage["text"]] for query, passages in requests for passage in passages]
+        encodings = ranker.tokenizer.encode_batch(pairs)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        token_type_ids = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        onnx_input = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if not np.all(token_type_ids == 0):
+            onnx_input["token_type_ids"] = token_type_ids
+        logits = ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            scores = 1 / (1 + np.exp(-logits.flatten()))
+        else:
+            exp_logits = np.exp(logits)
+            scores = exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+
+        results, offset = [], 0
+        for _, passages in requests:
+            ranked = [dict(passage, score=score) for passage, score in zip(passages, scores[offset:offset + len(passages)])]
+            ranked.sort(key=lambda p: p["score"], reverse=True)
+            results.append(ranked)
+            offset += len(passages)
+        return results
+    return run
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _forget(key, batcher):
+    with _batchers_lock:
+        entry = _batchers.get(key)
+        if entry is not None and entry[1] is batcher:
+            del _batchers[key]
+
+
+def _batcher(kind, target, make):
+    # One batcher per embedding function / ranker object (a mode switch creates new ones).
+    # The entry holds the target, so it is dropped when the batcher's worker exits after
+    # IDLE_TIMEOUT; otherwise every replaced ranker / ONNX session would stay alive.
+    with _batchers_lock:
+        key = (kind, id(target))
+        entry = _batchers.get(key)
+        if entry is None or entry[0] is not target:
+            batcher = make()
+            batcher.on_exit = lambda b: _forget(key, b)
+            entry = (target, batcher)
+            _batchers[key] = entry
+        return entry[1]
+
+
+def embed_query(embedding_fn, text):
+    """Embedding of one query text through the shared batcher for embedding_fn."""
+    if not MICRO_BATCHING:
+        return embedding_fn([text])[0]
+    batcher = _batcher("embed", embedding_fn, lambda: MicroBatcher(
+        _embed_batch(embedding_fn), EMBED_MAX_BATCH, EMBED_MAX_WAIT, name="embed-batcher"))
+    return batcher(text)
+
+
+def rerank(ranker, query, passages):
+    """
+    FlashRank reranking of passages for query, batched with concurrent requests on the same
+    ranker. Same result as ranker.rerank(RerankRequest(query, passages)), on copies of the
+    passages. Listwise LLM rankers (ranker.llm_model set) are called directly; a pairwise
+    ranker without the expected FlashRank internals raises RuntimeError.
+    """
+    if not passages:
+        return []
+    if not MICRO_BATCHING or getattr(ranker, "llm_model", None) is not None:
+        from flashrank import RerankRequest
+        return ranker.rerank(RerankRequest(query=query, passages=[dict(p) for p in passages]))
+    batcher = _batcher("rerank", ranker, lambda: MicroBatcher(
+        _rerank_batch(ranker), RERANK_MAX_BATCH, RERANK_MAX_WAIT, name="rerank-batcher",
+        size_fn=lambda request: len(request[1])))
+    return batcher((query, passages))
+
+
+def batch_stats():
+    """Batch counts and sizes of the live batchers."""
+    with _batchers_lock:
+        entries = list(_batchers.items())
+    return {f"{kind}/{type(target).__name__}/{key}": batcher.snapshot()
+            for (kind, key), (target, batcher) in entries}
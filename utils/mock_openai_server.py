@@ -0,0 +1,196 @@
+# Minimal OpenAI-compatible HTTP server for exercising provider failover and hedging
+# without real providers. Answers GET /v1/models, POST /v1/chat/completions (plain and
+# streamed) and POST /v1/embeddings, after a configurable delay and with a configurable
+# share of injected errors.
+#
+#   python -m utils.mock_openai_server --port 1234 --delay 0.5 --jitter 0.2 --error-rate 0.1
+#
+# or in-process: server = MockOpenAIServer(delay=0.5).start(); ...; server.stop()
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockOpenAIServer:
+    """
+    OpenAI-compatible mock provider on 127.0.0.1.
+
+    - delay / jitter: seconds before answering (uniform in delay +/- jitter)
+    - error_rate / error_status: share of requests answered with that HTTP status
+    - retry_after: Retry-After header (seconds) sent with 429 errors
+    - stall_rate: share of requests that never answer within `stall` seconds
+    - content: completion text (streamed in words when stream=true)
+    Settings can be changed while the server runs; `requests` counts the requests served.
+    """
+
+    def __init__(self, port=0, delay=0.0, jitter=0.0, error_rate=0.0, error_status=500, stall_rate=0.0,
+                 stall=60.0, content="Mock answer.", embedding_dim=8, seed=None, retry_after=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.content = content
+        self.embedding_dim = embedding_dim
+        self.retry_after = retry_after
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _plan(self):
+        """(seconds to wait, error status or None) for the next request."""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            wait = max(self.delay + self._random.uniform(-self.jitter, self.jitter), 0.0)
+        if roll < self.stall_rate:
+            return self.stall, None
+        if roll < self.stall_rate + self.error_rate:
+            return wait, self.error_status
+        return wait, None
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle_one_request(self):
+                # Hedged and cancelled calls hang up mid-request; that's expected, not an error
+                try:
+                    super().handle_one_request()
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+                else:
+                    self._json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                wait, error = mock._plan()
+                time.sleep(wait)
+                if error is not None:
+                    headers = {"Retry-After": str(mock.retry_after)} if error == 429 and mock.retry_after is not None else None
+                    self._json(error, {"error": {"message": "injected error", "type": "server_error"}}, headers)
+                elif self.path.endswith("/chat/completions"):
+                    if request.get("stream"):
+                        self._stream(request)
+                    else:
+                        self._json(200, _completion(request, mock.content))
+                elif self.path.endswith("/embeddings"):
+                    inputs = request.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._json(200, _embeddings(request, inputs, mock.embedding_dim))
+                else:
+                    self._json(404, {"error": {"message": "not found"}})
+
+            def _stream(self, request):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = mock.content.split(" ")
+                for i, word in enumerate(words):
+                    text = word if i == 0 else " " + word
+                    self._chunk(f"data: {json.dumps(_stream_chunk(request, text))}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _completion(request, content):
+    # Whitespace-separated words stand in for tokens
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+    return {
+        "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+        "model": request.get("model", "mock-model"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+                  "total_tokens": prompt_tokens + len(content.split())},
+    }
+
+
+def _stream_chunk(request, text):
+    return {
+        "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": request.get("model", "mock-model"),
+        "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+    }
+
+
+def _embeddings(request, inputs, dim):
+    data = []
+    for i, text in enumerate(inputs):
+        rng = random.Random(str(text))
+        data.append({"object": "embedding", "index": i, "embedding": [rng.uniform(-1, 1) for _ in range(dim)]})
+    return {"object": "list", "data": data, "model": request.get("model", "mock-model"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible provider.")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--content", default="Mock answer.")
+    args = parser.parse_args(argv)
+    server = MockOpenAIServer(port=args.port, delay=args.delay, jitter=args.jitter, error_rate=args.error_rate,
+                              error_status=args.error_status, stall_rate=args.stall_rate, content=args.content)
+    print(f"Mock OpenAI server on {server.base_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from sklearn.metrics.pairwise import cosine_similarity
+import asyncio
+import functools
+import logging
+
 import numpy as np
 from collections import Counter
 import re
@@ -6,13 +9,30 @@ import re
 import chromadb
 from chromadb.config import Settings
 from server.config import *
+import server.config as config
+
+from flashrank import Ranker
+from utils import metrics
+from utils.context_packer import context_budget, pack_context
+from utils.hybrid_reranker import HybridReranker, get_hybrid_reranker
+from utils.micro_batcher import rerank
+from utils.retrieval_cache import (config_model_id, embed_query, lookup_embedding, normalize_query, query_collection,
+                                   store_embedding)
+from utils.rerank_cascade import cascade_rerank
+from utils.sparse_index import hybrid_search
+from utils.llm_cache import cached_chat_completion, async_cached_chat_completion, stream_text, async_stream_text
 
-from flashrank import Ranker, RerankRequest
+logger = logging.getLogger("app_logger")
 
 CHROMA_PATH = "chroma"
+# Add BM25 results to dense retrieval in rag_context (utils/sparse_index.py)
+HYBRID_SEARCH = True
+# Rerank with a cheap first stage and early exit before the L-12 cross-encoder (utils/rerank_cascade.py)
+RERANK_CASCADE = True
 
-def get_chroma_client(mode="local"):
-    """Get ChromaDB client with embedding function based on mode (local, openai, cloudflare)"""
+@functools.lru_cache(maxsize=None)
+def get_embedding_function(mode="local"):
+    """Chroma embedding function of the collection for a mode (local, openai, cloudflare), one per mode"""
     from chromadb.utils import embedding_functions
     if mode == "openai":
         embedding_fn = embedding_functions.OpenAIEmbeddingFunction(
@@ -31,6 +51,11 @@ def get_chroma_client(mode="local"):
             api_key="not-needed",
             model_name="nomic-embed-text"
         )
+    return embedding_fn
+
+def get_chroma_client(mode="local"):
+    """Get ChromaDB client with embedding function based on mode (local, openai, cloudflare)"""
+    embedding_fn = get_embedding_function(mode)
     client = chromadb.PersistentClient(
         path=CHROMA_PATH,
         settings=Settings(anonymized_telemetry=False)
@@ -38,29 +63,65 @@ def get_chroma_client(mode="local"):
     return client, embedding_fn
 # This script is only used as a RAG tool for other scripts.
 
-def get_embedding(text, model=embedding_model):
-    text = text.replace("\n", " ")
+# Client and models are read from config at call time: set_mode replaces them, so names
+# bound by the star import above would go stale after a mode switch.
+def get_embedding(text, model=None):
+    text = normalize_query(text)
     mode = get_mode()
+    model = model or config.embedding_model
+    # Repeated texts come from the query embedding cache (utils/retrieval_cache.py)
+    model_id = config_model_id(model)
+    cached = lookup_embedding(model_id, text)
+    if cached is not None:
+        return cached.tolist()
     if mode == "openai":
-        response = client.embeddings.create(input = [text], dimensions = 768, model=model)
+        response = config.client.embeddings.create(input = [text], dimensions = 768, model=model)
     else:
-        response = client.embeddings.create(input = [text], model=model)
+        response = config.client.embeddings.create(input = [text], model=model)
     vector = response.data[0].embedding
+    store_embedding(model_id, text, vector)
     return vector
 
-def rag_answer(question, prompt, model=completion_model):
-    completion = client.chat.completions.create(
+def rag_answer(question, prompt, model=None, stream=False):
+    """
+    Answer the question from the RAG system prompt. With stream=True returns a generator
+    of text chunks as they are generated. Goes through the provider router
+    (utils/llm_cache.py) unless a model is given, uncached either way.
+    """
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": question}
+    ]
+    if model is None:
+        return cached_chat_completion(messages, stream=stream, use_cache=False, temperature=0.0)
+    completion = config.client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.0,
+        stream=stream,
+    )
+    if stream:
+        return stream_text(completion)
+    metrics.record_usage(completion.usage)
+    return completion.choices[0].message.content
+
+async def async_rag_answer(question, prompt, model=None, stream=False):
+    """Async version of rag_answer; with stream=True returns an async generator of text chunks."""
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": question}
+    ]
+    if model is None:
+        return await async_cached_chat_completion(messages, stream=stream, use_cache=False, temperature=0.0)
+    completion = await config.async_client.chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system", 
-             "content": prompt
-            },
-            {"role": "user", 
-             "content": question
-            }
-        ],
+        messages=messages,
         temperature=0.0,
+        stream=stream,
     )
+    if stream:
+        return async_stream_text(completion)
+    metrics.record_usage(completion.usage)
     return completion.choices[0].message.content
 
 def rerank_results(results, question, max_length=4000):
@@ -93,79 +154,22 @@ def rerank_results(results, question, max_length=4000):
     
     return selected_docs
 
-def calculate_semantic_similarity(query_embedding, doc_embedding):
-    """Calculate cosine similarity between query and document embeddings"""
-    return cosine_similarity(
-        np.array(query_embedding).reshape(1, -1),
-        np.array(doc_embedding).reshape(1, -1)
-    )[0][0]
-
-def calculate_keyword_score(question, doc):
-    """Calculate keyword matching score with weights for important terms"""
-    # Architecture-specific important keywords
-    important_keywords = {
-        'architect': 2.0, 'design': 1.5, 'building': 1.5, 'structure': 1.5,
-        'space': 1.5, 'form': 1.5, 'function': 1.5, 'style': 1.2,
-        'material': 1.2, 'construction': 1.2
-    }
-    
-    question_words = question.lower().split()
-    doc_words = doc.lower().split()
-    
-    # Count matching keywords with weights
-    score = 0
-    for word in question_words:
-        if word in doc_words:
-            score += important_keywords.get(word, 1.0)
-    
-    return score
-
-def calculate_position_score(doc_index, total_docs):
-    """Give higher weight to documents appearing earlier in search results"""
-    return 1 - (doc_index / total_docs)
-
-def enhanced_rerank_results(results, question, max_length=4000):
-    """Enhanced reranking using multiple signals"""
-    scored_results = []
-    total_docs = len(results['documents'][0])
-    
-    # Get question embedding
-    question_embedding = results['embeddings'][0]
-    
-    for idx, (doc, doc_embedding) in enumerate(zip(results['documents'][0], results['embeddings'])):
-        # Calculate different scoring signals
-        semantic_score = calculate_semantic_similarity(question_embedding, doc_embedding)
-        keyword_score = calculate_keyword_score(question, doc)
-        position_score = calculate_position_score(idx, total_docs)
-        
-        # Calculate document density (information per length)
-        doc_length = len(doc)
-        unique_words = len(set(doc.lower().split()))
-        density_score = unique_words / (doc_length + 1)  # Add 1 to avoid division by zero
-        
-        # Combine scores with weights
-        final_score = (
-            semantic_score * 0.4 +    # Semantic similarity
-            keyword_score * 0.3 +     # Keyword matching
-            position_score * 0.2 +    # Position in results
-            density_score * 0.1       # Information density
-        )
-        
-        scored_results.append((doc, final_score))
-    
-    # Sort by score and select best results that fit context
-    scored_results.sort(key=lambda x: x[1], reverse=True)
-    
-    selected_docs = []
-    total_length = 0
-    context_window = max_length
-    
-    for doc, score in scored_results:
-        if total_length + len(doc) <= context_window:
-            selected_docs.append(doc)
-            total_length += len(doc)
-    
-    return selected_docs
+def enhanced_rerank_results(results, question, max_length=4000, question_embedding=None, weights=None,
+                            embedding_fn=None):
+    """
+    Enhanced reranking using multiple signals (semantic, keyword, position, density; see
+    utils/hybrid_reranker.py). results is a Chroma query result for one question including
+    embeddings. question_embedding must come from the collection's embedding function; if it
+    is not given the question is embedded (cached) with embedding_fn, by default the
+    collection embedding function of the current mode.
+    """
+    documents = results['documents'][0]
+    embeddings = results['embeddings'][0]
+    if question_embedding is None:
+        question_embedding = embed_query(embedding_fn or get_embedding_function(get_mode()), question)
+    reranker = get_hybrid_reranker() if weights is None else HybridReranker(weights)
+    selected = reranker.rerank(question, question_embedding, documents, embeddings, max_length)
+    return [documents[i] for i in selected]
 
 def rag_call(question, n_results=10, max_context_length=4000):
     """Updated RAG call using enhanced reranking"""
@@ -182,15 +186,12 @@ def rag_call(question, n_results=10, max_context_length=4000):
         embedding_function=embedding_fn
     )
     
-    # Rest of the function remains the same
-    results = collection.query(
-        query_texts=[question],
-        n_results=n_results * 2,
-        include=['embeddings', 'documents']
-    )
+    # Embed the question once (cached); the same vector queries Chroma and scores the candidates
+    question_embedding = embed_query(embedding_fn, question)
+    results = query_collection(collection, question, n_results * 2, ['embeddings', 'documents'])
     
     # Apply enhanced reranking
-    selected_docs = enhanced_rerank_results(results, question, max_context_length)
+    selected_docs = enhanced_rerank_results(results, question, max_context_length, question_embedding=question_embedding)
     rag_result = "\n".join(selected_docs)
     
     prompt = f"""Answer the question based on the provided information.
@@ -220,37 +221,56 @@ def init_rag(mode="local"):
 
     return collection, ranker
 
-def rag_call_alt(question, collection, ranker, agent_prompt=None, n_results=10, max_context_length=4000):
-
-    results = collection.query(
-        query_texts=[question],
-        n_results=n_results * 2,
-        include=['documents', 'metadatas']
-    )
+def rag_context(question, collection, ranker, n_results=10, max_context_tokens=None):
+    """
+    Retrieve and rerank chunks for the question; returns the formatted context string.
+    With HYBRID_SEARCH the n_results best chunks of dense and BM25 search, fused, go to
+    the reranker; otherwise the 2 * n_results best dense results.
+    Whole chunks are packed into max_context_tokens (default: the current model's budget,
+    utils/context_packer.py).
+    """
+    if HYBRID_SEARCH:
+        # Chroma + BM25 merged by reciprocal-rank fusion (utils/sparse_index.py)
+        documents, metadatas = hybrid_search(question, collection, n_results)
+    else:
+        with metrics.timer("chroma_query"):
+            results = query_collection(collection, question, n_results * 2, ['documents', 'metadatas'])
+        documents, metadatas = results['documents'][0], results['metadatas'][0]
 
     # passagedocs = [{'id': i, 'text': doc} for i, doc in enumerate(results['documents'][0])]
     passagedocs = [{
         'id': i,
         'text': doc,
         'metadata': meta
-    } for i, (doc, meta) in enumerate(zip(results['documents'][0], results['metadatas'][0]))]
+    } for i, (doc, meta) in enumerate(zip(documents, metadatas))]
     
-    rerankrequest = RerankRequest(query=question, passages=passagedocs)
-    selected_docs = ranker.rerank(rerankrequest)
+    budget = context_budget() if max_context_tokens is None else max_context_tokens
+    with metrics.timer("rerank"):
+        if RERANK_CASCADE:
+            # Cheap first stage, then L-12 on the shortlist until the budget is filled (utils/rerank_cascade.py)
+            selected_docs = cascade_rerank(question, passagedocs, ranker, budget_tokens=budget)
+        else:
+            selected_docs = rerank(ranker, question, passagedocs)
 
-    # rag_result = "\n".join([doc['text'] for doc in selected_docs])[:max_context_length-20]
-    # Format documents with source information
-    formatted_docs = []
-    for doc in selected_docs:
-        source_info = f"\n[Source: {doc['metadata']['source']}]"
-        # if 'page_number' in doc['metadata']:
-        #     source_info += f", Page: {doc['metadata']['page_number']}"
-        # source_info += "]"
-        
-        formatted_docs.append(f"{doc['text']}{source_info}")
-
-    rag_result = "\n\n".join(formatted_docs)[:max_context_length-20]
+    # Format documents with source information, whole chunks only
+    chunks = [{'text': doc['text'], 'score': doc['score'], 'source': doc['metadata']['source']}
+              for doc in selected_docs]
+    with metrics.timer("context_pack"):
+        packed = pack_context(chunks, budget=budget)
+    logger.info({
+        "event": "context_packing",
+        "question": question,
+        "model": config.completion_model,
+        "tokens": packed["tokens"],
+        "budget": packed["budget"],
+        "chunks": len(chunks),
+        "selected": packed["selected"],
+        "truncated": packed["truncated"],
+    })
+    return packed["context"]
 
+def rag_prompt(question, rag_result, agent_prompt=None):
+    """System prompt for answering the question from the retrieved context."""
     if agent_prompt is None:
         agent_prompt= """Answer the question based on the provided information. 
                         Each text chunk includes its source information in brackets.
@@ -267,8 +287,25 @@ def rag_call_alt(question, collection, ranker, agent_prompt=None, n_results=10,
                         Focus on the most relevant details and maintain coherence.
                         If you don't know the answer, just say "I do not know."
                         """
-    prompt = f"""{agent_prompt}
+    return f"""{agent_prompt}
                 QUESTION: {question}
                 PROVIDED INFORMATION: {rag_result}"""
-    
-    return rag_answer(question=question, prompt=prompt), rag_result
+
+def rag_call_alt(question, collection, ranker, agent_prompt=None, n_results=10, max_context_tokens=None, stream=False):
+    """
+    Retrieve, rerank and answer; returns (answer, context). With stream=True the answer is a
+    generator: retrieval and reranking are done when this returns, generation is streamed.
+    """
+    rag_result = rag_context(question, collection, ranker, n_results, max_context_tokens)
+    prompt = rag_prompt(question, rag_result, agent_prompt)
+    return rag_answer(question=question, prompt=prompt, stream=stream), rag_result
+
+async def async_rag_call_alt(question, collection, ranker, agent_prompt=None, n_results=10, max_context_tokens=None,
+                             stream=False):
+    """
+    Async version of rag_call_alt. Chroma and FlashRank are blocking, so retrieval and
+    reranking run in a worker thread; the generation is awaited on the event loop.
+    """
+    rag_result = await asyncio.to_thread(rag_context, question, collection, ranker, n_results, max_context_tokens)
+    prompt = rag_prompt(question, rag_result, agent_prompt)
+    return await async_rag_answer(question=question, prompt=prompt, stream=stream), rag_result
@@ -0,0 +1,110 @@
+# Two-stage reranking in front of the ms-marco-MiniLM-L-12-v2 cross-encoder.
+# A cheap first stage orders the candidates: retrieval order (the RRF-fused or dense rank,
+# free) or FlashRank's smallest cross-encoder, ms-marco-TinyBERT-L-2-v2. Only the best
+# CASCADE_KEEP go through L-12. Each L-12 batch is the fewest next passages whose tokens could
+# fill what is left of the context budget (the whole shortlist when they can't, or without a
+# budget); once the passages scoring at least HIGH_SCORE fill the budget the rest is skipped.
+# Passages below MIN_SCORE are dropped (the best one is always kept). Stage times are recorded as
+# rerank_stage1 / rerank_stage2 metrics and logged as a rerank_cascade event.
+
+import logging
+import os
+import threading
+import time
+
+from flashrank import Ranker
+
+from utils import metrics
+from utils.context_packer import count_tokens
+from utils.micro_batcher import rerank
+
+CASCADE_FIRST_STAGE = "retrieval"  # "retrieval", "tinybert", or None to score every candidate with L-12
+FIRST_STAGE_MODEL = "ms-marco-TinyBERT-L-2-v2"
+CASCADE_KEEP = 8
+# FlashRank's ms-marco scores are sigmoid probabilities
+HIGH_SCORE = 0.5
+MIN_SCORE = 0.05
+
+logger = logging.getLogger("app_logger")
+
+_first_stage_ranker = None
+_first_stage_lock = threading.Lock()
+
+
+def get_first_stage_ranker():
+    """The TinyBERT ranker, loaded (and downloaded to models/ if needed) on first use."""
+    global _first_stage_ranker
+    if _first_stage_ranker is None:
+        with _first_stage_lock:
+            if _first_stage_ranker is None:
+                _first_stage_ranker = Ranker(model_name=FIRST_STAGE_MODEL,
+                                             cache_dir=os.path.join(os.getcwd(), "models"))
+    return _first_stage_ranker
+
+
+def _first_stage(question, passages, first_stage):
+    if first_stage == "tinybert":
+        try:
+            return rerank(get_first_stage_ranker(), question, passages)
+        except Exception as e:
+            logger.warning({"event": "first_stage_reranker_unavailable", "error": str(e)})
+    return passages
+
+
+def _batch_end(tokens, offset, needed):
+    """End of the shortest batch from offset whose tokens reach needed (else the last index)."""
+    total = 0
+    for end in range(offset, len(tokens)):
+        total += tokens[end]
+        if total >= needed:
+            return end + 1
+    return len(tokens)
+
+
+def cascade_rerank(question, passages, ranker, budget_tokens=None, first_stage=CASCADE_FIRST_STAGE,
+                   keep=CASCADE_KEEP, min_score=MIN_SCORE, high_score=HIGH_SCORE):
+    """
+    Rerank passages (FlashRank dicts with 'text', in retrieval order) with `ranker` (L-12)
+    after a first-stage cut to `keep`. Returns the kept passages with their L-12 'score',
+    best first, like ranker.rerank.
+    """
+    start = time.perf_counter()
+    if first_stage:
+        shortlist = _first_stage(question, passages, first_stage)[:keep]
+    else:
+        shortlist = passages
+    stage1 = time.perf_counter() - start
+
+    tokens = count_tokens([p["text"] for p in shortlist]) if budget_tokens and shortlist else None
+    scored, high_tokens, early_exit, batches, offset = [], 0, False, 0, 0
+    while offset < len(shortlist):
+        end = _batch_end(tokens, offset, budget_tokens - high_tokens) if tokens else len(shortlist)
+        # Batched with concurrent requests into one ONNX run (utils/micro_batcher.py)
+        results = rerank(ranker, question, shortlist[offset:end])
+        scored.extend(results)
+        batches += 1
+        if tokens:
+            high = [p["text"] for p in results if p["score"] >= high_score]
+            high_tokens += sum(count_tokens(high)) if high else 0
+        offset = end
+        if tokens and high_tokens >= budget_tokens and offset < len(shortlist):
+            early_exit = True
+            break
+    stage2 = time.perf_counter() - start - stage1
+
+    scored.sort(key=lambda p: p["score"], reverse=True)
+    kept = [p for p in scored if p["score"] >= min_score] or scored[:1]
+    metrics.observe("rerank_stage1", stage1)
+    metrics.observe("rerank_stage2", stage2)
+    logger.info({
+        "event": "rerank_cascade",
+        "first_stage": first_stage,
+        "candidates": len(passages),
+        "shortlist": len(shortlist),
+        "scored": len(scored),
+        "batches": batches,
+        "kept": len(kept),
+        "early_exit": early_exit,
+        "stages_ms": {"stage1": round(stage1 * 1000, 3), "stage2": round(stage2 * 1000, 3)},
+    })
+    return kept
@@ -0,0 +1,189 @@
+# Two-level cache in front of retrieval:
+# 1. query embeddings: (embedding endpoint, model, dimensions, normalized text) -> vector
+# 2. search results: (collection name, collection version, normalized query, n_results)
+#    -> chunk ids and distances; documents and metadatas are read back from Chroma by id
+# Both are TieredCaches (memory LRU + SQLite in cache/), so a restarted server starts warm.
+# The collection version is the collection's metadata 'version', which populate_database.py
+# bumps whenever it writes, together with the chunk count in case anything else wrote.
+
+import numpy as np
+
+import server.config as config
+from utils import metrics
+from utils.cache_utils import TieredCache, make_key
+from utils.micro_batcher import embed_query as batched_embed_query
+
+RETRIEVAL_CACHE_ENABLED = True
+RETRIEVAL_CACHE_PERSISTENT = True  # False keeps both levels in memory only
+RETRIEVAL_CACHE_PATH = None  # SQLite file of the disk tier (default: cache/llm_cache.sqlite)
+EMBEDDING_CACHE_TTL = 30 * 24 * 3600  # seconds
+EMBEDDING_CACHE_MEMORY_SIZE = 4096
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+SEARCH_CACHE_TTL = 7 * 24 * 3600
+SEARCH_CACHE_MEMORY_SIZE = 4096
+SEARCH_CACHE_MAX_ENTRIES = 100_000
+
+_embedding_cache = None
+_search_cache = None
+
+
+def get_embedding_cache():
+    """
+    Return the shared query embedding cache, creating it on first use.
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = TieredCache(
+            "query_embeddings",
+            memory_size=EMBEDDING_CACHE_MEMORY_SIZE,
+            ttl=EMBEDDING_CACHE_TTL,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+            path=RETRIEVAL_CACHE_PATH,
+            persistent=RETRIEVAL_CACHE_PERSISTENT,
+        )
+    return _embedding_cache
+
+
+def get_search_cache():
+    """
+    Return the shared search result cache, creating it on first use.
+    """
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = TieredCache(
+            "search_results",
+            memory_size=SEARCH_CACHE_MEMORY_SIZE,
+            ttl=SEARCH_CACHE_TTL,
+            max_entries=SEARCH_CACHE_MAX_ENTRIES,
+            path=RETRIEVAL_CACHE_PATH,
+            persistent=RETRIEVAL_CACHE_PERSISTENT,
+        )
+    return _search_cache
+
+
+def normalize_query(text):
+    """Query text as it is embedded and cached: whitespace (including newlines) collapsed."""
+    return " ".join(str(text).split())
+
+
+def embedding_model_id(embedding_fn):
+    """
+    (endpoint, model, dimensions) of a Chroma OpenAIEmbeddingFunction, or None if they
+    can't be read (the embedding is then not cached).
+    """
+    model = getattr(embedding_fn, "_model_name", None) or getattr(embedding_fn, "model_name", None)
+    if model is None:
+        return None
+    base_url = (getattr(embedding_fn, "_api_base", None) or getattr(embedding_fn, "api_base", None)
+                or getattr(getattr(embedding_fn, "_client", None) or getattr(embedding_fn, "client", None),
+                           "base_url", None))
+    dimensions = getattr(embedding_fn, "_dimensions", None) or getattr(embedding_fn, "dimensions", None)
+    return (str(base_url).rstrip("/"), model, dimensions)
+
+
+def config_model_id(model=None):
+    """Embedding model id (as embedding_model_id) of the config client and embedding model."""
+    dimensions = 768 if config.get_mode() == "openai" else None
+    return (str(config.client.base_url).rstrip("/"), model or config.embedding_model, dimensions)
+
+
+def lookup_embedding(model_id, text):
+    """Cached embedding (float32 array) of the normalized text, or None."""
+    if not RETRIEVAL_CACHE_ENABLED or model_id is None:
+        return None
+    vector = get_embedding_cache().get(make_key(model_id, normalize_query(text)))
+    return None if vector is None else np.asarray(vector, dtype=np.float32)
+
+
+def store_embedding(model_id, text, vector):
+    if RETRIEVAL_CACHE_ENABLED and model_id is not None:
+        get_embedding_cache().set(make_key(model_id, normalize_query(text)),
+                                  np.asarray(vector, dtype=np.float32).tolist())
+
+
+async def async_lookup_embedding(model_id, text):
+    """lookup_embedding for async code (the SQLite tier is read in a worker thread)."""
+    if not RETRIEVAL_CACHE_ENABLED or model_id is None:
+        return None
+    vector = await get_embedding_cache().aget(make_key(model_id, normalize_query(text)))
+    return None if vector is None else np.asarray(vector, dtype=np.float32)
+
+
+async def async_store_embedding(model_id, text, vector):
+    if RETRIEVAL_CACHE_ENABLED and model_id is not None:
+        await get_embedding_cache().aset(make_key(model_id, normalize_query(text)),
+                                         np.asarray(vector, dtype=np.float32).tolist())
+
+
+def embed_query(embedding_fn, text):
+    """
+    Embedding of the normalized query text with a Chroma embedding function: from the cache,
+    or through the micro-batcher (utils/micro_batcher.py) and then cached.
+    """
+    text = normalize_query(text)
+    model_id = embedding_model_id(embedding_fn)
+    vector = lookup_embedding(model_id, text)
+    if vector is None:
+        vector = batched_embed_query(embedding_fn, text)
+        store_embedding(model_id, text, vector)
+    return vector
+
+
+def collection_version(collection):
+    """(metadata 'version', chunk count) of a collection; part of every search cache key."""
+    metadata = getattr(collection, "metadata", None) or {}
+    return (metadata.get("version"), collection.count())
+
+
+def _dense_query(collection, question, n_results, include):
+    embedding_fn = getattr(collection, "_embedding_function", None)
+    if embedding_fn is None:
+        return collection.query(query_texts=[question], n_results=n_results, include=include)
+    with metrics.timer("embed"):
+        vector = embed_query(embedding_fn, question)
+    return collection.query(query_embeddings=[vector], n_results=n_results, include=include)
+
+
+def query_collection(collection, question, n_results, include):
+    """
+    collection.query for one question, in Chroma's result format ('ids' plus the `include`
+    fields, one list per query). Chunk ids and distances of a question already searched on
+    the same collection version come from the search cache; the requested fields of those
+    chunks are then read with collection.get.
+    """
+    if not RETRIEVAL_CACHE_ENABLED:
+        return _dense_query(collection, question, n_results, include)
+
+    question = normalize_query(question)
+    cache = get_search_cache()
+    key = make_key("search", collection.name, collection_version(collection), question, n_results)
+    entry = cache.get(key)
+    if entry is None:
+        results = _dense_query(collection, question, n_results, list(dict.fromkeys([*include, "distances"])))
+        distances = results["distances"][0]
+        cache.set(key, {"ids": results["ids"][0], "distances": [float(d) for d in distances]})
+        if "distances" not in include:
+            results = {k: v for k, v in results.items() if k != "distances"}
+        return results
+
+    ids = entry["ids"]
+    results = {"ids": [ids]}
+    fields = [field for field in include if field != "distances"]
+    if fields:
+        found = collection.get(ids=ids, include=fields)
+        position = {chunk_id: i for i, chunk_id in enumerate(found["ids"])}
+        if any(chunk_id not in position for chunk_id in ids):
+            # Chunks deleted without a version bump: forget the entry and search again
+            cache.delete(key)
+            return query_collection(collection, question, n_results, include)
+        for field in fields:
+            values = found[field]
+            results[field] = [[values[position[chunk_id]] for chunk_id in ids]]
+    if "distances" in include:
+        results["distances"] = [entry["distances"]]
+    return results
+
+
+def retrieval_cache_stats():
+    """Hit rates and sizes of both cache levels."""
+    return {"embeddings": get_embedding_cache().stats(), "search": get_search_cache().stats()}
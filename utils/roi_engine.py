@@ -0,0 +1,388 @@
+# Deterministic ROI model for development projects, vectorized in NumPy.
+# Every input may be a scalar or an array of scenarios, so one-at-a-time sensitivities,
+# 2-D grids and Monte Carlo runs are all a single evaluate_roi call over stacked inputs.
+# The LLM only narrates the tables produced here; it never does the arithmetic.
+
+import numpy as np
+import pandas as pd
+
+# Base case used for anything the user does not specify
+ROI_DEFAULTS = {
+    'construction_cost': 20_000_000.0,  # total development cost, $
+    'annual_rent': None,                # gross potential rent in year 1, $/yr (None: cost * DEFAULT_GROSS_YIELD)
+    'occupancy': 0.93,                  # share of potential rent collected
+    'opex_ratio': 0.35,                 # operating expenses as a share of collected rent
+    'cap_rate': 0.055,                  # exit cap rate
+    'interest_rate': 0.065,             # annual loan rate
+    'loan_to_cost': 0.65,
+    'amortization_years': 30,
+    'hold_years': 10,
+    'rent_growth': 0.02,                # annual NOI growth
+    'sale_cost': 0.02,                  # selling costs as a share of exit value
+}
+DEFAULT_GROSS_YIELD = 0.12
+
+# Human-readable labels and formats for report tables
+ROI_LABELS = {
+    'construction_cost': 'Construction cost',
+    'annual_rent': 'Annual rent',
+    'occupancy': 'Occupancy',
+    'opex_ratio': 'Opex ratio',
+    'cap_rate': 'Exit cap rate',
+    'interest_rate': 'Interest rate',
+    'loan_to_cost': 'Loan to cost',
+    'hold_years': 'Hold period (years)',
+    'rent_growth': 'Rent growth',
+}
+METRIC_LABELS = {
+    'irr': 'Levered IRR',
+    'roi': 'Total ROI',
+    'yield_on_cost': 'Yield on cost',
+    'cash_on_cash': 'Cash-on-cash (yr 1)',
+    'equity_multiple': 'Equity multiple',
+    'dscr': 'DSCR',
+    'noi': 'NOI (yr 1)',
+    'profit': 'Profit',
+}
+_PERCENT_KEYS = {'occupancy', 'opex_ratio', 'cap_rate', 'interest_rate', 'loan_to_cost', 'rent_growth', 'sale_cost',
+                 'irr', 'roi', 'yield_on_cost', 'cash_on_cash'}
+
+# One-at-a-time swings for the tornado table: relative (x base) or absolute (+/- value)
+TORNADO_SWINGS = {
+    'construction_cost': ('relative', 0.10),
+    'annual_rent': ('relative', 0.10),
+    'occupancy': ('absolute', 0.05),
+    'opex_ratio': ('absolute', 0.05),
+    'cap_rate': ('absolute', 0.005),
+    'interest_rate': ('absolute', 0.01),
+    'rent_growth': ('absolute', 0.01),
+    'hold_years': ('absolute', 3),
+}
+# Monte Carlo input distributions: (kind, spread). 'relative' draws base * N(1, spread),
+# 'absolute' draws base + N(0, spread). Draws are clipped to each input's valid range.
+MONTE_CARLO_SPREADS = {
+    'construction_cost': ('relative', 0.08),
+    'annual_rent': ('relative', 0.07),
+    'occupancy': ('absolute', 0.04),
+    'opex_ratio': ('absolute', 0.03),
+    'cap_rate': ('absolute', 0.005),
+    'interest_rate': ('absolute', 0.0075),
+    'rent_growth': ('absolute', 0.01),
+}
+_BOUNDS = {
+    'construction_cost': (1.0, None),
+    'annual_rent': (0.0, None),
+    'occupancy': (0.0, 1.0),
+    'opex_ratio': (0.0, 0.95),
+    'cap_rate': (0.01, None),
+    'interest_rate': (0.0, None),
+    'loan_to_cost': (0.0, 0.95),
+    'hold_years': (1, 50),
+    'rent_growth': (-0.2, 0.2),
+}
+IRR_ITERATIONS = 50
+IRR_TOLERANCE = 1e-9  # |NPV| / equity at which the IRR solver stops
+
+
+def _as_input(name, value):
+    """
+    Coerce a user / LLM supplied value to float. Rates given in percent (6.5 for 6.5%)
+    are converted to fractions. Returns None for values that are not numbers.
+    """
+    try:
+        number = float(str(value).replace(',', '').replace('$', '').replace('%', '').strip())
+    except (TypeError, ValueError):
+        return None
+    if not np.isfinite(number):
+        return None
+    if name in _PERCENT_KEYS and abs(number) > 1.0:
+        number /= 100.0
+    return number
+
+
+def base_case(**overrides):
+    """
+    Complete base case from ROI_DEFAULTS and the given values (None / non-numeric values
+    are ignored, percentages are accepted for rates).
+    A missing annual_rent is derived from construction_cost and DEFAULT_GROSS_YIELD.
+    """
+    case = dict(ROI_DEFAULTS)
+    for name, value in overrides.items():
+        if name in ROI_DEFAULTS and value is not None:
+            number = _as_input(name, value)
+            if number is not None:
+                case[name] = number
+    if case['annual_rent'] is None:
+        case['annual_rent'] = float(case['construction_cost']) * DEFAULT_GROSS_YIELD
+    return case
+
+
+def _clip(name, values):
+    low, high = _BOUNDS.get(name, (None, None))
+    if low is None and high is None:
+        return values
+    return np.clip(values, low, high)
+
+
+def evaluate_roi(case):
+    """
+    Evaluate the ROI model for a case whose values are scalars or equal-length arrays.
+    Returns a dict of float64 arrays: noi, yield_on_cost, equity, debt_service, dscr,
+    cash_on_cash, exit_value, profit, roi (total return on equity), equity_multiple and
+    irr (levered, annual cash flows plus sale at the end of the hold).
+    """
+    p = {k: np.asarray(v, dtype='float64') for k, v in case.items() if v is not None}
+    shape = np.broadcast_shapes(*(v.shape for v in p.values()))
+    p = {k: np.broadcast_to(_clip(k, v), shape) for k, v in p.items()}
+
+    cost = p['construction_cost']
+    hold = np.rint(p['hold_years']).astype(np.int64)
+    noi = p['annual_rent'] * p['occupancy'] * (1.0 - p['opex_ratio'])
+    debt = cost * p['loan_to_cost']
+    equity = cost - debt
+
+    # Level annual payment and remaining balance after `hold` years (interest-free loans amortize linearly)
+    r = p['interest_rate']
+    n = p['amortization_years']
+    safe_r = np.where(r > 0, r, 1.0)
+    growth_n = (1.0 + safe_r) ** n
+    payment = np.where(r > 0, debt * safe_r * growth_n / (growth_n - 1.0), debt / n)
+    growth_h = (1.0 + safe_r) ** hold
+    balance = np.where(r > 0, debt * growth_h - payment * (growth_h - 1.0) / safe_r, debt - payment * hold)
+    balance = np.maximum(balance, 0.0)
+
+    exit_noi = noi * (1.0 + p['rent_growth']) ** hold
+    exit_value = exit_noi / p['cap_rate']
+    sale_proceeds = exit_value * (1.0 - p['sale_cost']) - balance
+
+    # Yearly cash flows as a (years, scenarios) array, zero beyond each scenario's hold.
+    # Built row by row so every year is one contiguous vector for the IRR solver.
+    n_years = int(hold.max(initial=1))
+    cash_flows = np.empty((n_years,) + shape)
+    level = np.array(noi)
+    growth = 1.0 + p['rent_growth']
+    for t in range(1, n_years + 1):
+        row = cash_flows[t - 1:t]
+        np.subtract(level, payment, out=row)
+        if t >= hold.min(initial=n_years):
+            row[...] = np.where(t < hold, row, np.where(t == hold, row + sale_proceeds, 0.0))
+        level *= growth
+
+    total_return = cash_flows.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'noi': noi,
+            'yield_on_cost': noi / cost,
+            'equity': equity,
+            'debt_service': payment,
+            'dscr': np.where(payment > 0, noi / payment, np.inf),
+            'cash_on_cash': (noi - payment) / equity,
+            'exit_value': exit_value,
+            'profit': total_return - equity,
+            'roi': (total_return - equity) / equity,
+            'equity_multiple': total_return / equity,
+            'irr': _irr(equity, cash_flows),
+        }
+
+
+def _irr(equity, cash_flows):
+    """
+    Vectorized IRR of (-equity at t=0, cash_flows[t-1] at t=1..T) by Newton's method on the
+    discount factor d = 1 / (1 + irr), with the NPV polynomial evaluated in place by Horner's
+    rule. Starts from the annualized equity multiple, which typically converges in about
+    five iterations. Scenarios that do not converge are NaN.
+    """
+    multiple = np.maximum(cash_flows.sum(axis=0) / np.maximum(equity, 1e-9), 1e-3)
+    rate = np.clip(multiple ** (1.0 / len(cash_flows)) - 1.0, -0.9, 5.0)
+    tolerance = IRR_TOLERANCE * np.maximum(equity, 1.0)
+    value = np.empty(rate.shape)
+    slope = np.empty(rate.shape)
+    for _ in range(IRR_ITERATIONS):
+        d = 1.0 / (1.0 + rate)
+        value.fill(0.0)
+        slope.fill(0.0)
+        for flow in cash_flows[::-1]:
+            slope *= d
+            slope += value
+            value *= d
+            value += flow
+        npv = value * d - equity
+        done = np.abs(npv) <= tolerance
+        if done.all():
+            break
+        d_npv_dd = value + slope * d
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            d_new = np.where(done | (d_npv_dd == 0), d, d - npv / d_npv_dd)
+        rate = np.clip(1.0 / np.clip(d_new, 1e-3, 100.0) - 1.0, -0.99, 10.0)
+    return np.where(done, rate, np.nan)
+
+
+def _shifted(case, name, kind, amount, sign):
+    value = case[name] * (1.0 + sign * amount) if kind == 'relative' else case[name] + sign * amount
+    return float(_clip(name, np.asarray(value)))
+
+
+def tornado(case, metric='irr', swings=None):
+    """
+    One-at-a-time sensitivities of `metric`: each input is moved down and up by its swing
+    (see TORNADO_SWINGS) with everything else at the base case. All 2 * k scenarios are
+    evaluated in one call. Rows are sorted by the size of the metric's range.
+    """
+    swings = TORNADO_SWINGS if swings is None else swings
+    names = [name for name in swings if name in case]
+    stacked = {k: np.full(2 * len(names), v, dtype='float64') for k, v in case.items()}
+    for i, name in enumerate(names):
+        kind, amount = swings[name]
+        stacked[name][2 * i] = _shifted(case, name, kind, amount, -1)
+        stacked[name][2 * i + 1] = _shifted(case, name, kind, amount, +1)
+    values = evaluate_roi(stacked)[metric]
+    base_value = float(evaluate_roi(case)[metric])
+    rows = []
+    for i, name in enumerate(names):
+        low, high = values[2 * i], values[2 * i + 1]
+        rows.append({
+            'input': name,
+            'low input': stacked[name][2 * i],
+            'high input': stacked[name][2 * i + 1],
+            f'{metric} at low': low,
+            f'{metric} at high': high,
+            'swing': abs(high - low),
+        })
+    table = pd.DataFrame(rows).sort_values('swing', ascending=False, kind='stable').reset_index(drop=True)
+    table.attrs['base'] = base_value
+    return table
+
+
+def sensitivity_grid(case, x_name, x_values, y_name, y_values, metric='irr'):
+    """
+    `metric` over every combination of x_values (columns) and y_values (rows) for two inputs,
+    as a DataFrame indexed by the y values.
+    """
+    x_values = np.asarray(x_values, dtype='float64')
+    y_values = np.asarray(y_values, dtype='float64')
+    xx, yy = np.meshgrid(x_values, y_values)
+    grid_case = dict(case)
+    grid_case[x_name] = xx.ravel()
+    grid_case[y_name] = yy.ravel()
+    values = evaluate_roi(grid_case)[metric].reshape(yy.shape)
+    return pd.DataFrame(values, index=pd.Index(y_values, name=y_name), columns=pd.Index(x_values, name=x_name))
+
+
+def monte_carlo(case, n=100_000, spreads=None, seed=0, metrics=('irr', 'roi', 'yield_on_cost', 'dscr')):
+    """
+    Sample the uncertain inputs (see MONTE_CARLO_SPREADS) n times and evaluate all scenarios
+    in one vectorized call. Returns a dict with the quantile table ('summary'), the probability
+    of a negative IRR / DSCR below 1.0 ('risk') and the raw metric arrays ('samples').
+    """
+    spreads = MONTE_CARLO_SPREADS if spreads is None else spreads
+    rng = np.random.default_rng(seed)
+    sampled = dict(case)
+    for name, (kind, spread) in spreads.items():
+        if name not in case:
+            continue
+        noise = rng.standard_normal(n) * spread
+        # evaluate_roi clips the draws to each input's valid range
+        sampled[name] = case[name] * (1.0 + noise) if kind == 'relative' else case[name] + noise
+    results = evaluate_roi(sampled)
+    quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+    summary = pd.DataFrame(
+        {metric: np.nanquantile(results[metric], quantiles) for metric in metrics},
+        index=['p5', 'p25', 'median', 'p75', 'p95'],
+    ).T
+    summary['mean'] = [np.nanmean(results[metric]) for metric in metrics]
+    risk = {
+        'p_irr_negative': float(np.mean(results['irr'] < 0)),
+        'p_dscr_below_1': float(np.mean(results['dscr'] < 1.0)),
+        'p_irr_below_cap_rate': float(np.mean(results['irr'] < case['cap_rate'])),
+    }
+    return {'summary': summary, 'risk': risk, 'samples': {m: results[m] for m in metrics}, 'n': n}
+
+
+def apply_changes(case, changes):
+    """
+    Scenario from relative changes, e.g. {"construction_cost": 0.10, "annual_rent": -0.05}
+    for "+10% cost, -5% rent". Rates (occupancy, cap rate, ...) change by the given amount
+    in absolute terms, e.g. {"interest_rate": 0.01} is +1 percentage point (changes of 0.5 or
+    more to a rate are read as percentage points, i.e. 1 is also +1 point).
+    """
+    scenario = dict(case)
+    for name, change in (changes or {}).items():
+        change = _as_input(name, change) if name in case else None
+        if change is None:
+            continue
+        if name in ('construction_cost', 'annual_rent'):
+            scenario[name] = case[name] * (1.0 + change)
+        elif name == 'hold_years':
+            scenario[name] = case[name] + round(change)
+        else:
+            if name in _PERCENT_KEYS and abs(change) >= 0.5:
+                change /= 100.0
+            scenario[name] = case[name] + change
+        scenario[name] = float(_clip(name, np.asarray(scenario[name])))
+    return scenario
+
+
+def _fmt(key, value):
+    if value is None or (isinstance(value, float) and not np.isfinite(value)):
+        return 'n/a'
+    if key in _PERCENT_KEYS:
+        return f"{value * 100:.2f}%"
+    if key in ('construction_cost', 'annual_rent', 'noi', 'profit'):
+        return f"${value:,.0f}"
+    if key == 'hold_years':
+        return f"{value:.0f}"
+    return f"{value:.2f}"
+
+
+def roi_report(case, changes=None, metric='irr', n_samples=100_000, seed=0):
+    """
+    Markdown report for prompts: base case inputs, base (and scenario) metrics, tornado
+    table for `metric` and Monte Carlo distribution summary.
+    """
+    scenario = apply_changes(case, changes) if changes else None
+    metric_keys = ['irr', 'roi', 'equity_multiple', 'yield_on_cost', 'cash_on_cash', 'dscr', 'noi', 'profit']
+
+    inputs = pd.DataFrame({
+        'input': [ROI_LABELS[k] for k in ROI_LABELS],
+        'base case': [_fmt(k, case[k]) for k in ROI_LABELS],
+    })
+    if scenario is not None:
+        inputs['scenario'] = [_fmt(k, scenario[k]) for k in ROI_LABELS]
+
+    base_results = evaluate_roi(case)
+    metrics = pd.DataFrame({
+        'metric': [METRIC_LABELS[k] for k in metric_keys],
+        'base case': [_fmt(k, float(base_results[k])) for k in metric_keys],
+    })
+    if scenario is not None:
+        scenario_results = evaluate_roi(scenario)
+        metrics['scenario'] = [_fmt(k, float(scenario_results[k])) for k in metric_keys]
+
+    sensitivities = tornado(case, metric=metric)
+    tornado_md = pd.DataFrame({
+        'input': [ROI_LABELS[k] for k in sensitivities['input']],
+        'low -> high input': [f"{_fmt(k, lo)} -> {_fmt(k, hi)}" for k, lo, hi in
+                              zip(sensitivities['input'], sensitivities['low input'], sensitivities['high input'])],
+        f'{METRIC_LABELS[metric]} at low': [_fmt(metric, v) for v in sensitivities[f'{metric} at low']],
+        f'{METRIC_LABELS[metric]} at high': [_fmt(metric, v) for v in sensitivities[f'{metric} at high']],
+    })
+
+    simulation = monte_carlo(case, n=n_samples, seed=seed)
+    summary = simulation['summary']
+    mc_md = pd.DataFrame({'metric': [METRIC_LABELS[k] for k in summary.index]})
+    for col in summary.columns:
+        mc_md[col] = [_fmt(k, v) for k, v in zip(summary.index, summary[col])]
+    risk = simulation['risk']
+
+    parts = [
+        "**Inputs:**", inputs.to_markdown(index=False),
+        "**Results:**", metrics.to_markdown(index=False),
+        f"**Sensitivity of {METRIC_LABELS[metric]} (one input at a time, others at base case):**",
+        tornado_md.to_markdown(index=False),
+        f"**Monte Carlo ({simulation['n']:,} scenarios, uncertain cost, rent, occupancy, opex, rates and growth):**",
+        mc_md.to_markdown(index=False),
+        (f"Probability of negative IRR: {risk['p_irr_negative'] * 100:.1f}%; "
+         f"DSCR below 1.0: {risk['p_dscr_below_1'] * 100:.1f}%; "
+         f"IRR below the exit cap rate: {risk['p_irr_below_cap_rate'] * 100:.1f}%."),
+    ]
+    return "\n\n".join(parts)
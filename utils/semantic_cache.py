@@ -0,0 +1,214 @@
+# Semantic answer cache in front of route_query_to_function.
+# Questions are embedded and compared (cosine) against an in-memory matrix of previously
+# answered questions; a close enough match returns the stored answer and sources without
+# classification, retrieval, reranking or generation.
+
+import re
+import threading
+import time
+
+import numpy as np
+
+import server.config as config
+from utils import metrics
+from utils.retrieval_cache import (async_lookup_embedding, async_store_embedding, config_model_id, lookup_embedding,
+                                   normalize_query, store_embedding)
+
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_CAPACITY = 2048
+SEMANTIC_DEFAULT_THRESHOLD = 0.95
+# Minimum cosine similarity per route. Routes whose answers depend on exact figures need
+# near-identical questions.
+SEMANTIC_ROUTE_THRESHOLDS = {
+    "cost benchmark": 0.96,
+    "roi analysis": 0.985,
+    "design-cost comparison": 0.95,
+    "value engineering": 0.95,
+    "project data lookup": 0.97,
+}
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def question_numbers(question):
+    """Numbers in a question ("10%", "$2M", "2025"); paraphrases must agree on them."""
+    return tuple(sorted(n.replace(',', '') for n in _NUMBER_RE.findall(str(question))))
+
+
+def embed_question(question):
+    """
+    Embedding of a question with the current config client and embedding model (through
+    the query embedding cache, utils/retrieval_cache.py).
+    """
+    text = normalize_query(question)
+    model_id = config_model_id()
+    vector = lookup_embedding(model_id, text)
+    if vector is not None:
+        return vector
+    with metrics.timer("embed"):
+        if config.get_mode() == "openai":
+            response = config.client.embeddings.create(input=[text], dimensions=768, model=config.embedding_model)
+        else:
+            response = config.client.embeddings.create(input=[text], model=config.embedding_model)
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    store_embedding(model_id, text, vector)
+    return vector
+
+
+async def async_embed_question(question):
+    """
+    Async version of embed_question on config.async_client.
+    """
+    text = normalize_query(question)
+    model_id = config_model_id()
+    vector = await async_lookup_embedding(model_id, text)
+    if vector is not None:
+        return vector
+    with metrics.timer("embed"):
+        if config.get_mode() == "openai":
+            response = await config.async_client.embeddings.create(input=[text], dimensions=768,
+                                                                   model=config.embedding_model)
+        else:
+            response = await config.async_client.embeddings.create(input=[text], model=config.embedding_model)
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    await async_store_embedding(model_id, text, vector)
+    return vector
+
+
+class SemanticCache:
+    """
+    Fixed-capacity matrix of unit-normalized question embeddings with their answers.
+
+    - lookup: one matrix-vector product; the best match in the same scope (e.g. RAG vs plain,
+      collection) wins if it clears its route's threshold and mentions the same numbers
+    - store: fills a free row or evicts the least recently used entry
+    - everything is dropped when the provider mode, completion model or embedding model changes
+    """
+
+    def __init__(self, capacity=SEMANTIC_CACHE_CAPACITY, default_threshold=SEMANTIC_DEFAULT_THRESHOLD,
+                 route_thresholds=None):
+        self.capacity = capacity
+        self.default_threshold = default_threshold
+        self.route_thresholds = dict(SEMANTIC_ROUTE_THRESHOLDS if route_thresholds is None else route_thresholds)
+        self._lock = threading.Lock()
+        self._namespace = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._reset(dim=0)
+
+    def _reset(self, dim):
+        self._matrix = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._entries = [None] * self.capacity
+        self._last_used = np.full(self.capacity, -np.inf)
+        self._size = 0
+
+    @staticmethod
+    def current_namespace():
+        return (config.get_mode(), config.completion_model, config.embedding_model)
+
+    def _check_namespace(self, dim):
+        """Drop all entries if the provider/models changed or the embedding size differs."""
+        namespace = self.current_namespace()
+        if namespace != self._namespace or self._matrix.shape[1] != dim:
+            if self._size:
+                self.invalidations += 1
+            self._namespace = namespace
+            self._reset(dim)
+
+    def threshold(self, route):
+        return self.route_thresholds.get(route, self.default_threshold)
+
+    def lookup(self, vector, question, scope=None):
+        """
+        Return the cached entry (dict with question, route, answer, sources, similarity) for
+        the most similar stored question, or None.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        with self._lock:
+            self._check_namespace(vector.shape[0])
+            if self._size == 0:
+                self.misses += 1
+                return None
+            similarities = self._matrix[:self._size] @ (vector / norm)
+            numbers = question_numbers(question)
+            for row in np.argsort(-similarities)[:8]:
+                entry = self._entries[row]
+                similarity = float(similarities[row])
+                if similarity < min(self.route_thresholds.values(), default=self.default_threshold):
+                    break
+                if (entry["scope"] == scope and entry["numbers"] == numbers
+                        and similarity >= self.threshold(entry["route"])):
+                    self._last_used[row] = time.monotonic()
+                    self.hits += 1
+                    return dict(entry, similarity=similarity)
+            self.misses += 1
+            return None
+
+    def store(self, vector, question, route, answer, sources=None, scope=None):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        with self._lock:
+            self._check_namespace(vector.shape[0])
+            if self._size < self.capacity:
+                row = self._size
+                self._size += 1
+            else:
+                row = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._matrix[row] = vector / norm
+            self._entries[row] = {
+                "question": question,
+                "route": route,
+                "answer": answer,
+                "sources": sources,
+                "scope": scope,
+                "numbers": question_numbers(question),
+            }
+            self._last_used[row] = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._reset(self._matrix.shape[1])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_semantic_cache = None
+
+
+def get_semantic_cache():
+    """
+    Return the shared semantic answer cache, creating it on first use.
+    """
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+
+def collection_scope(collection, use_rag):
+    """
+    Cache scope for a request: plain LLM answers and RAG answers are kept apart, and RAG
+    answers are tied to the Chroma collection (name and metadata 'version' if present).
+    """
+    if not use_rag or collection is None:
+        return ("llm",)
+    metadata = getattr(collection, "metadata", None) or {}
+    return ("rag", getattr(collection, "name", None), metadata.get("version"))
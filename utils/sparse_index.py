@@ -0,0 +1,152 @@
+# Persistent BM25 index over the RAG chunks, keyed by the same chunk ids as Chroma.
+# Dense search misses exact-term queries (Masterformat codes such as "03 35 43.10",
+# product names, unit abbreviations like "MSF"). hybrid_search runs BM25 alongside the
+# Chroma query and merges both rankings with reciprocal-rank fusion (RRF), so the
+# cross-encoder gets a smaller candidate pool than the old n_results * 2 dense over-fetch.
+#
+# populate_database.py rebuilds the index after adding documents. It is stored next to the
+# Chroma database (chroma/bm25/<collection>.npz + .json, removed by --reset); an index
+# whose chunk count no longer matches the collection is rebuilt from Chroma on first use.
+
+import contextvars
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+from utils.bm25 import BM25Index
+from utils.retrieval_cache import query_collection
+
+logger = logging.getLogger("app_logger")
+
+SPARSE_INDEX_DIR = os.path.join("chroma", "bm25")
+SPARSE_FORMAT_VERSION = 1
+RRF_K = 60  # the usual RRF constant: rank r contributes 1 / (RRF_K + r)
+FETCH_BATCH = 1000
+
+_lock = threading.Lock()
+_indexes = {}
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+
+class ChunkIndex:
+    """BM25 over chunk texts; search() returns (chunk ids, scores), best first."""
+
+    def __init__(self, ids, bm25):
+        self.ids = list(ids)
+        self.bm25 = bm25
+
+    @classmethod
+    def build(cls, ids, documents):
+        return cls(ids, BM25Index(documents))
+
+    def search(self, query, k):
+        indices, scores = self.bm25.top_k(query, k)
+        return [self.ids[i] for i in indices.tolist()], scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def save(self, name, index_dir=None):
+        index_dir = index_dir or SPARSE_INDEX_DIR
+        os.makedirs(index_dir, exist_ok=True)
+        base = os.path.join(index_dir, name)
+        self.bm25.save(base + ".npz")
+        tmp_path = base + ".json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format_version": SPARSE_FORMAT_VERSION, "count": len(self.ids), "ids": self.ids}, f)
+        os.replace(tmp_path, base + ".json")
+
+    @classmethod
+    def load(cls, name, index_dir=None):
+        """The saved index for a collection, or None if there is none (or it can't be read)."""
+        base = os.path.join(index_dir or SPARSE_INDEX_DIR, name)
+        try:
+            with open(base + ".json", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format_version") != SPARSE_FORMAT_VERSION:
+                return None
+            return cls(meta["ids"], BM25Index.load(base + ".npz"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def build_chunk_index(collection, index_dir=None):
+    """Build the BM25 index from every chunk in the collection and save it."""
+    ids, documents = [], []
+    offset = 0
+    while True:
+        batch = collection.get(include=["documents"], limit=FETCH_BATCH, offset=offset)
+        if not batch["ids"]:
+            break
+        ids.extend(batch["ids"])
+        documents.extend(doc or "" for doc in batch["documents"])
+        offset += len(batch["ids"])
+    index = ChunkIndex.build(ids, documents)
+    index.save(collection.name, index_dir)
+    with _lock:
+        _indexes[collection.name] = index
+    return index
+
+
+def get_chunk_index(collection, index_dir=None):
+    """
+    The BM25 index for a collection: from memory, from disk, or rebuilt from Chroma when
+    missing or when its chunk count differs from the collection's.
+    """
+    count = collection.count()
+    with _lock:
+        index = _indexes.get(collection.name)
+    if index is not None and len(index) == count:
+        return index
+    index = ChunkIndex.load(collection.name, index_dir)
+    if index is None or len(index) != count:
+        logger.info({"event": "bm25_index_build", "collection": collection.name, "chunks": count})
+        return build_chunk_index(collection, index_dir)
+    with _lock:
+        _indexes[collection.name] = index
+    return index
+
+
+def rrf_fuse(rankings, limit, k=RRF_K):
+    """Merge ranked id lists by reciprocal-rank fusion; returns up to `limit` ids, best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+
+def _bm25_search(collection, question, k):
+    with metrics.timer("bm25_query"):
+        return get_chunk_index(collection).search(question, k)[0]
+
+
+def hybrid_search(question, collection, n_results=10, n_candidates=None):
+    """
+    Top chunks for the question from Chroma (n_results) and BM25 (n_results) merged by RRF.
+    Returns (documents, metadatas) of up to n_candidates chunks (default n_results), in
+    fused order. Falls back to dense results only if the BM25 index is unavailable.
+    """
+    n_candidates = n_candidates or n_results
+    sparse_job = _executor.submit(contextvars.copy_context().run, _bm25_search, collection, question, n_results)
+    with metrics.timer("chroma_query"):
+        dense = query_collection(collection, question, n_results, ["documents", "metadatas"])
+    chunks = {chunk_id: (doc, meta) for chunk_id, doc, meta
+              in zip(dense["ids"][0], dense["documents"][0], dense["metadatas"][0])}
+    try:
+        sparse_ids = sparse_job.result()
+    except Exception as e:
+        logger.warning({"event": "bm25_search_skipped", "error": str(e)})
+        sparse_ids = []
+
+    fused = rrf_fuse([dense["ids"][0], sparse_ids], limit=n_candidates)
+    missing = [chunk_id for chunk_id in fused if chunk_id not in chunks]
+    if missing:
+        found = collection.get(ids=missing, include=["documents", "metadatas"])
+        chunks.update((chunk_id, (doc, meta)) for chunk_id, doc, meta
+                      in zip(found["ids"], found["documents"], found["metadatas"]))
+    fused = [chunk_id for chunk_id in fused if chunk_id in chunks]
+    return [chunks[i][0] for i in fused], [chunks[i][1] for i in fused]